@@ -3,4 +3,7 @@ import cv2
 
 def laplacian_variance(frame):
     gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
-    return float(cv2.Laplacian(gray, cv2.CV_64F).var())
\ No newline at end of file
+    return laplacian_variance_gray(gray)
+
+def laplacian_variance_gray(gray):
+    return float(cv2.Laplacian(gray, cv2.CV_64F).var())
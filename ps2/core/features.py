@@ -0,0 +1,168 @@
+# ps2/core/features.py
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+
+import cv2
+import numpy as np
+
+from ps2.core.blur import laplacian_variance
+from ps2.core.flow import optical_flow_magnitude
+from ps2.core.parallel import iter_signals_parallel
+from ps2.core.ssim import compute_ssim
+
+# bump whenever flow/ssim/blur (or their parameters) change so stale
+# entries are never reused
+FEATURE_VERSION = 1
+
+SIGNALS = ("flow", "ssim", "blur")
+
+DEFAULT_ROOT = os.environ.get(
+    "PS2_FEATURE_STORE",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "cache", "features"),
+)
+
+
+def video_hash(path, chunk=1 << 20):
+    """sha256 of the file contents — renames and copies share an entry."""
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        while True:
+            block = f.read(chunk)
+            if not block:
+                break
+            h.update(block)
+    return h.hexdigest()
+
+
+def iter_signals(video_path):
+    """Decode once and yield (flow, ssim, blur) per frame.
+
+    Frame 0 has no predecessor and yields (0.0, 1.0, 0.0), matching the
+    defaults the pipelines have always used. Only the previous frame is
+    kept in memory.
+    """
+    cap = cv2.VideoCapture(video_path)
+    if not cap.isOpened():
+        raise RuntimeError("Cannot open video")
+
+    prev = None
+    prev_gray = None
+    try:
+        while True:
+            ret, frame = cap.read()
+            if not ret:
+                break
+            gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+            if prev is None:
+                yield 0.0, 1.0, 0.0
+            else:
+                yield (
+                    optical_flow_magnitude(prev_gray, gray),
+                    compute_ssim(prev, frame),
+                    laplacian_variance(frame),
+                )
+            prev, prev_gray = frame, gray
+    finally:
+        cap.release()
+
+
+def video_meta(video_path):
+    cap = cv2.VideoCapture(video_path)
+    if not cap.isOpened():
+        raise RuntimeError("Cannot open video")
+    meta = {
+        "fps": cap.get(cv2.CAP_PROP_FPS) or 30.0,
+        "width": int(cap.get(cv2.CAP_PROP_FRAME_WIDTH)),
+        "height": int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT)),
+    }
+    cap.release()
+    return meta
+
+
+def compute_signals(video_path, workers=1):
+    """Per-frame signal columns; workers != 1 spreads the frame pairs over
+    processes (None = every core) via `ps2.core.parallel`."""
+    if (workers or os.cpu_count() or 1) == 1:
+        rows = iter_signals(video_path)
+    else:
+        rows = iter_signals_parallel(video_path, workers=workers)
+    flows, ssims, blurs = [], [], []
+    for flow, s, blur in rows:
+        flows.append(flow)
+        ssims.append(s)
+        blurs.append(blur)
+    return {
+        "flow": np.asarray(flows, dtype=np.float64),
+        "ssim": np.asarray(ssims, dtype=np.float64),
+        "blur": np.asarray(blurs, dtype=np.float64),
+    }
+
+
+class FeatureStore:
+    """On-disk columnar cache of per-frame signals.
+
+    One directory per (content hash, FEATURE_VERSION) holding a .npy file
+    per signal plus meta.json. Columns are loaded memory-mapped, so a
+    cached video is ready without decoding a single frame.
+    """
+
+    def __init__(self, root=None):
+        self.root = os.path.abspath(root or DEFAULT_ROOT)
+
+    def entry_dir(self, key):
+        return os.path.join(self.root, f"{key}-v{FEATURE_VERSION}")
+
+    def load(self, video_path, key=None):
+        """Return (signals, meta) or None if the video is not cached."""
+        d = self.entry_dir(key or video_hash(video_path))
+        meta_path = os.path.join(d, "meta.json")
+        if not os.path.exists(meta_path):
+            return None
+        with open(meta_path) as f:
+            meta = json.load(f)
+        signals = {
+            name: np.load(os.path.join(d, f"{name}.npy"), mmap_mode="r")
+            for name in SIGNALS
+        }
+        return signals, meta
+
+    def save(self, video_path, signals, meta=None, key=None):
+        key = key or video_hash(video_path)
+        meta = {**(meta or video_meta(video_path))}
+        meta.update({
+            "source": os.path.basename(video_path),
+            "hash": key,
+            "version": FEATURE_VERSION,
+            "frames": int(len(signals["flow"])),
+        })
+
+        # write into a temp dir and rename, so readers never see a partial entry
+        os.makedirs(self.root, exist_ok=True)
+        tmp = tempfile.mkdtemp(dir=self.root, prefix=".tmp-")
+        try:
+            for name in SIGNALS:
+                np.save(os.path.join(tmp, f"{name}.npy"),
+                        np.asarray(signals[name], dtype=np.float64))
+            with open(os.path.join(tmp, "meta.json"), "w") as f:
+                json.dump(meta, f, indent=2)
+            dest = self.entry_dir(key)
+            if os.path.exists(dest):
+                shutil.rmtree(dest)
+            os.replace(tmp, dest)
+        except BaseException:
+            shutil.rmtree(tmp, ignore_errors=True)
+            raise
+        return self.load(video_path, key=key)
+
+    def get_or_compute(self, video_path, workers=1):
+        """Load cached signals, computing and storing them on a miss."""
+        key = video_hash(video_path)
+        hit = self.load(video_path, key=key)
+        if hit is not None:
+            print(f"[features] cache hit {key[:12]} ({hit[1]['frames']} frames)")
+            return hit
+        print(f"[features] computing signals for {os.path.basename(video_path)}")
+        return self.save(video_path, compute_signals(video_path, workers=workers), key=key)
@@ -1,7 +1,18 @@
 # ps2/core/fusion.py
 import numpy as np
 
-def classify_frame(i, flows, ssims, blurs, window=20):
+# tuning knobs for the flow/ssim fusion rules
+FUSION_CFG = {
+    "DROP_FLOW_Z":      1.5,   # flow above mean + z * std
+    "DROP_SSIM_MAX":    0.85,
+    "DROP_JUMP_Z":      0.5,   # frame-to-frame flow jump, in stds
+    "MERGE_FLOW_RATIO": 0.3,   # flow below ratio * mean
+    "MERGE_SSIM_MIN":   0.99,
+    "MERGE_CONF":       0.9,
+}
+
+def classify_frame(i, flows, ssims, blurs, window=20, cfg=None):
+    c = {**FUSION_CFG, **(cfg or {})}
     n = len(flows)
 
     # global stats
@@ -16,18 +27,65 @@ def classify_frame(i, flows, ssims, blurs, window=20):
 
     # ----- DROP DETECTION -----
     if (
-        flows[i] > mean_flow + 1.5 * std_flow and
-        ssims[i] < 0.85 and
-        jump > std_flow * 0.5
+        flows[i] > mean_flow + c["DROP_FLOW_Z"] * std_flow and
+        ssims[i] < c["DROP_SSIM_MAX"] and
+        jump > std_flow * c["DROP_JUMP_Z"]
     ):
         confidence = min(1.0, (flows[i] - mean_flow) / (3 * std_flow))
         return "DROP", float(confidence)
 
     # ----- MERGE DETECTION -----
     if (
-        flows[i] < mean_flow * 0.3 and
-        ssims[i] > 0.99
+        flows[i] < mean_flow * c["MERGE_FLOW_RATIO"] and
+        ssims[i] > c["MERGE_SSIM_MIN"]
     ):
-        return "MERGE", 0.9
+        return "MERGE", c["MERGE_CONF"]
+
+    return "NORMAL", 0.0
+
+
+def classify_all(flows, ssims, blurs, cfg=None):
+    """Vectorized classify_frame over the whole series.
+
+    Global stats are computed once and the DROP/MERGE rules are applied as
+    masks, so labelling is O(n). Returns (labels, confidences) arrays that
+    match classify_frame(i, ...) for every i.
+    """
+    c = {**FUSION_CFG, **(cfg or {})}
+    flows = np.asarray(flows, dtype=np.float64)
+    ssims = np.asarray(ssims, dtype=np.float64)
+    n = len(flows)
+
+    labels = np.full(n, "NORMAL", dtype=object)
+    confidences = np.zeros(n, dtype=np.float64)
+    if n == 0:
+        return labels, confidences
+
+    # global stats
+    mean_flow = np.mean(flows)
+    std_flow = np.std(flows) + 1e-6
+
+    # relative jump (0 for the first frame)
+    jump = np.zeros(n, dtype=np.float64)
+    jump[1:] = flows[1:] - flows[:-1]
+
+    # ----- DROP DETECTION -----
+    drop = (
+        (flows > mean_flow + c["DROP_FLOW_Z"] * std_flow) &
+        (ssims < c["DROP_SSIM_MAX"]) &
+        (jump > std_flow * c["DROP_JUMP_Z"])
+    )
+
+    # ----- MERGE DETECTION -----
+    merge = (
+        ~drop &
+        (flows < mean_flow * c["MERGE_FLOW_RATIO"]) &
+        (ssims > c["MERGE_SSIM_MIN"])
+    )
+
+    labels[drop] = "DROP"
+    confidences[drop] = np.minimum(1.0, (flows[drop] - mean_flow) / (3 * std_flow))
+    labels[merge] = "MERGE"
+    confidences[merge] = c["MERGE_CONF"]
 
-    return "NORMAL", 0.0
\ No newline at end of file
+    return labels, confidences
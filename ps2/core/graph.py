@@ -0,0 +1,245 @@
+# ps2/core/graph.py
+"""Stage-graph executor with per-stage memoization on disk.
+
+A `Stage` wraps a function, names the values it reads (`inputs`) and the
+values it produces (`outputs`), and carries a `version`. A `StageGraph`
+wires stages together by those names; anything not produced by a stage
+is a source passed to `run()`.
+
+Every stage gets a key: sha256 over its name, version and the keys of
+its inputs (the producing stage's key for stage outputs, a fingerprint
+of the value for sources; files by path, size and mtime). Keys are known
+before anything runs, so `run()` only executes stages whose key has no
+stored entry and whose outputs are actually needed. Bumping one stage's
+version, or changing one source, recomputes that stage and the stages
+downstream of it; everything upstream is loaded from disk.
+
+Independent stages run concurrently on a thread pool (OpenCV and numpy
+release the GIL).
+
+    graph = StageGraph([
+        Stage("signals", signals_fn, inputs=("video",), outputs=("flow", "ssim")),
+        Stage("classify", classify_fn, inputs=("flow", "ssim", "cfg"), outputs=("labels",)),
+    ])
+    values = graph.run({"video": path, "cfg": {...}}, targets=["labels"])
+"""
+import hashlib
+import json
+import os
+import pickle
+import shutil
+import tempfile
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+import numpy as np
+
+DEFAULT_ROOT = os.environ.get(
+    "PS2_STAGE_CACHE",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "cache", "stages"),
+)
+
+
+class Stage:
+    """One node of a StageGraph.
+
+    fn is called with the inputs as keyword arguments and returns the
+    single output, or a tuple in `outputs` order. memoize=False always
+    re-runs the stage when its outputs are needed (for stages that are
+    cheap or have their own cache), but its key still feeds downstream.
+    """
+
+    def __init__(self, name, fn, inputs=(), outputs=None, version=1, memoize=True):
+        self.name = name
+        self.fn = fn
+        self.inputs = tuple(inputs)
+        self.outputs = tuple(outputs or (name,))
+        self.version = version
+        self.memoize = memoize
+
+    def __repr__(self):
+        return f"Stage({self.name!r}, v{self.version})"
+
+    def call(self, values):
+        result = self.fn(**{k: values[k] for k in self.inputs})
+        if len(self.outputs) == 1:
+            result = (result,)
+        if len(result) != len(self.outputs):
+            raise ValueError(f"stage {self.name} returned {len(result)} values, "
+                             f"declared {len(self.outputs)} outputs")
+        return dict(zip(self.outputs, result))
+
+
+def _file_stamp(path):
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    return [st.st_size, st.st_mtime_ns]
+
+
+def source_key(value):
+    """Fingerprint of a source value; files by path, size and mtime."""
+    if isinstance(value, str) and os.path.isfile(value):
+        st = os.stat(value)
+        payload = ["file", os.path.abspath(value), st.st_size, st.st_mtime_ns]
+    elif isinstance(value, np.ndarray):
+        payload = ["array", str(value.dtype), value.shape,
+                   hashlib.sha256(np.ascontiguousarray(value).tobytes()).hexdigest()]
+    else:
+        payload = ["value", json.dumps(value, sort_keys=True, default=repr)]
+    return hashlib.sha256(json.dumps(payload).encode()).hexdigest()
+
+
+class StageGraph:
+    """DAG of stages with on-disk memoization; see module docstring."""
+
+    def __init__(self, stages, root=None, workers=4):
+        self.root = os.path.abspath(root or DEFAULT_ROOT)
+        self.workers = workers
+        self.producer = {}
+        for st in stages:
+            for out in st.outputs:
+                if out in self.producer:
+                    raise ValueError(f"output {out!r} produced by both "
+                                     f"{self.producer[out].name} and {st.name}")
+                self.producer[out] = st
+        self.order = self._toposort(stages)
+        self.last_run = {}     # stage name -> "ran" | "cached" after run()
+
+    def _toposort(self, stages):
+        deps = {st.name: {self.producer[i].name for i in st.inputs if i in self.producer}
+                for st in stages}
+        by_name = {st.name: st for st in stages}
+        order, done = [], set()
+        while len(order) < len(stages):
+            ready = [n for n in deps if n not in done and deps[n] <= done]
+            if not ready:
+                raise ValueError(f"cycle among stages: {sorted(set(deps) - done)}")
+            for n in ready:
+                order.append(by_name[n])
+                done.add(n)
+        return order
+
+    # ── keys + store ─────────────────────────────────────────────────
+    def keys(self, sources):
+        """Stage name -> key, computed without running anything."""
+        src_keys, keys = {}, {}
+        for st in self.order:
+            parts = [st.name, st.version]
+            for name in st.inputs:
+                if name in self.producer:
+                    parts.append([name, keys[self.producer[name].name]])
+                elif name in sources:
+                    if name not in src_keys:
+                        src_keys[name] = source_key(sources[name])
+                    parts.append([name, src_keys[name]])
+                else:
+                    raise KeyError(f"stage {st.name} needs {name!r}: "
+                                   f"not a stage output and not passed to run()")
+            keys[st.name] = hashlib.sha256(json.dumps(parts).encode()).hexdigest()
+        return keys
+
+    def entry_dir(self, st, key):
+        return os.path.join(self.root, st.name, key)
+
+    def load(self, st, key):
+        """Stored outputs of st, or None on a miss (or a changed output file)."""
+        d = self.entry_dir(st, key)
+        meta_path = os.path.join(d, "meta.json")
+        if not os.path.exists(meta_path):
+            return None
+        with open(meta_path) as f:
+            meta = json.load(f)
+        with open(os.path.join(d, "outputs.pkl"), "rb") as f:
+            outputs = pickle.load(f)
+        # output files must still be the ones this entry wrote
+        for name, stamp in meta.get("files", {}).items():
+            if _file_stamp(outputs[name]) != stamp:
+                return None
+        return outputs
+
+    def save(self, st, key, outputs, seconds):
+        files = {k: _file_stamp(v) for k, v in outputs.items()
+                 if isinstance(v, str) and os.path.isfile(v)}
+        meta = {"stage": st.name, "version": st.version, "key": key,
+                "outputs": list(st.outputs), "files": files, "seconds": round(seconds, 3)}
+        # write into a temp dir and rename, so readers never see a partial entry
+        parent = os.path.join(self.root, st.name)
+        os.makedirs(parent, exist_ok=True)
+        tmp = tempfile.mkdtemp(dir=parent, prefix=".tmp-")
+        try:
+            with open(os.path.join(tmp, "outputs.pkl"), "wb") as f:
+                pickle.dump(outputs, f, protocol=pickle.HIGHEST_PROTOCOL)
+            with open(os.path.join(tmp, "meta.json"), "w") as f:
+                json.dump(meta, f, indent=2)
+            dest = self.entry_dir(st, key)
+            if os.path.exists(dest):
+                shutil.rmtree(dest)
+            os.replace(tmp, dest)
+        except BaseException:
+            shutil.rmtree(tmp, ignore_errors=True)
+            raise
+
+    # ── execution ────────────────────────────────────────────────────
+    def _plan(self, keys, targets):
+        """Stage name -> outputs (cache hit) or None (must run), needed stages only."""
+        needed = set(targets)
+        plan = {}
+        for st in reversed(self.order):
+            if not needed.intersection(st.outputs):
+                continue
+            hit = self.load(st, keys[st.name]) if st.memoize else None
+            plan[st.name] = hit
+            if hit is None:
+                needed.update(i for i in st.inputs if i in self.producer)
+        return plan
+
+    def _execute(self, st, key, values):
+        t0 = time.perf_counter()
+        outputs = st.call(values)
+        seconds = time.perf_counter() - t0
+        if st.memoize:
+            self.save(st, key, outputs, seconds)
+        print(f"[graph] {st.name} v{st.version} ran in {seconds:.2f}s")
+        return outputs
+
+    def run(self, sources, targets=None):
+        """Compute `targets` (default: outputs of the final stages); returns {name: value}."""
+        if targets is None:
+            consumed = {i for st in self.order for i in st.inputs}
+            targets = [o for st in self.order for o in st.outputs
+                       if not consumed.intersection(st.outputs)]
+        unknown = [t for t in targets if t not in self.producer and t not in sources]
+        if unknown:
+            raise KeyError(f"unknown targets: {unknown}")
+
+        keys = self.keys(sources)
+        plan = self._plan(keys, targets)
+        values = dict(sources)
+        self.last_run = {}
+        for st in self.order:
+            if plan.get(st.name) is not None:
+                values.update(plan[st.name])
+                self.last_run[st.name] = "cached"
+                print(f"[graph] {st.name} v{st.version} cached ({keys[st.name][:12]})")
+
+        todo = [st for st in self.order if st.name in plan and plan[st.name] is None]
+        running = {}
+        with ThreadPoolExecutor(max_workers=self.workers) as pool:
+            try:
+                while todo or running:
+                    for st in [s for s in todo if all(i in values for i in s.inputs)]:
+                        todo.remove(st)
+                        inputs = {i: values[i] for i in st.inputs}
+                        running[pool.submit(self._execute, st, keys[st.name], inputs)] = st
+                    done, _ = wait(running, return_when=FIRST_COMPLETED)
+                    for fut in done:
+                        st = running.pop(fut)
+                        values.update(fut.result())
+                        self.last_run[st.name] = "ran"
+            except BaseException:
+                for fut in running:
+                    fut.cancel()
+                raise
+        return {t: values[t] for t in targets}
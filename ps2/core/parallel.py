@@ -0,0 +1,100 @@
+# ps2/core/parallel.py
+"""Multi-process flow / SSIM / blur over a shared-memory ring of frames.
+
+The parent decodes the video once and writes each grayscale frame into
+one slot of a `multiprocessing.shared_memory` ring. Workers attach to
+the ring by name and compute the signals of pair (i-1, i) straight from
+the two slots, so no frame is ever pickled. Results come back in frame
+order and match `features.iter_signals` exactly.
+
+A slot is only overwritten once every pair that reads it is done, so the
+ring bounds memory to `ring` frames however long the video is.
+"""
+import os
+from collections import deque
+from multiprocessing import get_context, shared_memory
+
+import cv2
+import numpy as np
+
+from ps2.core.blur import laplacian_variance_gray
+from ps2.core.flow import optical_flow_magnitude
+from ps2.core.ssim import compute_ssim_gray
+
+DEFAULT_RING = 64
+
+# per-worker view of the ring, set by _attach
+_shm = None
+_frames = None
+
+
+def _attach(name, shape):
+    global _shm, _frames
+    # one process per core already; nested OpenCV threads only oversubscribe
+    cv2.setNumThreads(1)
+    _shm = shared_memory.SharedMemory(name=name)
+    _frames = np.ndarray(shape, dtype=np.uint8, buffer=_shm.buf)
+
+
+def _pair_signals(prev_slot, slot):
+    prev_gray, gray = _frames[prev_slot], _frames[slot]
+    return (
+        optical_flow_magnitude(prev_gray, gray),
+        compute_ssim_gray(prev_gray, gray),
+        laplacian_variance_gray(gray),
+    )
+
+
+def iter_signals_parallel(video_path, workers=None, ring=DEFAULT_RING):
+    """Same stream as `features.iter_signals`, computed by `workers` processes.
+
+    workers=None uses every core. `ring` (>= 4) is the number of frames
+    held in shared memory; about twice `workers` keeps every worker busy.
+    """
+    workers = workers or os.cpu_count() or 1
+    ring = max(4, ring, 2 * workers)
+
+    cap = cv2.VideoCapture(video_path)
+    if not cap.isOpened():
+        raise RuntimeError("Cannot open video")
+
+    ret, frame = cap.read()
+    if not ret:
+        cap.release()
+        return
+    h, w = frame.shape[:2]
+    shape = (ring, h, w)
+
+    shm = shared_memory.SharedMemory(create=True, size=ring * h * w)
+    frames = pool = None
+    try:
+        frames = np.ndarray(shape, dtype=np.uint8, buffer=shm.buf)
+        pool = get_context().Pool(workers, initializer=_attach, initargs=(shm.name, shape))
+        pending = deque()    # (frame index, AsyncResult) in submission order
+
+        frames[0] = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+        yield 0.0, 1.0, 0.0
+
+        i = 1
+        while True:
+            # slot i % ring still holds frame i - ring, read by pairs
+            # i - ring and i - ring + 1: wait for those before overwriting
+            while pending and (pending[0][0] <= i - ring + 1 or pending[0][1].ready()):
+                yield pending.popleft()[1].get()
+            ret, frame = cap.read()
+            if not ret:
+                break
+            frames[i % ring] = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+            pending.append((i, pool.apply_async(_pair_signals, ((i - 1) % ring, i % ring))))
+            i += 1
+
+        while pending:
+            yield pending.popleft()[1].get()
+    finally:
+        cap.release()
+        if pool is not None:
+            pool.terminate()
+            pool.join()
+        del frames
+        shm.close()
+        shm.unlink()
@@ -0,0 +1,214 @@
+# ps2/core/rolling.py
+import bisect
+from collections import deque
+
+import numpy as np
+
+# scale MAD to be comparable with a gaussian std
+MAD_SCALE = 1.4826
+EPS = 1e-6
+
+
+def _window_bounds(n, window, centered):
+    idx = np.arange(n)
+    if centered:
+        half = window // 2
+        start = np.maximum(0, idx - half)
+        end = np.minimum(n, idx + half)
+    else:
+        start = np.maximum(0, idx - window + 1)
+        end = idx + 1
+    return start, end
+
+
+def rolling_mean_std(arr, window=20, centered=True):
+    """Batch rolling mean / std for every index of `arr` in O(n).
+
+    Centered windows cover [i - window//2, i + window//2) clipped to the
+    series, which is the same span `sliding_stats` used. Trailing windows
+    cover the last `window` samples up to and including i. Empty windows
+    fall back to the global stats. A small epsilon is added to std.
+    """
+    arr = np.asarray(arr, dtype=np.float64)
+    n = len(arr)
+    if n == 0:
+        return np.zeros(0), np.zeros(0)
+
+    start, end = _window_bounds(n, window, centered)
+
+    csum = np.concatenate(([0.0], np.cumsum(arr)))
+    csq = np.concatenate(([0.0], np.cumsum(arr * arr)))
+    count = end - start
+
+    safe = np.maximum(count, 1)
+    mean = (csum[end] - csum[start]) / safe
+    var = (csq[end] - csq[start]) / safe - mean * mean
+    std = np.sqrt(np.maximum(var, 0.0))
+
+    empty = count == 0
+    if np.any(empty):
+        mean[empty] = np.mean(arr)
+        std[empty] = np.std(arr)
+
+    return mean, std + EPS
+
+
+def rolling_median_mad(arr, window=20, centered=True):
+    """Batch rolling median / scaled MAD, a robust alternative to
+    rolling_mean_std that is not dragged around by the spikes we are
+    trying to detect. Same window convention as rolling_mean_std.
+    """
+    arr = np.asarray(arr, dtype=np.float64)
+    n = len(arr)
+    med = np.zeros(n)
+    mad = np.zeros(n)
+    if n == 0:
+        return med, mad
+
+    start, end = _window_bounds(n, window, centered)
+    tracker = RollingWindow(robust=True)
+    lo = hi = 0
+    for i in range(n):
+        # both bounds only move forward, so each sample is added/removed once
+        while hi < end[i]:
+            tracker.add(arr[hi])
+            hi += 1
+        while lo < start[i]:
+            tracker.remove(arr[lo])
+            lo += 1
+        if len(tracker) == 0:
+            med[i] = np.median(arr)
+            mad[i] = MAD_SCALE * np.median(np.abs(arr - med[i]))
+        else:
+            med[i], mad[i] = tracker.median(), tracker.mad()
+
+    return med, mad + EPS
+
+
+class RollingWindow:
+    """Multiset of samples with O(1) add/remove for mean and variance.
+
+    With robust=True a sorted copy is also kept (bisect insert/remove) so
+    median and MAD can be read without re-sorting the window.
+    """
+
+    def __init__(self, robust=False):
+        self.robust = robust
+        self.n = 0
+        self._sum = 0.0
+        self._sq = 0.0
+        self._sorted = [] if robust else None
+
+    def __len__(self):
+        return self.n
+
+    def add(self, x):
+        x = float(x)
+        self.n += 1
+        self._sum += x
+        self._sq += x * x
+        if self.robust:
+            bisect.insort(self._sorted, x)
+
+    def remove(self, x):
+        x = float(x)
+        self.n -= 1
+        self._sum -= x
+        self._sq -= x * x
+        if self.robust:
+            del self._sorted[bisect.bisect_left(self._sorted, x)]
+        if self.n == 0:
+            # drop accumulated rounding error
+            self._sum = self._sq = 0.0
+
+    def mean(self):
+        return self._sum / self.n if self.n else 0.0
+
+    def std(self):
+        if not self.n:
+            return 0.0
+        m = self._sum / self.n
+        return float(np.sqrt(max(self._sq / self.n - m * m, 0.0)))
+
+    def median(self):
+        s = self._sorted
+        k = len(s)
+        if not k:
+            return 0.0
+        if k % 2:
+            return s[k // 2]
+        return 0.5 * (s[k // 2 - 1] + s[k // 2])
+
+    def mad(self):
+        if not self._sorted:
+            return 0.0
+        med = self.median()
+        return MAD_SCALE * float(np.median(np.abs(np.asarray(self._sorted) - med)))
+
+    def center_scale(self):
+        if self.robust:
+            return self.median(), self.mad() + EPS
+        return self.mean(), self.std() + EPS
+
+
+class RollingZScore:
+    """Streaming counterpart of rolling_mean_std / rolling_median_mad.
+
+    Feed samples one at a time with push(); every call returns the frames
+    whose window just became complete as (index, z, center, scale) tuples.
+    Trailing windows emit each frame immediately; centered windows emit
+    frame i once sample i + window//2 - 1 has arrived. Call flush() at end
+    of stream to emit the remaining frames with truncated windows. The
+    emitted stats match the batch functions for the same series.
+    """
+
+    def __init__(self, window=20, centered=True, robust=False):
+        if window < 2:
+            raise ValueError("window must be >= 2")
+        self.window = window
+        self.centered = centered
+        self.half = window // 2
+        self.span = 2 * self.half if centered else window
+        self.lag = self.half - 1 if centered else 0
+
+        self.stats = RollingWindow(robust=robust)
+        self.buf = deque()       # samples currently inside the window
+        self.buf_start = 0       # index of buf[0]
+        self.count = 0           # samples pushed so far
+        self.next_emit = 0       # next frame index to emit
+
+    def _emit(self, i):
+        x = self.buf[i - self.buf_start]
+        center, scale = self.stats.center_scale()
+        return (i, (x - center) / scale, center, scale)
+
+    def _evict_before(self, first):
+        while self.buf_start < first:
+            self.stats.remove(self.buf.popleft())
+            self.buf_start += 1
+
+    def push(self, x):
+        self.buf.append(float(x))
+        self.stats.add(x)
+        self.count += 1
+
+        out = []
+        i = self.count - 1 - self.lag
+        if i < 0:
+            return out
+
+        # window of frame i ends at the newest sample; slide its start
+        self._evict_before(max(0, i - self.half) if self.centered
+                           else max(0, i - self.window + 1))
+        out.append(self._emit(i))
+        self.next_emit = i + 1
+        return out
+
+    def flush(self):
+        out = []
+        for i in range(self.next_emit, self.count):
+            if self.centered:
+                self._evict_before(max(0, i - self.half))
+            out.append(self._emit(i))
+        self.next_emit = self.count
+        return out
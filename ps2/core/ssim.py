@@ -5,7 +5,9 @@ from skimage.metrics import structural_similarity as ssim
 def compute_ssim(f1, f2):
     g1 = cv2.cvtColor(f1, cv2.COLOR_BGR2GRAY)
     g2 = cv2.cvtColor(f2, cv2.COLOR_BGR2GRAY)
+    return compute_ssim_gray(g1, g2)
 
+def compute_ssim_gray(g1, g2):
     h, w = g1.shape
 
     win = min(7, h, w)
@@ -13,4 +15,4 @@ def compute_ssim(f1, f2):
         win -= 1
     win = max(3, win)
 
-    return float(ssim(g1, g2, win_size=win))
\ No newline at end of file
+    return float(ssim(g1, g2, win_size=win))
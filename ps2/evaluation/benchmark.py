@@ -0,0 +1,185 @@
+# ps2/evaluation/benchmark.py
+"""
+Synthetic corruption benchmark.
+
+Injects frame drops / merges at known indices into clean clips, runs each
+detection stage on the corrupted clip in its own process, and reports
+per-label precision / recall, frames/sec and peak RSS as JSON:
+
+    python -m ps2.evaluation.benchmark --clip ps2/sample_videos/final.mp4 \
+        --drops 5 --merges 5 --model ps2/release/backend/best.pt --out bench.json
+"""
+import argparse
+import csv
+import json
+import multiprocessing as mp
+import os
+import queue as queue_mod
+import sys
+import time
+
+import cv2
+
+_PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", ".."))
+_BACKEND_DIR = os.path.join(_PROJECT_ROOT, "ps2", "release", "backend")
+if _PROJECT_ROOT not in sys.path:
+    sys.path.insert(0, _PROJECT_ROOT)
+
+from ps2.evaluation.corrupt import corrupt_video, plan_corruptions
+from ps2.evaluation.metrics import score
+
+DEFAULT_MODEL = os.path.join(_BACKEND_DIR, "best.pt")
+
+
+def peak_rss_mb():
+    """Peak resident set size of this process, in MB."""
+    try:
+        import resource
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # kilobytes on Linux, bytes on macOS
+        return round(peak / (1024 * 1024 if sys.platform == "darwin" else 1024), 1)
+    except ImportError:
+        import psutil
+        info = psutil.Process().memory_info()
+        return round(getattr(info, "peak_wset", info.rss) / (1024 * 1024), 1)
+
+
+def _labels_from_csv(path, frame_col="frame", label_col="label"):
+    labels = {"DROP": [], "MERGE": []}
+    with open(path, newline="") as f:
+        for row in csv.DictReader(f):
+            lab = row[label_col]
+            if lab in labels:
+                labels[lab].append(int(row[frame_col]))
+    return labels
+
+
+# ─── stages: (video, out_dir, model) -> {label: [frames]} ─────────────
+def stage_detector(video, out_dir, model):
+    if _BACKEND_DIR not in sys.path:
+        sys.path.insert(0, _BACKEND_DIR)
+    from detector import process_video
+    report = process_video(video, model, output_dir=out_dir)["report"]
+    return {"DROP": report["drop_frame_list"], "MERGE": report["merge_frame_list"]}
+
+
+def stage_pipeline(video, out_dir, model):
+    from ps2.core.features import FeatureStore
+    from ps2.scripts.run_pipeline import run_pipeline
+    # private store so the timing measures signal computation, not a cache hit
+    store = FeatureStore(os.path.join(out_dir, "features"))
+    csv_path, _ = run_pipeline(video, out_dir=out_dir, store=store)
+    return _labels_from_csv(csv_path)
+
+
+def stage_events(video, out_dir, model):
+    from ps2.scripts.run_inference import run
+    from ps2.scripts.postprocess_events import postprocess
+    det_csv, _ = run(video, model, out_dir=out_dir, render=False)
+    postprocess(video, det_csv, out_dir=out_dir, event_clips=False)
+    base = os.path.splitext(os.path.basename(video))[0]
+    return _labels_from_csv(os.path.join(out_dir, f"{base}_events.csv"))
+
+
+STAGES = {
+    "detector": (stage_detector, True),
+    "pipeline": (stage_pipeline, False),
+    "events":   (stage_events, True),
+}
+
+
+def _stage_worker(name, video, out_dir, model, queue):
+    fn, _ = STAGES[name]
+    t0 = time.perf_counter()
+    try:
+        labels = fn(video, out_dir, model)
+        queue.put({"labels": labels, "seconds": time.perf_counter() - t0,
+                   "peak_rss_mb": peak_rss_mb()})
+    except Exception as e:
+        queue.put({"error": f"{type(e).__name__}: {e}"})
+
+
+def run_stage(name, video, out_dir, model):
+    """Run one stage in a fresh process so timing and peak RSS are its own."""
+    ctx = mp.get_context("spawn")
+    queue = ctx.Queue()
+    proc = ctx.Process(target=_stage_worker, args=(name, video, out_dir, model, queue))
+    proc.start()
+    while True:
+        try:
+            result = queue.get(timeout=1.0)
+            break
+        except queue_mod.Empty:
+            if not proc.is_alive():
+                result = {"error": f"stage process exited with code {proc.exitcode}"}
+                break
+    proc.join()
+    return result
+
+
+def benchmark(clips, out_dir="ps2/results/benchmark", stages=tuple(STAGES),
+              n_drops=5, n_merges=5, seed=0, tol=1, model=DEFAULT_MODEL):
+    os.makedirs(out_dir, exist_ok=True)
+    results = {"seed": seed, "tol": tol, "clips": []}
+
+    for clip in clips:
+        base = os.path.splitext(os.path.basename(clip))[0]
+        clip_dir = os.path.join(out_dir, base)
+
+        cap = cv2.VideoCapture(clip)
+        n_src = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+        cap.release()
+
+        drops, merges = plan_corruptions(n_src, n_drops, n_merges, seed=seed)
+        corrupted = os.path.join(clip_dir, f"{base}_corrupt.mp4")
+        gt = corrupt_video(clip, corrupted, drops, merges)
+        print(f"[bench] {clip}: {len(drops)} drops, {len(merges)} merges -> {corrupted}")
+
+        entry = {"clip": os.path.basename(clip), "frames": gt["frames"],
+                 "truth": gt["labels"], "stages": {}}
+        for name in stages:
+            _, needs_model = STAGES[name]
+            if needs_model and not os.path.exists(model):
+                entry["stages"][name] = {"skipped": f"model not found: {model}"}
+                continue
+            stage_dir = os.path.join(clip_dir, name)
+            os.makedirs(stage_dir, exist_ok=True)
+            print(f"[bench]   stage {name} ...")
+            res = run_stage(name, corrupted, stage_dir, model)
+            if "error" in res:
+                entry["stages"][name] = res
+                continue
+            entry["stages"][name] = {
+                "seconds": round(res["seconds"], 3),
+                "fps": round(gt["frames"] / res["seconds"], 2) if res["seconds"] else None,
+                "peak_rss_mb": res["peak_rss_mb"],
+                "metrics": score(res["labels"], gt["labels"], gt["frames"], tol=tol),
+            }
+        results["clips"].append(entry)
+
+    return results
+
+
+if __name__ == "__main__":
+    p = argparse.ArgumentParser(description="Synthetic drop/merge benchmark")
+    p.add_argument("--clip", action="append", required=True, help="clean input clip (repeatable)")
+    p.add_argument("--out-dir", default="ps2/results/benchmark", help="working directory")
+    p.add_argument("--out", default=None, help="write JSON results here (default: stdout)")
+    p.add_argument("--stages", nargs="+", default=list(STAGES), choices=list(STAGES))
+    p.add_argument("--drops", type=int, default=5, help="number of injected drops")
+    p.add_argument("--merges", type=int, default=5, help="number of injected merges")
+    p.add_argument("--seed", type=int, default=0)
+    p.add_argument("--tol", type=int, default=1, help="frame tolerance when matching events")
+    p.add_argument("--model", default=DEFAULT_MODEL, help="YOLO weights for model stages")
+    args = p.parse_args()
+
+    res = benchmark(args.clip, out_dir=args.out_dir, stages=args.stages,
+                    n_drops=args.drops, n_merges=args.merges, seed=args.seed,
+                    tol=args.tol, model=args.model)
+    text = json.dumps(res, indent=2)
+    if args.out:
+        with open(args.out, "w") as f:
+            f.write(text)
+        print("Saved:", args.out)
+    else:
+        print(text)
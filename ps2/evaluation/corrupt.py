@@ -0,0 +1,95 @@
+# ps2/evaluation/corrupt.py
+import json
+import os
+import random
+
+import cv2
+
+
+def plan_corruptions(n_frames, n_drops, n_merges, seed=0, margin=10, min_gap=8):
+    """Pick source indices for drops and merges, kept `min_gap` apart and
+    away from the first/last `margin` frames so every event has context."""
+    rng = random.Random(seed)
+    pool = list(range(margin, max(margin, n_frames - margin - 1)))
+    rng.shuffle(pool)
+
+    taken = []
+    for k in pool:
+        if len(taken) == n_drops + n_merges:
+            break
+        if all(abs(k - t) >= min_gap for t in taken):
+            taken.append(k)
+
+    drops = sorted(taken[:n_drops])
+    merges = sorted(taken[n_drops:])
+    return drops, merges
+
+
+def corrupt_video(src, dst, drops=(), merges=(), fourcc="mp4v"):
+    """
+    Write `src` to `dst` with frames deleted at `drops` and pairs blended
+    at `merges` (source indices). A merge replaces frames k and k+1 with
+    their 50/50 blend.
+
+    Ground truth is expressed in output frame indices: a DROP is the first
+    frame after a gap, a MERGE is the blended frame. It is returned and
+    saved next to `dst` as <stem>_gt.json.
+    """
+    drops, merges = set(drops), set(merges)
+    if drops & (merges | {m + 1 for m in merges}):
+        raise ValueError("drop and merge indices overlap")
+
+    cap = cv2.VideoCapture(src)
+    if not cap.isOpened():
+        raise RuntimeError(f"Cannot open video: {src}")
+    fps = cap.get(cv2.CAP_PROP_FPS) or 30.0
+    w = int(cap.get(cv2.CAP_PROP_FRAME_WIDTH))
+    h = int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
+
+    os.makedirs(os.path.dirname(os.path.abspath(dst)), exist_ok=True)
+    writer = cv2.VideoWriter(dst, cv2.VideoWriter_fourcc(*fourcc), fps, (w, h))
+
+    labels = {"DROP": [], "MERGE": []}
+    k = 0
+    out_idx = 0
+    after_gap = False
+    held = None
+
+    while True:
+        ret, frame = cap.read()
+        if not ret:
+            break
+
+        if k in drops:
+            after_gap = True
+        elif k in merges:
+            held = frame
+        else:
+            if held is not None:
+                frame = cv2.addWeighted(held, 0.5, frame, 0.5, 0)
+                labels["MERGE"].append(out_idx)
+                held = None
+            elif after_gap:
+                labels["DROP"].append(out_idx)
+            after_gap = False
+            writer.write(frame)
+            out_idx += 1
+        k += 1
+
+    cap.release()
+    writer.release()
+
+    gt = {
+        "source": os.path.basename(src),
+        "video": os.path.basename(dst),
+        "fps": fps,
+        "source_frames": k,
+        "frames": out_idx,
+        "drops_src": sorted(drops),
+        "merges_src": sorted(merges),
+        "labels": labels,
+    }
+    gt_path = os.path.splitext(dst)[0] + "_gt.json"
+    with open(gt_path, "w") as f:
+        json.dump(gt, f, indent=2)
+    return gt
@@ -0,0 +1,46 @@
+# ps2/evaluation/metrics.py
+
+LABELS = ("DROP", "MERGE")
+
+
+def match_events(predicted, truth, tol=1):
+    """Greedy one-to-one matching of frame indices within +/- tol.
+
+    Returns (tp, fp, fn) where tp counts matched predictions. A predicted
+    frame with no ground-truth event in range is a false positive.
+    """
+    predicted = sorted(set(int(p) for p in predicted))
+    truth = sorted(set(int(t) for t in truth))
+    used = set()
+    tp = 0
+    for p in predicted:
+        best = None
+        for t in truth:
+            if t in used or abs(t - p) > tol:
+                continue
+            if best is None or abs(t - p) < abs(best - p):
+                best = t
+        if best is not None:
+            used.add(best)
+            tp += 1
+    return tp, len(predicted) - tp, len(truth) - len(used)
+
+
+def score(predicted, truth, n_frames, tol=1):
+    """Per-label precision / recall / false-positive rate.
+
+    predicted, truth : dict label -> iterable of frame indices
+    """
+    out = {}
+    for label in LABELS:
+        tp, fp, fn = match_events(predicted.get(label, ()), truth.get(label, ()), tol)
+        negatives = max(1, n_frames - len(set(truth.get(label, ()))))
+        out[label] = {
+            "tp": tp,
+            "fp": fp,
+            "fn": fn,
+            "precision": round(tp / (tp + fp), 4) if tp + fp else 0.0,
+            "recall": round(tp / (tp + fn), 4) if tp + fn else 0.0,
+            "fp_rate": round(fp / negatives, 6),
+        }
+    return out
@@ -0,0 +1,238 @@
+# ps2/evaluation/sweep.py
+"""
+Parallel threshold sweep against labelled corruption indices.
+
+Evaluates a grid or random sample of thresholds for one target, reusing
+cached per-frame data so no configuration decodes video:
+
+    detector – detector.DEFAULT_CFG, replayed from <base>_detections.npz
+    fusion   – fusion.FUSION_CFG, on signals from the feature store
+    events   – postprocess_events thresholds, on a run_inference CSV
+
+Ground truth is the <stem>_gt.json written by corrupt.corrupt_video.
+
+    python -m ps2.evaluation.sweep --gt clip_corrupt_gt.json --target fusion \
+        --grid DROP_FLOW_Z=1,1.5,2 --grid MERGE_SSIM_MIN=0.97,0.98,0.99
+"""
+import argparse
+import csv
+import itertools
+import json
+import os
+import random
+import sys
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+_PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", ".."))
+_BACKEND_DIR = os.path.join(_PROJECT_ROOT, "ps2", "release", "backend")
+if _PROJECT_ROOT not in sys.path:
+    sys.path.insert(0, _PROJECT_ROOT)
+
+from ps2.evaluation.metrics import LABELS, score
+
+# per-process state, filled once by _init_worker
+_STATE = {}
+
+
+class Infeasible(Exception):
+    """The cached data cannot answer this config (e.g. YOLO_CONF below the recorded one)."""
+
+
+def _parse_value(text):
+    try:
+        return int(text)
+    except ValueError:
+        return float(text)
+
+
+def grid_configs(grid):
+    """grid: dict key -> list of values; yields every combination."""
+    keys = list(grid)
+    for values in itertools.product(*(grid[k] for k in keys)):
+        yield dict(zip(keys, values))
+
+
+def random_configs(ranges, n, seed=0):
+    """ranges: dict key -> (lo, hi); ints stay ints, anything else is uniform."""
+    rng = random.Random(seed)
+    for _ in range(n):
+        cfg = {}
+        for k, (lo, hi) in ranges.items():
+            if isinstance(lo, int) and isinstance(hi, int):
+                cfg[k] = rng.randint(lo, hi)
+            else:
+                cfg[k] = round(rng.uniform(lo, hi), 4)
+        yield cfg
+
+
+# ─── targets: load once per worker, evaluate per config ──────────────
+def _load_detector(video, source):
+    if _BACKEND_DIR not in sys.path:
+        sys.path.insert(0, _BACKEND_DIR)
+    import detector
+    return {"detector": detector,
+            "cache": detector.load_detection_cache(video, cache_path=source)}
+
+
+def _eval_detector(cfg):
+    detector, cache = _STATE["detector"], _STATE["cache"]
+    # reanalyze refuses these: the boxes below the recorded threshold were never kept
+    if {**detector.DEFAULT_CFG, **cfg}["YOLO_CONF"] < cache.meta["yolo_conf"]:
+        raise Infeasible(f"YOLO_CONF below the recorded {cache.meta['yolo_conf']}")
+    report = detector.reanalyze(None, cfg, cache=cache)["report"]
+    return {"DROP": report["drop_frame_list"], "MERGE": report["merge_frame_list"]}
+
+
+def _load_fusion(video, source):
+    from ps2.core.features import FeatureStore
+    signals, _ = FeatureStore(source).get_or_compute(video)
+    return {"signals": signals}
+
+
+def _eval_fusion(cfg):
+    from ps2.core.fusion import classify_all
+    s = _STATE["signals"]
+    labels, _ = classify_all(s["flow"], s["ssim"], s["blur"], cfg)
+    return {lab: np.nonzero(labels == lab)[0].tolist() for lab in LABELS}
+
+
+def _load_events(video, source):
+    from ps2.scripts.postprocess_events import load_dets, parse_dets
+    detected, centers, _ = parse_dets(load_dets(source))
+    return {"detected": detected, "centers": centers}
+
+
+def _eval_events(cfg):
+    from ps2.scripts.postprocess_events import label_events
+    labels = label_events(_STATE["detected"], _STATE["centers"], **cfg)
+    return {lab: [i for i, l in enumerate(labels) if l == lab] for lab in LABELS}
+
+
+TARGETS = {
+    "detector": (_load_detector, _eval_detector),
+    "fusion":   (_load_fusion, _eval_fusion),
+    "events":   (_load_events, _eval_events),
+}
+
+
+def _init_worker(target, video, source, truth, n_frames, tol):
+    load, _ = TARGETS[target]
+    _STATE.clear()
+    _STATE.update(load(video, source))
+    _STATE.update(target=target, truth=truth, n_frames=n_frames, tol=tol)
+
+
+def _evaluate(cfg):
+    _, evaluate = TARGETS[_STATE["target"]]
+    try:
+        predicted = evaluate(cfg)
+    except Infeasible as e:
+        return {**cfg, "infeasible": str(e)}
+    metrics = score(predicted, _STATE["truth"], _STATE["n_frames"], tol=_STATE["tol"])
+
+    tp = sum(m["tp"] for m in metrics.values())
+    fp = sum(m["fp"] for m in metrics.values())
+    fn = sum(m["fn"] for m in metrics.values())
+    row = dict(cfg)
+    row["recall"] = round(tp / (tp + fn), 4) if tp + fn else 0.0
+    row["fp_rate"] = round(fp / max(1, _STATE["n_frames"]), 6)
+    for lab, m in metrics.items():
+        row[f"{lab}_recall"] = m["recall"]
+        row[f"{lab}_fp_rate"] = m["fp_rate"]
+    return row
+
+
+def pareto_front(rows):
+    """Rows not dominated on (higher recall, lower fp_rate); infeasible rows are left out."""
+    front = []
+    best_recall = -1.0
+    rows = [r for r in rows if "infeasible" not in r]
+    for row in sorted(rows, key=lambda r: (r["fp_rate"], -r["recall"])):
+        if row["recall"] > best_recall:
+            front.append(row)
+            best_recall = row["recall"]
+    return front
+
+
+def sweep(target, gt_path, configs, source=None, video=None, workers=None, tol=1):
+    with open(gt_path) as f:
+        gt = json.load(f)
+    video = video or os.path.join(os.path.dirname(os.path.abspath(gt_path)), gt["video"])
+    configs = list(configs)
+
+    # warm the feature store once in the parent so workers only read it
+    if target == "fusion":
+        _load_fusion(video, source)
+
+    print(f"[sweep] {target}: {len(configs)} configs on {os.path.basename(video)}")
+    initargs = (target, video, source, gt["labels"], gt["frames"], tol)
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                             initargs=initargs) as pool:
+        chunk = max(1, len(configs) // (4 * (workers or os.cpu_count() or 1)))
+        rows = list(pool.map(_evaluate, configs, chunksize=chunk))
+
+    skipped = sum("infeasible" in r for r in rows)
+    if skipped:
+        print(f"[sweep] {skipped} configs infeasible on the cached data, left out of the front")
+
+    return {"target": target, "video": os.path.basename(video), "tol": tol,
+            "results": rows, "pareto": pareto_front(rows)}
+
+
+def _print_table(rows):
+    if not rows:
+        return
+    cols = list(rows[0])
+    print("  ".join(f"{c:>14}" for c in cols))
+    for r in rows:
+        print("  ".join(f"{str(r[c]):>14}" for c in cols))
+
+
+if __name__ == "__main__":
+    p = argparse.ArgumentParser(description="Parallel threshold sweep")
+    p.add_argument("--gt", required=True, help="ground truth json from corrupt_video")
+    p.add_argument("--target", required=True, choices=list(TARGETS))
+    p.add_argument("--source", default=None,
+                   help="detector: detections .npz; fusion: feature store root; events: detections csv")
+    p.add_argument("--video", default=None, help="corrupted clip (default: next to --gt)")
+    p.add_argument("--grid", action="append", default=[], metavar="KEY=v1,v2,...")
+    p.add_argument("--range", action="append", default=[], metavar="KEY=lo:hi")
+    p.add_argument("--random", type=int, default=0, help="number of random configs from --range")
+    p.add_argument("--seed", type=int, default=0)
+    p.add_argument("--workers", type=int, default=None)
+    p.add_argument("--tol", type=int, default=1)
+    p.add_argument("--out", default=None, help="write results json here; pareto csv alongside")
+    args = p.parse_args()
+
+    if args.random:
+        ranges = {}
+        for spec in args.range:
+            k, v = spec.split("=", 1)
+            lo, hi = v.split(":")
+            ranges[k] = (_parse_value(lo), _parse_value(hi))
+        configs = random_configs(ranges, args.random, seed=args.seed)
+    else:
+        grid = {}
+        for spec in args.grid:
+            k, v = spec.split("=", 1)
+            grid[k] = [_parse_value(x) for x in v.split(",")]
+        configs = grid_configs(grid)
+
+    res = sweep(args.target, args.gt, configs, source=args.source, video=args.video,
+                workers=args.workers, tol=args.tol)
+
+    print("\n--- Pareto front (recall vs fp_rate) ---")
+    _print_table(res["pareto"])
+
+    if args.out:
+        with open(args.out, "w") as f:
+            json.dump(res, f, indent=2)
+        pareto_csv = os.path.splitext(args.out)[0] + "_pareto.csv"
+        if res["pareto"]:
+            with open(pareto_csv, "w", newline="") as f:
+                w = csv.DictWriter(f, fieldnames=list(res["pareto"][0]))
+                w.writeheader()
+                w.writerows(res["pareto"])
+        print("Saved:", args.out, pareto_csv)
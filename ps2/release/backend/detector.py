@@ -3,19 +3,27 @@ Ball detection engine — Kalman-filtered, ROI-constrained, motion-gated.
 
 Provides `process_video(video_path, model_path)` that returns:
     {
-        "annotated_video": "<filename>.mp4",
+        "annotated_video": "<filename>.mp4",       # None with render=False
+        "overlay_file": "<filename>_overlay.json",
         "report": { ... summary ... },
         "report_file": "<filename>_report.json",
     }
 """
 
+import bisect
 import cv2
 import math
 import os
 import json
+import hashlib
+import importlib
+import threading
+import time
 import numpy as np
-from ultralytics import YOLO
-from skimage.metrics import structural_similarity as ssim
+
+from encoder import VideoEncoder
+from memory import MemoryBudget, MemoryBudgetExceeded
+from previews import PreviewBuilder
 
 # ─── DEFAULT TUNING KNOBS ─────────────────────────────────────────────
 DEFAULT_CFG = {
@@ -30,122 +38,564 @@ DEFAULT_CFG = {
     "ROI_SEARCH_PX":        200,
     "ROI_MIN_ACCEPTED":     3,
     "DROP_GAP_MIN":         2,
+    # motion gate: skip inference on frames that barely changed (0 = off)
+    "MOTION_GATE_PIXELS":   0,     # skip if fewer pixels changed vs last inferred frame
+    "MOTION_GATE_DIFF":     25,    # gray-level change that counts a pixel as changed
+    "MOTION_GATE_SCALE":    0.25,  # downscale before differencing
+    "MOTION_GATE_GUARD":    10,    # no skipping this many frames after an anomaly
+    "MOTION_GATE_MAX_SKIP": 15,    # force inference after this many skips in a row
+    # adaptive stride: infer every k-th frame while locked, Kalman-fill between (1 = off)
+    "STRIDE_MAX":           1,
+    "STRIDE_RESIDUAL_FRAC": 0.5,   # residual > frac * GATE_THRESHOLD_PX → back to dense
+    # tiled full-frame search: overlapping native-resolution tiles in one batch (0 = off)
+    "TILE_SIZE":            0,     # e.g. 640; frames no larger than this are not tiled
+    "TILE_OVERLAP":         64,    # px shared by neighbouring tiles, > ball diameter
+    "TILE_DEDUP_OVERLAP":   0.5,   # intersection / smaller box above this = same ball
+    # cascade: low-res full-frame proposals confirmed on native-res crops (0 = off)
+    "CASCADE_SCALE":        0,     # e.g. 0.25; coarse pass runs on the frame scaled by this
+    "CASCADE_COARSE_CONF":  0.05,  # proposals are kept above this (final check uses YOLO_CONF)
+    "CASCADE_MAX_CANDIDATES": 8,
+    "CASCADE_CROP_PX":      96,    # confirm crop = proposal centre ± this
+    "CASCADE_FALLBACK_EVERY": 10,  # full-resolution search on every n-th empty cascade frame
 }
 
-# ─── MODEL CACHE (load once, reuse across requests) ──────────────────
-_model_cache = {}
+# ─── LAZY HEAVY IMPORTS ───────────────────────────────────────────────
+# ultralytics (and torch behind it) and skimage take seconds to import;
+# they are pulled in on first use so importing this module stays cheap.
+IMPORT_TIMES = {}    # module -> seconds its first import took
 
-def _get_model(model_path: str) -> YOLO:
-    if model_path not in _model_cache:
-        _model_cache[model_path] = YOLO(model_path)
-    return _model_cache[model_path]
+def _lazy_import(name: str):
+    if name not in IMPORT_TIMES:
+        t0 = time.perf_counter()
+        importlib.import_module(name)
+        IMPORT_TIMES[name] = round(time.perf_counter() - t0, 3)
+    return importlib.import_module(name)
 
 
-def _scan_boxes(results, off_x, off_y, pred_x, pred_y, has_prediction, cfg):
-    """Return (best_candidate, min_error) — candidate closest to predicted pos."""
-    best_candidate = None
-    min_error = float("inf")
-    for result in results:
-        for box in result.boxes:
-            lx1, ly1, lx2, ly2 = map(int, box.xyxy[0])
-            conf = float(box.conf[0])
-            x1 = lx1 + off_x;  x2 = lx2 + off_x
-            y1 = ly1 + off_y;  y2 = ly2 + off_y
-            area = (x2 - x1) * (y2 - y1)
-            cx = (x1 + x2) // 2
-            cy = (y1 + y2) // 2
-            if area < cfg["BALL_AREA_MIN"] or area > cfg["BALL_AREA_MAX"]:
-                continue
-            error = (math.sqrt((cx - pred_x)**2 + (cy - pred_y)**2)
-                     if has_prediction else 0.0)
-            if error < min_error:
-                min_error = error
-                best_candidate = (x1, y1, x2, y2, cx, cy, area, conf)
-    return best_candidate, min_error
+def ssim(a, b):
+    return _lazy_import("skimage.metrics").structural_similarity(a, b)
 
 
-# ═══════════════════════════════════════════════════════════════════════
-# PUBLIC API
-# ═══════════════════════════════════════════════════════════════════════
+# ─── MODEL CACHE (load once, reuse across requests) ──────────────────
+_model_cache = {}
+_model_lock  = threading.Lock()
 
-def process_video(video_path: str, model_path: str = "best.pt", cfg: dict = None, output_dir: str = None):
-    """
-    Full ball tracking pipeline.
+def _get_model(model_path: str):
+    # the lock keeps a request and the startup preload from loading twice
+    with _model_lock:
+        if model_path not in _model_cache:
+            _model_cache[model_path] = _lazy_import("ultralytics").YOLO(model_path)
+        return _model_cache[model_path]
 
-    Parameters
-    ----------
-    video_path : str   – path to input video
-    model_path : str   – path to YOLO .pt weights
-    cfg        : dict  – override any key from DEFAULT_CFG
 
-    Returns
-    -------
-    dict with keys  annotated_video, report, report_file
+def preload_model(model_path: str = "best.pt", warmup_size: int = 640) -> dict:
     """
-    c = {**DEFAULT_CFG, **(cfg or {})}
+    Import ultralytics, load the weights into the cache and run one dummy
+    inference so the first request does not pay for CUDA/graph setup.
+    Returns the seconds spent in each step.
+    """
+    model_path = _resolve_model_path(model_path)
+    _lazy_import("ultralytics")
+    t0 = time.perf_counter()
+    model = _get_model(model_path)
+    t1 = time.perf_counter()
+    model.predict(np.zeros((warmup_size, warmup_size, 3), np.uint8), verbose=False)
+    t2 = time.perf_counter()
+    timings = {
+        "import_s": IMPORT_TIMES["ultralytics"],
+        "load_s":   round(t1 - t0, 3),
+        "warmup_s": round(t2 - t1, 3),
+    }
+    print(f"[detector] Model ready: {model_path}  "
+          f"(import {timings['import_s']}s, load {timings['load_s']}s, warm-up {timings['warmup_s']}s)")
+    return timings
+
 
-    # resolve model path relative to this file
+def _resolve_model_path(model_path: str) -> str:
+    """Resolve a relative weights path against this file's directory."""
     if not os.path.isabs(model_path):
         here = os.path.dirname(os.path.abspath(__file__))
         candidate = os.path.join(here, model_path)
         if os.path.exists(candidate):
-            model_path = candidate
+            return candidate
+    return model_path
 
-    model = _get_model(model_path)
 
-    # ── open video ────────────────────────────────────────────────────
-    cap = cv2.VideoCapture(video_path)
-    if not cap.isOpened():
-        raise ValueError(f"Cannot open video: {video_path}")
+def _boxes_from_results(results, off_x, off_y):
+    """Flatten YOLO results into frame-coordinate (x1, y1, x2, y2, conf) tuples."""
+    boxes = []
+    for result in results:
+        for box in result.boxes:
+            lx1, ly1, lx2, ly2 = map(int, box.xyxy[0])
+            conf = float(box.conf[0])
+            boxes.append((lx1 + off_x, ly1 + off_y, lx2 + off_x, ly2 + off_y, conf))
+    return boxes
 
-    total_frames = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
-    fps          = cap.get(cv2.CAP_PROP_FPS)
-    frame_w      = int(cap.get(cv2.CAP_PROP_FRAME_WIDTH))
-    frame_h      = int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
 
-    if output_dir is None:
-        output_dir = os.path.dirname(video_path)
-    else:
-        os.makedirs(output_dir, exist_ok=True)
-    
-    basename   = os.path.splitext(os.path.basename(video_path))[0]
-    annotated_path = os.path.join(output_dir, f"{basename}_annotated.mp4")
-    report_path    = os.path.join(output_dir, f"{basename}_report.json")
+def _tile_grid(frame_w, frame_h, tile, overlap):
+    """
+    (x1, y1, x2, y2) tiles of at most `tile` px covering the frame, with at
+    least `overlap` px shared between neighbours.  The count grows with the
+    resolution: one tile up to `tile`, 8 for 1080p and 28 for 4K at 640/64.
+    """
+    def starts(length):
+        if length <= tile:
+            return [0]
+        n = math.ceil((length - overlap) / (tile - overlap))
+        step = (length - tile) / (n - 1)
+        return [round(i * step) for i in range(n)]
 
-    print(f"[detector] {video_path}  |  {total_frames} frames @ {fps:.1f} FPS  |  {frame_w}x{frame_h}")
+    return [(x, y, min(frame_w, x + tile), min(frame_h, y + tile))
+            for y in starts(frame_h) for x in starts(frame_w)]
 
-    # ══════════════════════════════════════════════════════════════════
-    # PASS 1 — Kalman + ROI-constrained detection
-    # ══════════════════════════════════════════════════════════════════
-    ball_history  = []
-    drop_frames   = set()
-    drop_evidence = {}
-    frame_id      = 0
 
-    def _mark_drop(frames_iter, label):
-        for f in frames_iter:
-            drop_frames.add(f)
-            drop_evidence.setdefault(f, []).append(label)
+def _dedup_boxes(boxes, max_overlap):
+    """
+    Drop boxes that mostly lie inside a higher-confidence one — the same
+    ball seen by two overlapping tiles, possibly cut by a tile edge.
+    """
+    kept = []
+    for b in sorted(boxes, key=lambda b: (-b[4], -(b[2] - b[0]) * (b[3] - b[1]))):
+        x1, y1, x2, y2, _ = b
+        area = max(1, (x2 - x1) * (y2 - y1))
+        for k1, l1, k2, l2, _ in kept:
+            iw = min(x2, k2) - max(x1, k1)
+            ih = min(y2, l2) - max(y1, l1)
+            if iw > 0 and ih > 0:
+                smaller = min(area, max(1, (k2 - k1) * (l2 - l1)))
+                if iw * ih / smaller > max_overlap:
+                    break
+        else:
+            kept.append(b)
+    return kept
+
+
+def _scan_boxes(boxes, pred_x, pred_y, has_prediction, cfg):
+    """Return (best_candidate, min_error) — candidate closest to predicted pos."""
+    best_candidate = None
+    min_error = float("inf")
+    for x1, y1, x2, y2, conf in boxes:
+        area = (x2 - x1) * (y2 - y1)
+        cx = (x1 + x2) // 2
+        cy = (y1 + y2) // 2
+        if area < cfg["BALL_AREA_MIN"] or area > cfg["BALL_AREA_MAX"]:
+            continue
+        error = (math.sqrt((cx - pred_x)**2 + (cy - pred_y)**2)
+                 if has_prediction else 0.0)
+        if error < min_error:
+            min_error = error
+            best_candidate = (x1, y1, x2, y2, cx, cy, area, conf)
+    return best_candidate, min_error
 
+
+def _roi_patch(frame, bbox):
+    """(grayscale patch, Laplacian variance) of the bbox, or (None, 0.0)."""
+    x1, y1, x2, y2 = bbox
+    ball_roi = frame[y1:y2, x1:x2]
+    if ball_roi.size > 0:
+        gray_ball = cv2.cvtColor(ball_roi, cv2.COLOR_BGR2GRAY)
+        return gray_ball, cv2.Laplacian(gray_ball, cv2.CV_64F).var()
+    return None, 0.0
+
+
+def _new_kalman() -> cv2.KalmanFilter:
     kf = cv2.KalmanFilter(4, 2)
     kf.measurementMatrix   = np.array([[1,0,0,0],[0,1,0,0]], np.float32)
     kf.transitionMatrix    = np.array([[1,0,1,0],[0,1,0,1],[0,0,1,0],[0,0,0,1]], np.float32)
     kf.processNoiseCov     = np.eye(4, dtype=np.float32) * 1e-2
     kf.measurementNoiseCov = np.eye(2, dtype=np.float32) * 5e-1
     kf.errorCovPost        = np.eye(4, dtype=np.float32)
-    kf_initialized  = False
-    kf_accepted_cnt = 0
+    return kf
+
+
+class BallTracker:
+    """
+    Pass-1 state machine — Kalman + ROI-constrained detection.
+
+    Feed frames in order through `update(frame_id, frame)`.  Tracked
+    positions accumulate in `ball_history` (any list-like; pass a bounded
+    deque for streaming use) and drop evidence in `drop_frames` /
+    `drop_evidence`.  An optional `recorder` (DetectionRecorder) keeps
+    every raw detection call so the run can be replayed later.
+
+    With MOTION_GATE_PIXELS > 0, frames where fewer than that many pixels
+    of the downscaled gray image changed by MOTION_GATE_DIFF since the
+    last inferred frame (inside the ROI once tracking is locked) skip
+    inference and take the Kalman prediction; they are listed in
+    `skipped_frames`.  Gating is off while the last inferred frame was
+    anomalous (a miss, a drop or low confidence), for MOTION_GATE_GUARD
+    frames after it, and once the prediction would have moved the ball by
+    BALL_RADIUS_EST since the last inferred frame (an unchanged image
+    then means the filter is wrong, e.g. the ball stopped).
+
+    With TILE_SIZE > 0, full-frame searches (cold start, lost track, ROI
+    fallback) on frames larger than one tile run YOLO once on a batch of
+    overlapping native-resolution tiles (`tiles`) instead of the
+    downscaled frame, so small balls in 1080p/4K sources stay
+    detectable.  Merged boxes are recorded as a single full-frame call.
+
+    With CASCADE_SCALE > 0, those full-frame searches first run YOLO on the
+    frame scaled by CASCADE_SCALE; proposals within BALL_AREA_MIN..MAX are
+    re-scored on native-resolution crops of ±CASCADE_CROP_PX in one batch
+    and only confirmed boxes are returned.  When nothing is confirmed, the
+    first empty frame and then every CASCADE_FALLBACK_EVERY-th empty frame
+    in a row fall back to a full-resolution search (the tiles, or the
+    plain full frame), so a ball too small to survive the downscale is
+    still re-acquired within that many frames.
+
+    With STRIDE_MAX > 1, once the track is locked only every k-th frame
+    is inferred and the frames between are filled from the Kalman
+    prediction (`filled_frames`).  k grows by one per clean inferred
+    frame up to STRIDE_MAX.  If the inferred frame is anomalous — a miss,
+    low confidence, a blur drop, or a residual above STRIDE_RESIDUAL_FRAC
+    of GATE_THRESHOLD_PX — the fills are rolled back, the buffered frames
+    are re-run densely (the inferred frame reuses its boxes) and k resets
+    to 1.  Call `finish()` after the
+    last frame.
+    """
+
+    def __init__(self, model, cfg: dict, frame_w: int, frame_h: int, history=None,
+                 recorder=None):
+        self.model    = model
+        self.c        = cfg
+        self.recorder = recorder
+        self.frame_w  = frame_w
+        self.frame_h  = frame_h
+        self.tiles    = (_tile_grid(frame_w, frame_h, cfg["TILE_SIZE"], cfg["TILE_OVERLAP"])
+                         if cfg["TILE_SIZE"] > 0 else [])
+        self._cascade_misses = 0      # empty cascade searches in a row
+
+        self.ball_history  = [] if history is None else history
+        self.drop_frames   = set()
+        self.drop_evidence = {}
+
+        self.kf = _new_kalman()
+        self.kf_initialized  = False
+        self.kf_accepted_cnt = 0
 
-    r = c["BALL_RADIUS_EST"]
+        self.skipped_frames = set()
+        self._gate_ref      = None    # downscaled gray of the last inferred frame
+        self._gate_run      = 0
+        self._last_clean    = False   # last inferred frame was not anomalous
+        self._last_anomaly  = -(1 << 30)
 
-    print("[detector] Pass 1 — Kalman + ROI-constrained detection ...")
+        self.filled_frames  = set()
+        self.last_residual  = None    # detection-to-prediction distance of the last step
+        self._stride        = 1
+        self._next_infer    = 0
+        self._pending       = []      # (frame_id, frame) waiting for the next inferred frame
+        self._journal       = None    # drop marks made during a stride attempt
+        self._last_blur     = 0.0
+        self._last_calls    = {}      # search region -> boxes of the last inferred frame
 
-    while True:
-        ret, frame = cap.read()
-        if not ret:
-            break
+        self._merge_upto    = 1       # entries before this have a settled "merge" flag
+        self._released      = 0       # entries before this had their ROI patch dropped
 
-        use_roi = kf_initialized and kf_accepted_cnt >= c["ROI_MIN_ACCEPTED"]
+    def mark_drop(self, frames_iter, label):
+        for f in frames_iter:
+            self.drop_frames.add(f)
+            self.drop_evidence.setdefault(f, []).append(label)
+            if self._journal is not None:
+                self._journal.append(f)
+
+    def _gate_region(self, shape, scale):
+        h, w = shape[:2]
+        if (self.kf_initialized and self.kf_accepted_cnt >= self.c["ROI_MIN_ACCEPTED"]
+                and self.ball_history):
+            cx, cy = self.ball_history[-1]["center"]
+            r = self.c["ROI_SEARCH_PX"]
+            return (slice(max(0, int((cy - r) * scale)), min(h, int((cy + r) * scale) + 1)),
+                    slice(max(0, int((cx - r) * scale)), min(w, int((cx + r) * scale) + 1)))
+        return slice(None), slice(None)
+
+    def motion_gate(self, frame_id: int, frame) -> bool:
+        """True if `frame` may skip inference; otherwise it becomes the new reference."""
+        c = self.c
+        if c["MOTION_GATE_PIXELS"] <= 0:
+            return False
+        scale = c["MOTION_GATE_SCALE"]
+        small = cv2.cvtColor(cv2.resize(frame, None, fx=scale, fy=scale,
+                                        interpolation=cv2.INTER_AREA), cv2.COLOR_BGR2GRAY)
+        ref = self._gate_ref
+        if (ref is not None and self._last_clean
+                and frame_id - self._last_anomaly > c["MOTION_GATE_GUARD"]
+                and self._gate_run < c["MOTION_GATE_MAX_SKIP"]
+                and self._gate_drift() < c["BALL_RADIUS_EST"]):
+            region = self._gate_region(small.shape, scale)
+            diff = cv2.absdiff(small[region], ref[region])
+            if diff.size and cv2.countNonZero((diff > c["MOTION_GATE_DIFF"]).view(np.uint8)) < c["MOTION_GATE_PIXELS"]:
+                self._gate_run += 1
+                return True
+        self._gate_ref = small
+        self._gate_run = 0
+        return False
+
+    def _gate_drift(self) -> float:
+        """Pixels the Kalman would move the ball by skipping one more frame, since the last inference."""
+        if not self.kf_initialized:
+            return 0.0
+        vx, vy = self.kf.statePost[2, 0], self.kf.statePost[3, 0]
+        return math.hypot(vx, vy) * (self._gate_run + 1)
+
+    def skip(self, frame_id: int):
+        """Kalman-predicted entry for a gated frame; None if nothing is tracked yet."""
+        self.skipped_frames.add(frame_id)
+        if self.recorder is not None:
+            self.recorder.record_skip(frame_id)
+        # gating only follows a clean inferred frame, so the filter is running
+        if not self.kf_initialized:
+            return None
+        return self._predict_entry(frame_id, skipped=True)
+
+    def _note_inferred(self, frame_id: int, entry):
+        anomalous = (entry is None or frame_id in self.drop_frames
+                     or entry["conf"] < self.c["LOW_CONF_MERGE"])
+        if anomalous:
+            self._last_anomaly = frame_id
+        self._last_clean = not anomalous
+
+    # ── adaptive stride ──────────────────────────────────────────────
+    def fill(self, frame_id: int):
+        """Kalman-predicted entry for a frame inference was not run on; None if nothing is tracked yet."""
+        # a replay with stricter thresholds can reject the detection that started the filter
+        if not self.kf_initialized:
+            return None
+        self.filled_frames.add(frame_id)
+        return self._predict_entry(frame_id, filled=True)
+
+    def _predict_entry(self, frame_id: int, **flags):
+        pred = self.kf.predict()
+        cx, cy = int(pred[0, 0]), int(pred[1, 0])
+        r = self.c["BALL_RADIUS_EST"]
+        entry = {
+            "frame": frame_id, "center": (cx, cy),
+            "bbox": (cx - r, cy - r, cx + r, cy + r), "area": (2*r)**2, "conf": 0.0,
+            "predicted": True, **flags, "roi_gray": None, "blur": 0.0,
+        }
+        self.ball_history.append(entry)
+        return entry
+
+    def _stride_anomaly(self, entry) -> bool:
+        c = self.c
+        if entry is None or entry["predicted"] or entry["conf"] < c["LOW_CONF_MERGE"]:
+            return True
+        if (self.last_residual is not None
+                and self.last_residual > c["STRIDE_RESIDUAL_FRAC"] * c["GATE_THRESHOLD_PX"]):
+            return True
+        return self._last_blur > 0 and entry["blur"] < self._last_blur * c["MERGE_BLUR_RATIO"]
+
+    def _adapt_stride(self, frame_id: int, entry):
+        if self._stride_anomaly(entry):
+            self._stride = 1
+        elif self.kf_initialized and self.kf_accepted_cnt >= self.c["ROI_MIN_ACCEPTED"]:
+            self._stride = min(self.c["STRIDE_MAX"], self._stride + 1)
+        if entry is not None and not entry["predicted"]:
+            self._last_blur = entry["blur"]
+        self._next_infer = frame_id + self._stride
+
+    def _snapshot(self):
+        kf = self.kf
+        return (kf.statePre.copy(), kf.statePost.copy(), kf.errorCovPre.copy(),
+                kf.errorCovPost.copy(), self.kf_initialized, self.kf_accepted_cnt,
+                len(self.ball_history), self.last_residual, self._last_blur,
+                self._last_clean, self._last_anomaly)
+
+    def _restore(self, snap, journal):
+        kf = self.kf
+        (kf.statePre, kf.statePost, kf.errorCovPre, kf.errorCovPost,
+         self.kf_initialized, self.kf_accepted_cnt, n, self.last_residual,
+         self._last_blur, self._last_clean, self._last_anomaly) = snap
+        while len(self.ball_history) > n:
+            self.filled_frames.discard(self.ball_history.pop()["frame"])
+        for f in journal:
+            self.drop_frames.discard(f)
+            self.drop_evidence.pop(f, None)
+
+    def _flush_pending(self):
+        for fid, _ in self._pending:
+            self.fill(fid)
+            if self.recorder is not None:
+                self.recorder.record_fill(fid)
+        self._pending = []
+
+    def release_patches(self):
+        """
+        Low-memory mode: settle the merge test of every entry whose
+        neighbours are final (all of them between update() calls) and drop
+        the ROI patches no later test needs.  `_post_pass` uses the stored
+        "merge" flags instead of the patches.
+        """
+        h = self.ball_history
+        for i in range(self._merge_upto, len(h) - 1):
+            h[i]["merge"] = _is_merge(h[i - 1], h[i], h[i + 1], self.c)
+        self._merge_upto = max(self._merge_upto, len(h) - 1)
+        for j in range(self._released, len(h) - 2):
+            h[j]["roi_gray"] = None
+        self._released = max(self._released, len(h) - 2)
+
+    def finish(self):
+        """Fill frames still buffered by the stride at the end of the video."""
+        self._flush_pending()
+
+    def update(self, frame_id: int, frame):
+        """Track one frame; return the appended history entry or None."""
+        if self.c["STRIDE_MAX"] > 1 and frame_id < self._next_infer:
+            self._pending.append((frame_id, frame))
+            return None
+
+        if self.motion_gate(frame_id, frame):
+            self._flush_pending()
+            return self.skip(frame_id)
+
+        if not self._pending:
+            entry = self._infer(frame_id, frame)
+        else:
+            # fill the stride gap, then make sure skipping it was safe
+            snap = self._snapshot()
+            self._journal = []
+            for fid, _ in self._pending:
+                self.fill(fid)
+            entry = self._infer(frame_id, frame)
+            journal, self._journal = self._journal, None
+            if self._stride_anomaly(entry):
+                calls = self._last_calls
+                self._restore(snap, journal)
+                pending, self._pending = self._pending, []
+                for fid, buffered in pending:
+                    self._infer(fid, buffered)
+                entry = self._infer(frame_id, frame, reuse=calls)
+                self._stride = 1
+            else:
+                if self.recorder is not None:
+                    for fid, _ in self._pending:
+                        self.recorder.record_fill(fid)
+                self._pending = []
+
+        if self.c["STRIDE_MAX"] > 1:
+            self._adapt_stride(frame_id, entry)
+        return entry
+
+    def _infer(self, frame_id: int, frame, reuse=None):
+        """
+        Run detection + tracking on one decoded frame.
+
+        `reuse` holds the boxes YOLO already returned for this frame by
+        search region (a rolled-back stride attempt).  A region found
+        there, or covered by a full-frame search there, is answered from
+        it without running or recording YOLO again — the same way a
+        replay answers it from the recorded calls.
+        """
+        calls = {}
+
+        def detect(roi):
+            if reuse is not None and (roi in reuse or None in reuse):
+                boxes = reuse[roi] if roi in reuse else reuse[None]
+                if roi not in reuse:
+                    rx1, ry1, rx2, ry2 = roi
+                    boxes = [b for b in boxes
+                             if rx1 <= (b[0] + b[2]) // 2 < rx2 and ry1 <= (b[1] + b[3]) // 2 < ry2]
+                calls[roi] = boxes
+                return boxes
+            if roi is None and (self.c["CASCADE_SCALE"] > 0 or len(self.tiles) > 1):
+                boxes = self._detect_full(frame)
+            else:
+                if roi is None:
+                    search_frame, off_x, off_y = frame, 0, 0
+                else:
+                    rx1, ry1, rx2, ry2 = roi
+                    search_frame, off_x, off_y = frame[ry1:ry2, rx1:rx2], rx1, ry1
+                results = self.model.predict(search_frame, conf=self.c["YOLO_CONF"], verbose=False)
+                boxes = _boxes_from_results(results, off_x, off_y)
+            if self.recorder is not None:
+                self.recorder.record(frame_id, roi, boxes, frame)
+            calls[roi] = boxes
+            return boxes
+
+        entry = self.step(frame_id, detect, lambda bbox: _roi_patch(frame, bbox))
+        self._last_calls = calls
+        self._note_inferred(frame_id, entry)
+        return entry
+
+    def _detect_full(self, frame):
+        """
+        Full-frame boxes via the cascade and/or the tiled search.
+
+        The cascade is a shortcut, not a replacement: when it comes back
+        empty a full-resolution search catches balls too small for the
+        coarse pass.  An empty cascade frame plus that search costs more
+        than the search alone, and while the ball is out of frame every
+        search is empty — so only the first empty frame of a run and then
+        every CASCADE_FALLBACK_EVERY-th one pays for it.
+        """
+        if self.c["CASCADE_SCALE"] > 0:
+            boxes = self._detect_cascade(frame)
+            if boxes:
+                self._cascade_misses = 0
+                return boxes
+            self._cascade_misses += 1
+            if (self._cascade_misses - 1) % max(1, self.c["CASCADE_FALLBACK_EVERY"]):
+                return boxes
+        if len(self.tiles) > 1:
+            return self._detect_tiled(frame)
+        results = self.model.predict(frame, conf=self.c["YOLO_CONF"], verbose=False)
+        return _boxes_from_results(results, 0, 0)
+
+    def _detect_cascade(self, frame):
+        """Coarse low-resolution proposals, confirmed on full-resolution crops."""
+        c = self.c
+        s = c["CASCADE_SCALE"]
+        small = cv2.resize(frame, None, fx=s, fy=s, interpolation=cv2.INTER_AREA)
+        # keep the coarse pass at its own size instead of letting YOLO upscale it
+        imgsz = max(32, math.ceil(max(small.shape[:2]) / 32) * 32)
+        results = self.model.predict(small, conf=c["CASCADE_COARSE_CONF"], imgsz=imgsz, verbose=False)
+
+        proposals = []
+        for x1, y1, x2, y2, conf in _boxes_from_results(results, 0, 0):
+            x1, y1 = int(x1 / s), int(y1 / s)
+            x2, y2 = math.ceil(x2 / s), math.ceil(y2 / s)
+            area = (x2 - x1) * (y2 - y1)
+            if c["BALL_AREA_MIN"] <= area <= c["BALL_AREA_MAX"]:
+                proposals.append((conf, (x1 + x2) // 2, (y1 + y2) // 2))
+        if not proposals:
+            return []
+        proposals = sorted(proposals, reverse=True)[:c["CASCADE_MAX_CANDIDATES"]]
+
+        half = c["CASCADE_CROP_PX"]
+        crops = [(max(0, cx - half), max(0, cy - half),
+                  min(self.frame_w, cx + half), min(self.frame_h, cy + half))
+                 for _, cx, cy in proposals]
+        results = self.model.predict([frame[y1:y2, x1:x2] for x1, y1, x2, y2 in crops],
+                                     conf=c["YOLO_CONF"], imgsz=2 * half, verbose=False)
+        boxes = []
+        for (x1, y1, _, _), result in zip(crops, results):
+            boxes.extend(_boxes_from_results([result], x1, y1))
+        return _dedup_boxes(boxes, c["TILE_DEDUP_OVERLAP"])
+
+    def _detect_tiled(self, frame):
+        """Full-frame boxes from one batched YOLO call over `tiles`."""
+        crops = [frame[y1:y2, x1:x2] for x1, y1, x2, y2 in self.tiles]
+        results = self.model.predict(crops, conf=self.c["YOLO_CONF"],
+                                     imgsz=self.c["TILE_SIZE"], verbose=False)
+        boxes = []
+        for (x1, y1, _, _), result in zip(self.tiles, results):
+            boxes.extend(_boxes_from_results([result], x1, y1))
+        return _dedup_boxes(boxes, self.c["TILE_DEDUP_OVERLAP"])
+
+    def step(self, frame_id: int, detect, patch):
+        """
+        Tracking logic with the frame abstracted away.
+
+        detect(roi) returns frame-coordinate boxes for the search region
+        (None = full frame); patch(bbox) returns (roi_gray, blur).  Live
+        tracking backs these with YOLO, replay with a DetectionCache.
+        """
+        c  = self.c
+        kf = self.kf
+        ball_history = self.ball_history
+        frame_w, frame_h = self.frame_w, self.frame_h
+        r = c["BALL_RADIUS_EST"]
+
+        use_roi = self.kf_initialized and self.kf_accepted_cnt >= c["ROI_MIN_ACCEPTED"]
 
         if use_roi:
             kf_pred    = kf.predict()
@@ -156,15 +606,13 @@ def process_video(video_path: str, model_path: str = "best.pt", cfg: dict = None
             ry1 = max(0, pred_y - c["ROI_SEARCH_PX"])
             rx2 = min(frame_w, pred_x + c["ROI_SEARCH_PX"])
             ry2 = min(frame_h, pred_y + c["ROI_SEARCH_PX"])
-            search_frame = frame[ry1:ry2, rx1:rx2]
-            offset_x, offset_y = rx1, ry1
-        elif kf_initialized:
+            roi = (rx1, ry1, rx2, ry2)
+        elif self.kf_initialized:
             kf_pred    = kf.predict()
             pred_x     = int(kf_pred[0, 0])
             pred_y     = int(kf_pred[1, 0])
             has_prediction = True
-            search_frame = frame
-            offset_x, offset_y = 0, 0
+            roi = None
         else:
             if len(ball_history) >= 2:
                 p1 = ball_history[-2]["center"]
@@ -178,18 +626,16 @@ def process_video(video_path: str, model_path: str = "best.pt", cfg: dict = None
             else:
                 pred_x, pred_y = frame_w // 2, frame_h // 2
                 has_prediction = False
-            search_frame = frame
-            offset_x, offset_y = 0, 0
-
-        results = model.predict(search_frame, conf=c["YOLO_CONF"], verbose=False)
+            roi = None
 
         best_candidate, min_error = _scan_boxes(
-            results, offset_x, offset_y, pred_x, pred_y, has_prediction, c)
+            detect(roi), pred_x, pred_y, has_prediction, c)
 
         if best_candidate is None and use_roi:
-            fallback_results = model.predict(frame, conf=c["YOLO_CONF"], verbose=False)
             best_candidate, min_error = _scan_boxes(
-                fallback_results, 0, 0, pred_x, pred_y, has_prediction, c)
+                detect(None), pred_x, pred_y, has_prediction, c)
+
+        self.last_residual = min_error if best_candidate is not None and has_prediction else None
 
         if best_candidate is not None:
             x1, y1, x2, y2, cx, cy, area, conf = best_candidate
@@ -199,161 +645,273 @@ def process_video(video_path: str, model_path: str = "best.pt", cfg: dict = None
                 x1, y1, x2, y2 = cx - r, cy - r, cx + r, cy + r
                 area = (2 * r) ** 2
                 conf = 0.0
-                _mark_drop([frame_id], f"GATE({min_error:.0f}px)")
-                ball_history.append({
+                self.mark_drop([frame_id], f"GATE({min_error:.0f}px)")
+                entry = {
                     "frame": frame_id, "center": (cx, cy),
                     "bbox": (x1, y1, x2, y2), "area": area, "conf": conf,
                     "predicted": True, "roi_gray": None, "blur": 0.0,
-                })
+                }
             else:
                 meas = np.array([[np.float32(cx)], [np.float32(cy)]])
-                if not kf_initialized:
+                if not self.kf_initialized:
                     kf.statePre  = np.array([[cx],[cy],[0],[0]], np.float32)
                     kf.statePost = np.array([[cx],[cy],[0],[0]], np.float32)
-                    kf_initialized = True
+                    self.kf_initialized = True
                 else:
                     kf.correct(meas)
-                kf_accepted_cnt += 1
+                self.kf_accepted_cnt += 1
 
-                ball_roi = frame[y1:y2, x1:x2]
-                if ball_roi.size > 0:
-                    gray_ball = cv2.cvtColor(ball_roi, cv2.COLOR_BGR2GRAY)
-                    blur_val  = cv2.Laplacian(gray_ball, cv2.CV_64F).var()
-                else:
-                    gray_ball = None
-                    blur_val  = 0.0
-                ball_history.append({
+                gray_ball, blur_val = patch((x1, y1, x2, y2))
+                entry = {
                     "frame": frame_id, "center": (cx, cy),
                     "bbox": (x1, y1, x2, y2), "area": area, "conf": conf,
                     "predicted": False, "roi_gray": gray_ball, "blur": blur_val,
-                })
+                }
 
         elif has_prediction:
             cx, cy = int(pred_x), int(pred_y)
             x1, y1, x2, y2 = cx - r, cy - r, cx + r, cy + r
-            _mark_drop([frame_id], "NO_DET")
-            ball_history.append({
+            self.mark_drop([frame_id], "NO_DET")
+            entry = {
                 "frame": frame_id, "center": (cx, cy),
                 "bbox": (x1, y1, x2, y2), "area": (2*r)**2, "conf": 0.0,
                 "predicted": True, "roi_gray": None, "blur": 0.0,
-            })
+            }
+        else:
+            return None
 
-        frame_id += 1
-        if frame_id % 200 == 0:
-            print(f"[detector] Pass 1: {frame_id}/{total_frames} frames")
+        ball_history.append(entry)
+        return entry
 
-    print(f"[detector] Pass 1 done — {len(ball_history)} tracked in {frame_id} frames")
 
-    # ══════════════════════════════════════════════════════════════════
-    # POST-PASS — gap + merge detection
-    # ══════════════════════════════════════════════════════════════════
+def _is_merge(prev_b, curr, nxt, cfg) -> bool:
+    """Merge test for `curr` given its tracked neighbours."""
+    if curr["predicted"] or curr.get("skipped"):
+        return False
+    roi_curr = curr["roi_gray"]
+    roi_prev = prev_b["roi_gray"]
+    roi_next = nxt["roi_gray"]
+    if roi_curr is not None and roi_prev is not None and roi_next is not None:
+        h, w = roi_curr.shape[:2]
+        if h >= 7 and w >= 7:
+            roi_prev_r = cv2.resize(roi_prev, (w, h))
+            roi_next_r = cv2.resize(roi_next, (w, h))
+            ssim_prev  = ssim(roi_prev_r, roi_curr)
+            ssim_next  = ssim(roi_curr, roi_next_r)
+            if (ssim_prev > cfg["MERGE_SSIM_THRESHOLD"]
+                    and ssim_next > cfg["MERGE_SSIM_THRESHOLD"]
+                    and curr["blur"] < min(prev_b["blur"], nxt["blur"]) * cfg["MERGE_BLUR_RATIO"]):
+                return True
+    return curr["conf"] < cfg["LOW_CONF_MERGE"]
+
+
+# ═══════════════════════════════════════════════════════════════════════
+# DETECTION CACHE — raw pass-1 detections for threshold-only re-runs
+# ═══════════════════════════════════════════════════════════════════════
+DETECTION_CACHE_VERSION = 1
+
+
+def _file_hash(path: str, chunk: int = 1 << 20) -> str:
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(chunk), b""):
+            h.update(block)
+    return h.hexdigest()
+
+
+def _detections_cache_path(output_dir: str, basename: str) -> str:
+    return os.path.join(output_dir, f"{basename}_detections.npz")
+
+
+class DetectionRecorder:
+    """
+    Collects every raw detection call made during pass 1: the search
+    region, all boxes YOLO returned, and the grayscale patch + blur of each
+    box small enough to be a ball candidate.  Saved as one compressed .npz.
+    """
+
+    def __init__(self, patch_area_max: int):
+        self.patch_area_max = patch_area_max
+        self.calls   = []    # (frame, rx1, ry1, rx2, ry2); -1s = full frame
+        self.boxes   = []    # (call, x1, y1, x2, y2)
+        self.confs   = []
+        self.blurs   = []
+        self.offsets = []    # start of the patch in the blob, -1 if none
+        self.shapes  = []
+        self._blob   = []
+        self._blob_len = 0
+        self.skips   = []    # frames the motion gate skipped
+        self.fills   = []    # frames the adaptive stride filled from the Kalman
+        self._spill      = None    # open file once the blob lives on disk
+        self._spill_path = None
+
+    def spill(self, path: str):
+        """Low-memory mode: move the patch blob to `path` and append there."""
+        if self._spill is not None:
+            return
+        self._spill_path = path
+        self._spill = open(path, "wb")
+        for gray in self._blob:
+            self._spill.write(gray.tobytes())
+        self._blob = []
+
+    def record(self, frame_id, roi, boxes, frame):
+        call = len(self.calls)
+        self.calls.append((frame_id, *(roi if roi is not None else (-1, -1, -1, -1))))
+        for x1, y1, x2, y2, conf in boxes:
+            gray, blur = None, 0.0
+            if (x2 - x1) * (y2 - y1) <= self.patch_area_max:
+                gray, blur = _roi_patch(frame, (x1, y1, x2, y2))
+            self.boxes.append((call, x1, y1, x2, y2))
+            self.confs.append(conf)
+            self.blurs.append(blur)
+            if gray is None:
+                self.offsets.append(-1)
+                self.shapes.append((0, 0))
+            else:
+                self.offsets.append(self._blob_len)
+                self.shapes.append(gray.shape[:2])
+                if self._spill is not None:
+                    self._spill.write(np.ascontiguousarray(gray).tobytes())
+                else:
+                    self._blob.append(gray.ravel())
+                self._blob_len += gray.size
+
+    def record_skip(self, frame_id):
+        self.skips.append(frame_id)
+
+    def record_fill(self, frame_id):
+        self.fills.append(frame_id)
+
+    def discard(self):
+        """Drop the on-disk blob of a run that will not be saved."""
+        if self._spill is not None:
+            self._spill.close()
+            self._spill = None
+            if os.path.exists(self._spill_path):
+                os.remove(self._spill_path)
+
+    def save(self, path: str, meta: dict):
+        if self._spill is not None:
+            self._spill.close()
+            # memory-mapped: savez streams it into the archive in chunks
+            blob = (np.memmap(self._spill_path, np.uint8, "r", shape=(self._blob_len,))
+                    if self._blob_len else np.zeros(0, np.uint8))
+        else:
+            blob = np.concatenate(self._blob) if self._blob else np.zeros(0, np.uint8)
+        np.savez_compressed(
+            path,
+            calls=np.array(self.calls, np.int32).reshape(-1, 5),
+            boxes=np.array(self.boxes, np.int32).reshape(-1, 5),
+            confs=np.array(self.confs, np.float32),
+            blurs=np.array(self.blurs, np.float64),
+            offsets=np.array(self.offsets, np.int64),
+            shapes=np.array(self.shapes, np.int32).reshape(-1, 2),
+            blob=blob.astype(np.uint8, copy=False),
+            skips=np.array(self.skips, np.int32),
+            fills=np.array(self.fills, np.int32),
+            meta=np.array(json.dumps(meta)),
+        )
+        if self._spill is not None:
+            del blob
+            os.remove(self._spill_path)
+            self._spill = None
+
+
+class DetectionCache:
+    """
+    Replays a DetectionRecorder file in place of YOLO for `BallTracker.step`.
+
+    If new thresholds make the tracker ask for a search region that was
+    never run (e.g. full frame instead of ROI), the recorded boxes for that
+    frame are reused, restricted to the requested region; such frames are
+    counted in `approx_frames`.
+    """
+
+    def __init__(self, path: str):
+        with np.load(path) as z:
+            self.meta = json.loads(str(z["meta"]))
+            calls  = z["calls"]
+            boxes  = z["boxes"]
+            confs  = z["confs"]
+            self._blurs   = z["blurs"]
+            self._offsets = z["offsets"]
+            self._shapes  = z["shapes"]
+            self._blob    = z["blob"]
+            self.skips    = set(z["skips"].tolist()) if "skips" in z.files else set()
+            self.fills    = set(z["fills"].tolist()) if "fills" in z.files else set()
+
+        per_call = [[] for _ in range(len(calls))]
+        self._patch_idx = {}
+        for i, (call, x1, y1, x2, y2) in enumerate(boxes.tolist()):
+            frame_id = int(calls[call, 0])
+            per_call[call].append((x1, y1, x2, y2, float(confs[i])))
+            self._patch_idx[(frame_id, x1, y1, x2, y2)] = i
+
+        self._calls = {}
+        for call, (frame_id, rx1, ry1, rx2, ry2) in enumerate(calls.tolist()):
+            roi = None if rx1 < 0 else (rx1, ry1, rx2, ry2)
+            self._calls.setdefault(frame_id, []).append((roi, per_call[call]))
+
+        self.approx_frames = set()
+
+    def detect(self, frame_id, roi, min_conf):
+        calls = self._calls.get(frame_id, [])
+        for rec_roi, boxes in calls:
+            if rec_roi == roi:
+                break
+        else:
+            self.approx_frames.add(frame_id)
+            full = [b for r, b in calls if r is None]
+            boxes = full[0] if full else [b for _, bs in calls for b in bs]
+            if roi is not None:
+                rx1, ry1, rx2, ry2 = roi
+                boxes = [b for b in boxes
+                         if rx1 <= (b[0] + b[2]) // 2 < rx2 and ry1 <= (b[1] + b[3]) // 2 < ry2]
+        return [b for b in boxes if b[4] >= min_conf]
+
+    def patch(self, frame_id, bbox):
+        i = self._patch_idx.get((frame_id, *bbox))
+        if i is None or self._offsets[i] < 0:
+            return None, 0.0
+        h, w = self._shapes[i]
+        start = self._offsets[i]
+        gray = self._blob[start:start + h * w].reshape(h, w)
+        return gray, float(self._blurs[i])
+
+
+# ═══════════════════════════════════════════════════════════════════════
+# POST-PASS + REPORT
+# ═══════════════════════════════════════════════════════════════════════
+
+def _post_pass(tracker: BallTracker, c: dict) -> set:
+    """Gap + merge detection over a finished pass-1 history; returns merge frames."""
+    ball_history = tracker.ball_history
     for i in range(1, len(ball_history)):
         gap = ball_history[i]["frame"] - ball_history[i - 1]["frame"]
         if gap >= c["DROP_GAP_MIN"]:
             missing = range(ball_history[i - 1]["frame"] + 1,
                             ball_history[i]["frame"])
-            _mark_drop(missing, f"GAP({gap}f)")
+            tracker.mark_drop(missing, f"GAP({gap}f)")
 
     merge_frames = set()
     for i in range(1, len(ball_history) - 1):
         curr = ball_history[i]
-        prev_b = ball_history[i - 1]
-        nxt  = ball_history[i + 1]
-        if curr["predicted"]:
-            continue
-        roi_curr = curr["roi_gray"]
-        roi_prev = prev_b["roi_gray"]
-        roi_next = nxt["roi_gray"]
-        if roi_curr is not None and roi_prev is not None and roi_next is not None:
-            h, w = roi_curr.shape[:2]
-            if h >= 7 and w >= 7:
-                roi_prev_r = cv2.resize(roi_prev, (w, h))
-                roi_next_r = cv2.resize(roi_next, (w, h))
-                ssim_prev  = ssim(roi_prev_r, roi_curr)
-                ssim_next  = ssim(roi_curr, roi_next_r)
-                if (ssim_prev > c["MERGE_SSIM_THRESHOLD"]
-                        and ssim_next > c["MERGE_SSIM_THRESHOLD"]
-                        and curr["blur"] < min(prev_b["blur"], nxt["blur"]) * c["MERGE_BLUR_RATIO"]):
-                    merge_frames.add(curr["frame"])
-        if curr["conf"] < c["LOW_CONF_MERGE"]:
+        # settled early by release_patches() in low-memory mode
+        merged = (curr["merge"] if "merge" in curr
+                  else _is_merge(ball_history[i - 1], curr, ball_history[i + 1], c))
+        if merged:
             merge_frames.add(curr["frame"])
+    return merge_frames
 
-    print(f"[detector] Drops: {len(drop_frames)}  Merges: {len(merge_frames)}")
-
-    # ══════════════════════════════════════════════════════════════════
-    # PASS 2 — Render annotated video
-    # ══════════════════════════════════════════════════════════════════
-    frame_to_ball = {b["frame"]: b for b in ball_history}
-
-    cap.set(cv2.CAP_PROP_POS_FRAMES, 0)
-    # Try multiple H.264 codecs for browser compatibility
-    for codec_name in ["avc1", "H264", "X264", "mp4v"]:
-        fourcc = cv2.VideoWriter_fourcc(*codec_name)
-        out = cv2.VideoWriter(annotated_path, fourcc, fps, (frame_w, frame_h))
-        if out.isOpened():
-            print(f"[detector] Using {codec_name} codec")
-            break
-    else:
-        raise RuntimeError("No suitable video codec found")
-
-    fid = 0
-    print("[detector] Pass 2 — Rendering annotated video ...")
 
-    while True:
-        ret, frame = cap.read()
-        if not ret:
-            break
+def _build_report(tracker: BallTracker, merge_frames: set, total_frames: int):
+    """Return (frame_reports, summary) for the JSON/CSV report."""
+    drop_frames   = tracker.drop_frames
+    drop_evidence = tracker.drop_evidence
 
-        pts = [b["center"] for b in ball_history if b["frame"] <= fid]
-        for j in range(1, len(pts)):
-            cv2.line(frame, pts[j - 1], pts[j], (0, 255, 0), 2)
-
-        for df in drop_frames:
-            if df <= fid and df in frame_to_ball:
-                dcx, dcy = frame_to_ball[df]["center"]
-                cv2.circle(frame, (dcx, dcy), 7, (0, 0, 255), -1)
-                cv2.putText(frame, "DROP", (dcx - 22, dcy - 18),
-                            cv2.FONT_HERSHEY_SIMPLEX, 0.65, (0, 0, 255), 2)
-
-        for mf in merge_frames:
-            if mf <= fid and mf in frame_to_ball:
-                mcx, mcy = frame_to_ball[mf]["center"]
-                cv2.circle(frame, (mcx, mcy), 7, (255, 191, 0), -1)
-                cv2.putText(frame, "MERGE", (mcx - 28, mcy - 18),
-                            cv2.FONT_HERSHEY_SIMPLEX, 0.65, (255, 191, 0), 2)
-
-        if fid in frame_to_ball:
-            b = frame_to_ball[fid]
-            bx1, by1, bx2, by2 = b["bbox"]
-            is_drop     = fid in drop_frames
-            is_predicted = b.get("predicted", False)
-            if is_drop:
-                bbox_color = (0, 0, 255)
-            elif is_predicted:
-                bbox_color = (0, 165, 255)
-            else:
-                bbox_color = (0, 255, 0)
-            cv2.rectangle(frame, (bx1, by1), (bx2, by2), bbox_color, 2)
-            lbl = "PRED" if is_predicted else f"{b['conf']:.2f}"
-            cv2.putText(frame, lbl, (bx1, by1 - 6),
-                        cv2.FONT_HERSHEY_SIMPLEX, 0.5, bbox_color, 1)
-
-        cv2.putText(frame, f"Frame {fid}/{total_frames}",
-                    (10, 30), cv2.FONT_HERSHEY_SIMPLEX, 0.7, (255, 255, 255), 2)
-        cv2.putText(frame, f"Drops: {len(drop_frames)}  Merges: {len(merge_frames)}",
-                    (10, 60), cv2.FONT_HERSHEY_SIMPLEX, 0.7, (0, 80, 255), 2)
-
-        out.write(frame)
-        fid += 1
-
-    cap.release()
-    out.release()
-
-    # ══════════════════════════════════════════════════════════════════
-    # Build JSON report
-    # ══════════════════════════════════════════════════════════════════
     frame_reports = []
-    for b in ball_history:
+    for b in tracker.ball_history:
         fid = b["frame"]
         if fid in drop_frames:
             label = "DROP"
@@ -367,6 +925,8 @@ def process_video(video_path: str, model_path: str = "best.pt", cfg: dict = None
             "center":    list(b["center"]),
             "conf":      round(b["conf"], 4),
             "predicted": b["predicted"],
+            "skipped":   b.get("skipped", False),
+            "filled":    b.get("filled", False),
             "reasons":   drop_evidence.get(fid, []),
         })
 
@@ -374,50 +934,487 @@ def process_video(video_path: str, model_path: str = "best.pt", cfg: dict = None
     drop_reasons_map = {str(f): list(set(vs)) for f, vs in drop_evidence.items()}
 
     summary = {
-        "total_frames":      frame_id,
-        "tracked_positions": len(ball_history),
+        "total_frames":      total_frames,
+        "tracked_positions": len(tracker.ball_history),
         "drop_frames":       len(drop_frames),
         "merge_frames":      len(merge_frames),
         "drop_frame_list":   sorted(drop_frames),
         "merge_frame_list":  sorted(merge_frames),
+        "skipped_frames":    len(tracker.skipped_frames),
+        "skipped_frame_list": sorted(tracker.skipped_frames),
+        "filled_frames":     len(tracker.filled_frames),
         "drop_reasons":      drop_reasons_map,
     }
+    return frame_reports, summary
+
 
-    full_report = {
-        "source":     os.path.basename(video_path),
-        "fps":        fps,
-        "resolution": f"{frame_w}x{frame_h}",
-        "summary":    summary,
-        "frames":     frame_reports,
+# ═══════════════════════════════════════════════════════════════════════
+# OVERLAY TRACK — annotations as data, drawn by the dashboard or burned in
+# ═══════════════════════════════════════════════════════════════════════
+
+OVERLAY_VERSION = 1
+OVERLAY_COLUMNS = ["frame", "x1", "y1", "x2", "y2", "cx", "cy", "conf", "predicted", "label"]
+
+
+def _overlay_path(output_dir: str, basename: str) -> str:
+    return os.path.join(output_dir, f"{basename}_overlay.json")
+
+
+def build_overlay(tracker: BallTracker, merge_frames: set, source: str, fps: float,
+                  frame_w: int, frame_h: int, total_frames: int) -> dict:
+    """
+    Compact per-frame overlay sidecar.
+
+    One row per tracked frame (OVERLAY_COLUMNS); the trail at frame f is
+    the (cx, cy) of every row up to f.  DROP/MERGE markers are the rows
+    whose frame is in `drops` / `merges`.
+    """
+    drop_frames = tracker.drop_frames
+    rows = []
+    for b in tracker.ball_history:
+        fid = b["frame"]
+        label = "DROP" if fid in drop_frames else ("MERGE" if fid in merge_frames else "NORMAL")
+        x1, y1, x2, y2 = (int(v) for v in b["bbox"])
+        cx, cy = (int(v) for v in b["center"])
+        rows.append([fid, x1, y1, x2, y2, cx, cy, round(float(b["conf"]), 4),
+                     int(bool(b["predicted"])), label])
+    return {
+        "version":      OVERLAY_VERSION,
+        "source":       source,
+        "fps":          fps,
+        "width":        frame_w,
+        "height":       frame_h,
+        "total_frames": total_frames,
+        "drops":        sorted(drop_frames),
+        "merges":       sorted(merge_frames),
+        "columns":      OVERLAY_COLUMNS,
+        "track":        rows,
     }
 
-    with open(report_path, "w") as f:
-        json.dump(full_report, f, indent=2)
 
-    csv_path = os.path.join(output_dir, f"{basename}_report.csv")
-    with open(csv_path, "w") as f:
-        f.write("Frame,Label,Center_X,Center_Y,Confidence,Predicted\n")
-        for fr in frame_reports:
-            f.write(f"{fr['frame']},{fr['label']},{fr['center'][0]},{fr['center'][1]},{fr['conf']},{fr['predicted']}\n")
+class OverlayPainter:
+    """Burns an overlay track into frames, exactly as the dashboard draws it."""
 
-    # Generate thumbnail from first frame
-    thumbnail_path = os.path.join(output_dir, f"{basename}_thumbnail.jpg")
-    cap_thumb = cv2.VideoCapture(annotated_path)
-    ret, first_frame = cap_thumb.read()
-    if ret:
-        cv2.imwrite(thumbnail_path, first_frame)
-    cap_thumb.release()
+    def __init__(self, overlay: dict):
+        self.track   = sorted(overlay["track"], key=lambda r: r[0])
+        self.frames  = [r[0] for r in self.track]
+        self.by_frame = {r[0]: r for r in self.track}
+        self.pts     = [(r[5], r[6]) for r in self.track]
+        self.drops   = set(overlay["drops"])
+        self.n_drops  = len(overlay["drops"])
+        self.n_merges = len(overlay["merges"])
+        self.total   = overlay["total_frames"]
+        self.drop_marks  = [r for r in self.track if r[0] in self.drops]
+        merges = set(overlay["merges"])
+        self.merge_marks = [r for r in self.track if r[0] in merges]
 
-    print(f"[detector] Output:  {annotated_path}")
-    print(f"[detector] Report:  {report_path}")
-    print(f"[detector] CSV:     {csv_path}")
-    print(f"[detector] Thumbnail: {thumbnail_path}")
+    def draw(self, frame, fid: int):
+        n = bisect.bisect_right(self.frames, fid)
+        pts = self.pts
+        for j in range(1, n):
+            cv2.line(frame, pts[j - 1], pts[j], (0, 255, 0), 2)
+
+        for r in self.drop_marks:
+            if r[0] > fid:
+                break
+            dcx, dcy = r[5], r[6]
+            cv2.circle(frame, (dcx, dcy), 7, (0, 0, 255), -1)
+            cv2.putText(frame, "DROP", (dcx - 22, dcy - 18),
+                        cv2.FONT_HERSHEY_SIMPLEX, 0.65, (0, 0, 255), 2)
+
+        for r in self.merge_marks:
+            if r[0] > fid:
+                break
+            mcx, mcy = r[5], r[6]
+            cv2.circle(frame, (mcx, mcy), 7, (255, 191, 0), -1)
+            cv2.putText(frame, "MERGE", (mcx - 28, mcy - 18),
+                        cv2.FONT_HERSHEY_SIMPLEX, 0.65, (255, 191, 0), 2)
+
+        r = self.by_frame.get(fid)
+        if r is not None:
+            _, bx1, by1, bx2, by2, _, _, conf, predicted, _ = r
+            if fid in self.drops:
+                bbox_color = (0, 0, 255)
+            elif predicted:
+                bbox_color = (0, 165, 255)
+            else:
+                bbox_color = (0, 255, 0)
+            cv2.rectangle(frame, (bx1, by1), (bx2, by2), bbox_color, 2)
+            lbl = "PRED" if predicted else f"{conf:.2f}"
+            cv2.putText(frame, lbl, (bx1, by1 - 6),
+                        cv2.FONT_HERSHEY_SIMPLEX, 0.5, bbox_color, 1)
+
+        cv2.putText(frame, f"Frame {fid}/{self.total}",
+                    (10, 30), cv2.FONT_HERSHEY_SIMPLEX, 0.7, (255, 255, 255), 2)
+        cv2.putText(frame, f"Drops: {self.n_drops}  Merges: {self.n_merges}",
+                    (10, 60), cv2.FONT_HERSHEY_SIMPLEX, 0.7, (0, 80, 255), 2)
+        return frame
+
+
+def _preview_events(overlay: dict) -> dict:
+    """frame -> DROP/MERGE label (DROP wins, as in the report)."""
+    events = {f: "MERGE" for f in overlay["merges"]}
+    events.update({f: "DROP" for f in overlay["drops"]})
+    return events
+
+
+def render_overlay(video_path: str, overlay: dict, out_path: str, encoder_cfg: dict = None,
+                   previews: PreviewBuilder = None):
+    """
+    Burn an overlay track into a copy of the source video (export only).
+
+    Encoding runs in a separate process (see encoder.VideoEncoder), so
+    drawing overlaps with it.  Annotated frames are also handed to
+    `previews` when given.  Returns (out_path, proxy_path or None).
+    """
+    cap = cv2.VideoCapture(video_path)
+    if not cap.isOpened():
+        raise ValueError(f"Cannot open video: {video_path}")
+    painter = OverlayPainter(overlay)
+
+    print("[detector] Rendering annotated video ...")
+    with VideoEncoder(out_path, overlay["fps"], (overlay["width"], overlay["height"]),
+                      encoder_cfg) as enc:
+        fid = 0
+        while True:
+            ret, frame = cap.read()
+            if not ret:
+                break
+            painter.draw(frame, fid)
+            if previews is not None and previews.wants(fid):
+                previews.add(fid, frame)
+            enc.write(frame)
+            fid += 1
+    cap.release()
+    return out_path, enc.proxy_path
+
+
+def render_previews(video_path: str, overlay: dict, previews: PreviewBuilder):
+    """Preview-only pass when nothing is rendered: grab() past frames no tile needs."""
+    cap = cv2.VideoCapture(video_path)
+    if not cap.isOpened():
+        raise ValueError(f"Cannot open video: {video_path}")
+    painter = OverlayPainter(overlay)
+    fid = 0
+    while cap.grab():
+        if previews.wants(fid):
+            ret, frame = cap.retrieve()
+            if ret:
+                previews.add(fid, painter.draw(frame, fid))
+        fid += 1
+    cap.release()
+
+
+# ═══════════════════════════════════════════════════════════════════════
+# PUBLIC API
+# ═══════════════════════════════════════════════════════════════════════
+
+def process_video(video_path: str, model_path: str = "best.pt", cfg: dict = None, output_dir: str = None,
+                  cache_detections: bool = True, render: bool = True, encoder_cfg: dict = None,
+                  preview_cfg: dict = None, memory_cfg: dict = None):
+    """
+    Full ball tracking pipeline.
+
+    Parameters
+    ----------
+    video_path : str   – path to input video
+    model_path : str   – path to YOLO .pt weights
+    cfg        : dict  – override any key from DEFAULT_CFG
+    cache_detections : bool – save raw pass-1 detections for `reanalyze`
+    render     : bool  – burn annotations into <basename>_annotated.mp4; when
+                         False only the overlay sidecar is written and the
+                         dashboard draws it over the source video
+    encoder_cfg : dict – override encoder.ENCODER_CFG (preset, CRF/bitrate, proxy)
+    preview_cfg : dict – override previews.PREVIEW_CFG (sprite interval, tile size)
+    memory_cfg : dict  – override memory.MEMORY_CFG; with BUDGET_MB set the job
+                         switches to low-memory mode (ROI patches released
+                         after the merge test, cached patches spilled to disk)
+                         or raises MemoryBudgetExceeded before going over
+
+    Returns
+    -------
+    dict with keys  annotated_video (None if not rendered), source_video,
+    overlay_file, previews_file, thumbnail, report, report_file, memory
+    """
+    c = {**DEFAULT_CFG, **(cfg or {})}
+
+    model_path = _resolve_model_path(model_path)
+    model = _get_model(model_path)
+
+    # ── open video ────────────────────────────────────────────────────
+    cap = cv2.VideoCapture(video_path)
+    if not cap.isOpened():
+        raise ValueError(f"Cannot open video: {video_path}")
+
+    total_frames = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+    fps          = cap.get(cv2.CAP_PROP_FPS)
+    frame_w      = int(cap.get(cv2.CAP_PROP_FRAME_WIDTH))
+    frame_h      = int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
+
+    if output_dir is None:
+        output_dir = os.path.dirname(video_path)
+    else:
+        os.makedirs(output_dir, exist_ok=True)
+    
+    basename   = os.path.splitext(os.path.basename(video_path))[0]
+    annotated_path = os.path.join(output_dir, f"{basename}_annotated.mp4")
+    report_path    = os.path.join(output_dir, f"{basename}_report.json")
+
+    print(f"[detector] {video_path}  |  {total_frames} frames @ {fps:.1f} FPS  |  {frame_w}x{frame_h}")
+
+    # frames in flight (decode, stride buffer, render, encoder pipe) + one
+    # history entry per frame; the default strategy also keeps ROI patches
+    # (history) and candidate patches (detection cache) for the whole video
+    budget   = MemoryBudget(memory_cfg)
+    frame_mb = frame_w * frame_h * 3 / 2**20
+    entry_mb = total_frames * 1024 / 2**20
+    patch_mb = total_frames * c["BALL_AREA_MAX"] * (5 if cache_detections else 1) / 2**20
+    stream_mb = frame_mb * (c["STRIDE_MAX"] + 4) + entry_mb
+    # every exit releases the capture and takes the budget out of the shared pool
+    try:
+        budget.preflight(stream_mb, stream_mb + patch_mb)
+
+        # ══════════════════════════════════════════════════════════════
+        # PASS 1 — Kalman + ROI-constrained detection
+        # ══════════════════════════════════════════════════════════════
+        recorder      = DetectionRecorder(4 * c["BALL_AREA_MAX"]) if cache_detections else None
+        tracker       = BallTracker(model, c, frame_w, frame_h, recorder=recorder)
+        if c["CASCADE_SCALE"] > 0:
+            print(f"[detector] Full-frame search: cascade at {c['CASCADE_SCALE']}x, "
+                  f"confirm on ±{c['CASCADE_CROP_PX']}px crops")
+        if len(tracker.tiles) > 1:
+            print(f"[detector] Full-frame search on {len(tracker.tiles)} tiles of {c['TILE_SIZE']}px")
+        ball_history  = tracker.ball_history
+        drop_frames   = tracker.drop_frames
+        frame_id      = 0
+        if recorder is not None:
+            budget.on_low_memory(lambda: recorder.spill(
+                _detections_cache_path(output_dir, basename) + ".blob"))
+
+        print("[detector] Pass 1 — Kalman + ROI-constrained detection ...")
+
+        cache_path = None
+        try:
+            with budget.stage("pass1"):
+                while True:
+                    ret, frame = cap.read()
+                    if not ret:
+                        break
+
+                    tracker.update(frame_id, frame)
+
+                    frame_id += 1
+                    if frame_id % 200 == 0:
+                        print(f"[detector] Pass 1: {frame_id}/{total_frames} frames")
+                    if frame_id % budget.check_every == 0:
+                        budget.check()
+                        if budget.low_memory:
+                            tracker.release_patches()
+
+                tracker.finish()
+
+                print(f"[detector] Pass 1 done — {len(ball_history)} tracked in {frame_id} frames"
+                      f" ({len(tracker.skipped_frames)} skipped by motion gate,"
+                      f" {len(tracker.filled_frames)} filled by stride)")
+
+                if recorder is not None:
+                    cache_path = _detections_cache_path(output_dir, basename)
+                    recorder.save(cache_path, {
+                        "version":      DETECTION_CACHE_VERSION,
+                        "source":       os.path.basename(video_path),
+                        "hash":         _file_hash(video_path),
+                        "model":        os.path.basename(model_path),
+                        "yolo_conf":    c["YOLO_CONF"],
+                        "fps":          fps,
+                        "frame_w":      frame_w,
+                        "frame_h":      frame_h,
+                        "total_frames": frame_id,
+                    })
+                    print(f"[detector] Detections cached: {cache_path}")
+        except BaseException:
+            if recorder is not None:
+                recorder.discard()
+            # the stage's closing check can trip after the cache was written
+            if cache_path is not None and os.path.exists(cache_path):
+                os.remove(cache_path)
+            raise
+
+        # ══════════════════════════════════════════════════════════════
+        # POST-PASS — gap + merge detection
+        # ══════════════════════════════════════════════════════════════
+        with budget.stage("post_pass"):
+            merge_frames = _post_pass(tracker, c)
+
+        print(f"[detector] Drops: {len(drop_frames)}  Merges: {len(merge_frames)}")
+
+        cap.release()
 
+        # ══════════════════════════════════════════════════════════════
+        # OVERLAY TRACK — drawn client-side; PASS 2 burns it in only on request
+        # ══════════════════════════════════════════════════════════════
+        overlay = build_overlay(tracker, merge_frames, os.path.basename(video_path),
+                                fps, frame_w, frame_h, frame_id)
+        overlay_path = _overlay_path(output_dir, basename)
+        with open(overlay_path, "w") as f:
+            json.dump(overlay, f, separators=(",", ":"))
+
+        # sprite sheet + event thumbnails come from whichever pass decodes next
+        previews = PreviewBuilder(output_dir, basename, fps, frame_w, frame_h,
+                                  _preview_events(overlay), preview_cfg)
+        proxy_path = None
+        with budget.stage("render" if render else "previews"):
+            if render:
+                print("[detector] Pass 2 — Rendering annotated video ...")
+                _, proxy_path = render_overlay(video_path, overlay, annotated_path, encoder_cfg,
+                                               previews=previews)
+            else:
+                render_previews(video_path, overlay, previews)
+            previews_file = previews.finish()
+
+        # ══════════════════════════════════════════════════════════════
+        # Build JSON report
+        # ══════════════════════════════════════════════════════════════
+        frame_reports, summary = _build_report(tracker, merge_frames, frame_id)
+
+        full_report = {
+            "source":     os.path.basename(video_path),
+            "fps":        fps,
+            "resolution": f"{frame_w}x{frame_h}",
+            "summary":    summary,
+            "memory":     budget.report(),
+            "frames":     frame_reports,
+        }
+        print(f"[detector] Memory: peak RSS {full_report['memory']['peak_rss_mb']} MB "
+              f"(+{full_report['memory']['peak_growth_mb']} MB since job start"
+              f"{', low-memory mode' if budget.low_memory else ''})")
+
+        with open(report_path, "w") as f:
+            json.dump(full_report, f, indent=2)
+
+        csv_path = os.path.join(output_dir, f"{basename}_report.csv")
+        with open(csv_path, "w") as f:
+            f.write("Frame,Label,Center_X,Center_Y,Confidence,Predicted\n")
+            for fr in frame_reports:
+                f.write(f"{fr['frame']},{fr['label']},{fr['center'][0]},{fr['center'][1]},{fr['conf']},{fr['predicted']}\n")
+
+        if render:
+            print(f"[detector] Output:  {annotated_path}")
+        print(f"[detector] Overlay: {overlay_path}")
+        print(f"[detector] Report:  {report_path}")
+        print(f"[detector] CSV:     {csv_path}")
+        print(f"[detector] Previews: {previews_file}")
+
+        return {
+            "annotated_video": os.path.basename(annotated_path) if render else None,
+            "annotated_proxy": os.path.basename(proxy_path) if proxy_path else None,
+            "source_video":    os.path.basename(video_path),
+            "overlay_file":    os.path.basename(overlay_path),
+            "report":          summary,
+            "report_file":     os.path.basename(report_path),
+            "csv_file":        os.path.basename(csv_path),
+            "thumbnail":       previews.thumbnail,
+            "previews_file":   previews_file,
+            "detections_cache": os.path.basename(cache_path) if cache_path else None,
+            "memory":          full_report["memory"],
+        }
+    finally:
+        cap.release()
+        budget.close()
+
+
+def export_annotated(video_path: str, output_dir: str = None, encoder_cfg: dict = None) -> dict:
+    """
+    Burn the saved overlay track into <basename>_annotated.mp4 for download.
+
+    Needs a prior `process_video` run (any `render` setting) in output_dir.
+    Returns {"annotated_video", "annotated_proxy"} filenames (proxy may be None).
+    """
+    if output_dir is None:
+        output_dir = os.path.dirname(video_path)
+    basename = os.path.splitext(os.path.basename(video_path))[0]
+    overlay_path = _overlay_path(output_dir, basename)
+    if not os.path.exists(overlay_path):
+        raise FileNotFoundError(f"No overlay track at {overlay_path}; run process_video first")
+    with open(overlay_path) as f:
+        overlay = json.load(f)
+    annotated_path = os.path.join(output_dir, f"{basename}_annotated.mp4")
+    _, proxy_path = render_overlay(video_path, overlay, annotated_path, encoder_cfg)
+    print(f"[detector] Output:  {annotated_path}")
     return {
         "annotated_video": os.path.basename(annotated_path),
-        "report":          summary,
-        "report_file":     os.path.basename(report_path),
-        "csv_file":        os.path.basename(csv_path),
-        "thumbnail":       os.path.basename(thumbnail_path),
+        "annotated_proxy": os.path.basename(proxy_path) if proxy_path else None,
+    }
+
+
+def load_detection_cache(video_path: str, output_dir: str = None, cache_path: str = None) -> DetectionCache:
+    """Load and validate the detection cache written by `process_video`."""
+    if cache_path is None:
+        if output_dir is None:
+            output_dir = os.path.dirname(video_path)
+        basename = os.path.splitext(os.path.basename(video_path))[0]
+        cache_path = _detections_cache_path(output_dir, basename)
+    if not os.path.exists(cache_path):
+        raise FileNotFoundError(f"No detection cache: {cache_path} — run process_video first")
+
+    cache = DetectionCache(cache_path)
+    meta  = cache.meta
+    if meta.get("version") != DETECTION_CACHE_VERSION:
+        raise ValueError(f"Detection cache {cache_path} is from an older version; re-run process_video")
+    if os.path.exists(video_path) and _file_hash(video_path) != meta["hash"]:
+        raise ValueError(f"Detection cache {cache_path} does not match {video_path}")
+    return cache
+
+
+def reanalyze(video_path: str, cfg: dict = None, output_dir: str = None, cache_path: str = None,
+              cache: "DetectionCache" = None):
+    """
+    Re-run pass 1 tracking + post-pass from cached detections.
+
+    Replays the Kalman / gating / merge logic with new thresholds without
+    decoding the video or running inference.  The cache is the
+    `<basename>_detections.npz` written by `process_video`; callers that
+    replay many configs can pass an already loaded (and already
+    validated) `DetectionCache` instead.
+
+    Returns
+    -------
+    dict with keys  report (summary), frames, approx_frames
+    """
+    c = {**DEFAULT_CFG, **(cfg or {})}
+
+    if cache is None:
+        cache = load_detection_cache(video_path, output_dir, cache_path)
+    else:
+        cache.approx_frames = set()
+    meta = cache.meta
+
+    if c["YOLO_CONF"] < meta["yolo_conf"]:
+        raise ValueError(f"Cache recorded at YOLO_CONF={meta['yolo_conf']}; "
+                         f"lower thresholds need a fresh process_video run")
+
+    tracker = BallTracker(None, c, meta["frame_w"], meta["frame_h"])
+    for frame_id in range(meta["total_frames"]):
+        # no pixels to re-gate: frames skipped / filled at record time stay so
+        if frame_id in cache.skips:
+            tracker.skip(frame_id)
+            continue
+        if frame_id in cache.fills:
+            tracker.fill(frame_id)
+            continue
+        tracker.step(frame_id,
+                     lambda roi, f=frame_id: cache.detect(f, roi, c["YOLO_CONF"]),
+                     lambda bbox, f=frame_id: cache.patch(f, bbox))
+
+    merge_frames = _post_pass(tracker, c)
+    frame_reports, summary = _build_report(tracker, merge_frames, meta["total_frames"])
+
+    if cache.approx_frames:
+        print(f"[detector] Replay: {len(cache.approx_frames)} frames used a search region "
+              f"that was not recorded (approximated from cached boxes)")
+
+    return {
+        "report":        summary,
+        "frames":        frame_reports,
+        "approx_frames": len(cache.approx_frames),
     }
 
@@ -0,0 +1,200 @@
+"""
+Out-of-process video encoder.
+
+`VideoEncoder` takes BGR frames on the caller's thread and hands them to a
+separate process, so drawing the next frame overlaps with encoding the
+previous one:
+
+  * ffmpeg on PATH  → frames are piped as rawvideo to `ffmpeg` (libx264),
+                      with preset / CRF or bitrate and an optional
+                      downscaled proxy written by the same process.
+  * otherwise       → this module runs as a child process around
+                      cv2.VideoWriter (trying avc1 / H264 / X264 / mp4v),
+                      fed the same rawvideo pipe.
+                      Preset and CRF have no cv2 equivalent there; the
+                      proxy is still produced.
+
+    with VideoEncoder("out.mp4", fps, (w, h), {"PRESET": "fast", "CRF": 20}) as enc:
+        for frame in frames:
+            enc.write(frame)
+"""
+
+import os
+import shutil
+import subprocess
+import sys
+
+import cv2
+import numpy as np
+
+# ─── DEFAULT ENCODER KNOBS ───────────────────────────────────────────
+ENCODER_CFG = {
+    "BACKEND":     "auto",      # auto | ffmpeg | opencv
+    "PRESET":      "veryfast",  # libx264 speed/quality preset
+    "CRF":         23,          # constant quality (ignored when BITRATE is set)
+    "BITRATE":     None,        # e.g. "4M"; overrides CRF
+    "PROXY_SCALE": None,        # e.g. 0.5 → also write <name>_proxy.mp4
+}
+
+CV2_CODECS = ["avc1", "H264", "X264", "mp4v"]
+
+
+def proxy_path_for(path: str) -> str:
+    root, ext = os.path.splitext(path)
+    return f"{root}_proxy{ext or '.mp4'}"
+
+
+def _even(n: float) -> int:
+    # yuv420p needs even dimensions
+    return max(2, int(n) // 2 * 2)
+
+
+def _open_cv2_writer(path: str, fps: float, size):
+    for codec_name in CV2_CODECS:
+        fourcc = cv2.VideoWriter_fourcc(*codec_name)
+        out = cv2.VideoWriter(path, fourcc, fps, size)
+        if out.isOpened():
+            print(f"[encoder] Using {codec_name} codec for {path}")
+            return out
+    raise RuntimeError("No suitable video codec found")
+
+
+def _cv2_worker(path, fps, size, proxy_path, proxy_size):
+    """Encoder process body for the OpenCV backend: rawvideo on stdin."""
+    w, h = size
+    out = _open_cv2_writer(path, fps, size)
+    proxy = _open_cv2_writer(proxy_path, fps, proxy_size) if proxy_path else None
+    print("ready", flush=True)
+
+    stdin = sys.stdin.buffer
+    n = w * h * 3
+    while True:
+        buf = stdin.read(n)
+        if len(buf) < n:
+            break
+        frame = np.frombuffer(buf, np.uint8).reshape(h, w, 3)
+        out.write(frame)
+        if proxy is not None:
+            proxy.write(cv2.resize(frame, proxy_size, interpolation=cv2.INTER_AREA))
+    out.release()
+    if proxy is not None:
+        proxy.release()
+
+
+class VideoEncoder:
+    """Encode frames in a separate process; see module docstring."""
+
+    def __init__(self, path: str, fps: float, size, cfg: dict = None):
+        self.c = {**ENCODER_CFG, **(cfg or {})}
+        self.path = path
+        self.fps = fps or 30.0
+        self.size = (int(size[0]), int(size[1]))
+        self.proxy_path = None
+        self.proxy_size = None
+        if self.c["PROXY_SCALE"]:
+            s = float(self.c["PROXY_SCALE"])
+            self.proxy_path = proxy_path_for(path)
+            self.proxy_size = (_even(self.size[0] * s), _even(self.size[1] * s))
+
+        backend = self.c["BACKEND"]
+        if backend == "auto":
+            backend = "ffmpeg" if shutil.which("ffmpeg") else "opencv"
+        self.backend = backend
+        self._proc = None
+        if backend == "ffmpeg":
+            self._start_ffmpeg()
+        elif backend == "opencv":
+            self._start_cv2()
+        else:
+            raise ValueError(f"Unknown encoder backend: {backend}")
+        self.frames = 0
+
+    # ── backends ─────────────────────────────────────────────────────
+    def _ffmpeg_cmd(self):
+        c = self.c
+        w, h = self.size
+        quality = (["-b:v", str(c["BITRATE"])] if c["BITRATE"]
+                   else ["-crf", str(c["CRF"])])
+        out_opts = ["-c:v", "libx264", "-preset", str(c["PRESET"]), *quality,
+                    "-pix_fmt", "yuv420p", "-movflags", "+faststart"]
+        cmd = ["ffmpeg", "-hide_banner", "-loglevel", "error", "-y",
+               "-f", "rawvideo", "-pix_fmt", "bgr24", "-s", f"{w}x{h}",
+               "-r", f"{self.fps}", "-i", "-",
+               # odd sizes cannot be yuv420p; crop the last row/column
+               "-map", "0:v", "-vf", "crop=trunc(iw/2)*2:trunc(ih/2)*2",
+               *out_opts, self.path]
+        if self.proxy_path:
+            pw, ph = self.proxy_size
+            cmd += ["-map", "0:v", "-vf", f"scale={pw}:{ph}", *out_opts, self.proxy_path]
+        return cmd
+
+    def _start_ffmpeg(self):
+        try:
+            self._proc = subprocess.Popen(self._ffmpeg_cmd(), stdin=subprocess.PIPE)
+        except FileNotFoundError:
+            raise RuntimeError("ffmpeg not found on PATH; use BACKEND 'opencv'") from None
+        print(f"[encoder] ffmpeg libx264 preset={self.c['PRESET']} "
+              f"{'bitrate=' + str(self.c['BITRATE']) if self.c['BITRATE'] else 'crf=' + str(self.c['CRF'])}"
+              f"{' + proxy ' + str(self.proxy_size) if self.proxy_path else ''}")
+
+    def _start_cv2(self):
+        w, h = self.size
+        cmd = [sys.executable, os.path.abspath(__file__), self.path, str(self.fps), str(w), str(h)]
+        if self.proxy_path:
+            cmd += [self.proxy_path, *map(str, self.proxy_size)]
+        self._proc = subprocess.Popen(cmd, stdin=subprocess.PIPE, stdout=subprocess.PIPE)
+        # relay the worker's log until it reports its writers are open
+        for line in iter(self._proc.stdout.readline, b""):
+            if line.strip() == b"ready":
+                return
+            print(line.decode(errors="replace"), end="")
+        code = self._proc.wait()
+        raise RuntimeError(f"encoder process failed to start (exit code {code})")
+
+    # ── public ───────────────────────────────────────────────────────
+    def write(self, frame):
+        self._proc.stdin.write(np.ascontiguousarray(frame).tobytes())
+        self.frames += 1
+
+    def close(self):
+        if self._proc is None:
+            return
+        self._proc.stdin.close()
+        code = self._proc.wait()
+        self._proc = None
+        if code != 0:
+            raise RuntimeError(f"{self.backend} encoder exited with code {code}")
+
+    def abort(self):
+        """Kill the encoder after a failure; its own errors are not reported."""
+        if self._proc is None:
+            return
+        proc, self._proc = self._proc, None
+        proc.kill()
+        for pipe in (proc.stdin, proc.stdout):
+            if pipe is not None:
+                try:
+                    pipe.close()
+                except OSError:
+                    pass            # e.g. BrokenPipeError flushing to a dead child
+        proc.wait()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, *exc):
+        # after a failure (often the child dying: BrokenPipeError) a normal
+        # close would raise again and hide it
+        if exc_type is not None:
+            self.abort()
+        else:
+            self.close()
+        return False
+
+
+if __name__ == "__main__":
+    # worker entry: encoder.py OUT FPS W H [PROXY PW PH]
+    a = sys.argv[1:]
+    _cv2_worker(a[0], float(a[1]), (int(a[2]), int(a[3])),
+                a[4] if len(a) > 4 else None,
+                (int(a[5]), int(a[6])) if len(a) > 4 else None)
@@ -0,0 +1,119 @@
+"""
+CPU budget for concurrent backend jobs.
+
+Overlapping `process_video` runs each assume they own the machine: torch
+intra-op threads, OpenCV's pool and the executor all size themselves to
+every core, and two jobs end up slower than one.  `CpuGovernor` runs jobs
+on its own executor of MAX_JOBS threads and gives each job a fixed slot
+of cores:
+
+  * torch.set_num_threads / cv2.setNumThreads are set to the slot size
+    on the job's thread before it starts;
+  * with PIN_AFFINITY (Linux), the job thread is pinned to the slot's
+    cores — threads it starts afterwards (torch/OpenMP workers, the
+    encoder subprocess) inherit that mask.
+
+Both thread limits are process-wide, which is why every slot has the same
+size.  `snapshot()` reports the current allocation.
+
+    governor = CpuGovernor({"MAX_JOBS": 2})
+    result = await governor.run("upload", process_video, path, output_dir=out)
+"""
+
+import asyncio
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+
+import cv2
+
+# ─── DEFAULT GOVERNOR KNOBS ──────────────────────────────────────────
+GOVERNOR_CFG = {
+    "MAX_JOBS":      2,      # jobs running at once; more wait in the executor queue
+    "CORES_PER_JOB": None,   # None → usable cores // MAX_JOBS
+    "PIN_AFFINITY":  False,  # also pin each job thread to its cores (Linux only)
+}
+
+
+def _usable_cores():
+    if hasattr(os, "sched_getaffinity"):
+        return sorted(os.sched_getaffinity(0))
+    return list(range(os.cpu_count() or 1))
+
+
+class CpuGovernor:
+    """Run jobs with a per-job core budget; see module docstring."""
+
+    def __init__(self, cfg: dict = None):
+        self.c = c = {**GOVERNOR_CFG, **(cfg or {})}
+        self.cores = _usable_cores()
+        self.max_jobs = max(1, int(c["MAX_JOBS"]))
+        self.cores_per_job = max(1, int(c["CORES_PER_JOB"] or len(self.cores) // self.max_jobs))
+        self.pin = bool(c["PIN_AFFINITY"]) and hasattr(os, "sched_setaffinity")
+        # slot k owns cores[k*n:(k+1)*n]; with fewer cores than slots they wrap and share
+        n = self.cores_per_job
+        self.slots = [[self.cores[(k * n + i) % len(self.cores)] for i in range(n)]
+                      for k in range(self.max_jobs)]
+        self.executor = ThreadPoolExecutor(max_workers=self.max_jobs, thread_name_prefix="job")
+
+        self._lock = threading.Lock()
+        self._free = list(range(self.max_jobs))
+        self._jobs = {}       # slot -> {"job", "started"}
+        self._queued = 0
+        print(f"[governor] {self.max_jobs} job slot(s) x {self.cores_per_job} core(s) "
+              f"of {len(self.cores)}{' (pinned)' if self.pin else ''}")
+
+    # ── allocation ───────────────────────────────────────────────────
+    def _apply(self, cores):
+        threads = len(cores)
+        cv2.setNumThreads(threads)
+        try:
+            import torch
+        except ImportError:
+            torch = None
+        if torch is not None:
+            torch.set_num_threads(threads)
+        if self.pin:
+            os.sched_setaffinity(0, cores)    # 0 = the calling thread on Linux
+
+    def _run(self, name, fn):
+        with self._lock:
+            self._queued -= 1
+            slot = self._free.pop(0)
+            self._jobs[slot] = {"job": name, "started": time.time()}
+        try:
+            self._apply(self.slots[slot])
+            return fn()
+        finally:
+            if self.pin:
+                os.sched_setaffinity(0, self.cores)
+            with self._lock:
+                del self._jobs[slot]
+                self._free.append(slot)
+
+    async def run(self, name: str, fn, *args, **kwargs):
+        """Await fn(*args, **kwargs) on a governed job thread."""
+        with self._lock:
+            self._queued += 1
+        loop = asyncio.get_event_loop()
+        return await loop.run_in_executor(self.executor, self._run, name, partial(fn, *args, **kwargs))
+
+    # ── inspection ───────────────────────────────────────────────────
+    def snapshot(self) -> dict:
+        now = time.time()
+        with self._lock:
+            jobs = [{"slot": k, "job": j["job"], "cores": self.slots[k],
+                     "threads": self.cores_per_job, "running_s": round(now - j["started"], 1)}
+                    for k, j in sorted(self._jobs.items())]
+            queued = self._queued
+        return {
+            "cores":         self.cores,
+            "max_jobs":      self.max_jobs,
+            "cores_per_job": self.cores_per_job,
+            "pin_affinity":  self.pin,
+            "running":       jobs,
+            "queued":        queued,
+            "idle_slots":    self.max_jobs - len(jobs),
+        }
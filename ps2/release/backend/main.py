@@ -1,11 +1,19 @@
-from fastapi import FastAPI, UploadFile, File, HTTPException
+import time
+_T_IMPORT = time.perf_counter()
+
+from fastapi import FastAPI, UploadFile, File, HTTPException, Body
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import FileResponse
+from fastapi.responses import FileResponse, JSONResponse
 import os
 import json
 import asyncio
-from functools import partial
-from detector import process_video
+# detector defers ultralytics/torch/skimage to first use, so this stays fast
+from detector import (process_video, reanalyze, export_annotated, preload_model,
+                      DEFAULT_CFG, IMPORT_TIMES)
+from encoder import ENCODER_CFG
+from governor import CpuGovernor
+from memory import MemoryBudgetExceeded
+from profiler import profile_call
 
 app = FastAPI(title="Ball Detection API")
 
@@ -25,10 +33,13 @@ app.add_middleware(
 
 UPLOAD_FOLDER = "uploads"
 OUTPUT_FOLDER = "outputs"
+SOURCE_FOLDER = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "..", "sample_videos"))
 os.makedirs(UPLOAD_FOLDER, exist_ok=True)
 os.makedirs(OUTPUT_FOLDER, exist_ok=True)
 
 MAX_UPLOAD_BYTES = 500 * 1024 * 1024  # 500 MB
+# per-job memory budget (RSS growth); above 70% the job goes low-memory
+JOB_MEMORY_BUDGET_MB = int(os.environ.get("JOB_MEMORY_BUDGET_MB", 2048))
 ALLOWED_MIME = {
     "video/mp4", "video/avi", "video/x-msvideo",
     "video/quicktime", "video/x-matroska", "video/webm",
@@ -45,18 +56,69 @@ def _safe_path(folder: str, filename: str) -> str:
     return candidate
 
 
-# ─── Health check — validates model weight exists ─────────────────────
+# ─── CPU governor — per-job core budget for process/export/reanalyze ──
+governor = CpuGovernor()
+
+
+async def _run_job(job: str, video_path: str, fn, *args, profile: bool = False, **kwargs):
+    """Run fn on a governed job thread; with profile, also save a flame graph
+    and top-N table as <video>_<job>_profile.* under OUTPUT_FOLDER."""
+    if not profile:
+        return await governor.run(job, fn, *args, **kwargs)
+    name = f"{os.path.splitext(os.path.basename(video_path))[0]}_{job}"
+    result, files = await governor.run(job, profile_call, fn, OUTPUT_FOLDER, name, *args, **kwargs)
+    return {**result, "profile": files}
+
+
+# ─── Startup — model loads in the background, the API is up at once ───
+MODEL_PATH = "best.pt"
+STARTED_AT = time.time()
+IMPORT_S   = round(time.perf_counter() - _T_IMPORT, 3)
+MODEL_STATE = {"status": "pending"}   # pending | loading | ready | failed
+
+
+def _load_model():
+    MODEL_STATE["status"] = "loading"
+    try:
+        MODEL_STATE.update(preload_model(MODEL_PATH), status="ready")
+    except Exception as e:
+        MODEL_STATE.update(status="failed", error=f"{type(e).__name__}: {e}")
+        print(f"[main] Model preload failed: {MODEL_STATE['error']}")
+
+
+@app.on_event("startup")
+async def preload():
+    # not awaited: startup completes and liveness answers while this runs
+    asyncio.get_event_loop().run_in_executor(None, _load_model)
+
+
+# ─── Health checks — liveness vs readiness ────────────────────────────
 @app.get("/health")
-async def health():
-    model_path = os.path.join(os.path.dirname(__file__), "best.pt")
-    model_ok   = os.path.exists(model_path)
-    return {"status": "ok", "model": "loaded" if model_ok else "missing"}
+@app.get("/health/live")
+async def health_live():
+    """The process is up and serving; says nothing about the model."""
+    return {
+        "status":   "ok",
+        "uptime_s": round(time.time() - STARTED_AT, 1),
+        "import_s": IMPORT_S,
+    }
+
+
+@app.get("/health/ready")
+async def health_ready():
+    """200 once the model is loaded and warmed up, 503 until then."""
+    body = {**MODEL_STATE, "import_s": IMPORT_S, "imports": dict(IMPORT_TIMES)}
+    return JSONResponse(body, status_code=200 if MODEL_STATE["status"] == "ready" else 503)
+
+@app.get("/jobs/cpu")
+async def cpu_allocation():
+    """Current per-job core allocation of the CPU governor."""
+    return governor.snapshot()
+
 
 @app.post("/upload")
-async def upload_video():
+async def upload_video(profile: bool = False):
     import os
-    import asyncio
-    from functools import partial
 
     # Base directory of backend
     BASE_DIR = os.path.dirname(os.path.abspath(__file__))
@@ -74,20 +136,25 @@ async def upload_video():
     if not os.path.exists(demo_video_path):
         raise HTTPException(status_code=500, detail=f"Demo video not found at {demo_video_path}")
 
-    # Run heavy processing in executor
-    loop = asyncio.get_event_loop()
-    result = await loop.run_in_executor(
-        None,
-        partial(process_video, demo_video_path, output_dir=OUTPUT_FOLDER),
-    )
+    # Run heavy processing on a governed job thread
+    try:
+        result = await _run_job("upload", demo_video_path, process_video, demo_video_path,
+                                output_dir=OUTPUT_FOLDER, render=False, profile=profile,
+                                memory_cfg={"BUDGET_MB": JOB_MEMORY_BUDGET_MB})
+    except MemoryBudgetExceeded as e:
+        raise HTTPException(status_code=507, detail=f"Memory budget exceeded: {e}")
 
     return {
         "status":          "processed",
         "annotated_video": result["annotated_video"],
+        "source_video":    result["source_video"],
+        "overlay_file":    result["overlay_file"],
         "report":          result["report"],
         "report_file":     result.get("report_file"),
         "csv_file":        result.get("csv_file"),
         "thumbnail":       result.get("thumbnail"),
+        "memory":          result.get("memory"),
+        "profile":         result.get("profile"),
     }
 
 @app.get("/video/{filename}")
@@ -98,6 +165,38 @@ async def get_video(filename: str):
     return FileResponse(path, media_type="video/mp4")
 
 
+@app.get("/source/{filename}")
+async def get_source_video(filename: str):
+    """Original (un-annotated) video; the dashboard draws the overlay track on top."""
+    path = _safe_path(SOURCE_FOLDER, filename)
+    if not os.path.exists(path):
+        raise HTTPException(status_code=404, detail="File not found")
+    return FileResponse(path, media_type="video/mp4")
+
+
+@app.post("/export")
+async def export_video(encoder_cfg: dict = Body(default={}), profile: bool = False):
+    """Burn the overlay track into an annotated MP4 for download.
+
+    Body may override encoder settings: PRESET, CRF, BITRATE, PROXY_SCALE.
+    ?profile=true also saves a flame graph + hot-function table.
+    """
+    unknown = sorted(set(encoder_cfg) - set(ENCODER_CFG))
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Unknown encoder keys: {unknown}")
+    demo_video_path = os.path.join(SOURCE_FOLDER, "final.mp4")
+
+    try:
+        result = await _run_job("export", demo_video_path, export_annotated, demo_video_path,
+                                output_dir=OUTPUT_FOLDER, encoder_cfg=encoder_cfg, profile=profile)
+    except FileNotFoundError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    return {"status": "exported", **result}
+
+
 @app.get("/download/{filename}")
 async def download_file(filename: str):
     path = _safe_path(OUTPUT_FOLDER, filename)
@@ -115,3 +214,30 @@ async def get_report(filename: str):
     with open(path, "r") as f:
         data = json.load(f)
     return data
+
+
+@app.post("/reanalyze")
+async def reanalyze_video(cfg: dict = Body(default={}), profile: bool = False):
+    """Re-run tracking + drop/merge logic on cached detections with new thresholds."""
+    unknown = sorted(set(cfg) - set(DEFAULT_CFG))
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Unknown cfg keys: {unknown}")
+
+    BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+    project_root = os.path.abspath(os.path.join(BASE_DIR, "..", "..", ".."))
+    demo_video_path = os.path.join(project_root, "ps2", "sample_videos", "final.mp4")
+
+    try:
+        result = await _run_job("reanalyze", demo_video_path, reanalyze, demo_video_path, cfg,
+                                output_dir=OUTPUT_FOLDER, profile=profile)
+    except FileNotFoundError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    return {
+        "status":        "reanalyzed",
+        "report":        result["report"],
+        "approx_frames": result["approx_frames"],
+        "profile":       result.get("profile"),
+    }
@@ -0,0 +1,172 @@
+"""
+Per-job memory budget.
+
+`MemoryBudget` measures RSS growth over the RSS at job start, per stage:
+
+    budget = MemoryBudget({"BUDGET_MB": 1024})
+    budget.preflight(stream_mb=..., full_mb=...)   # fail fast / start low-memory
+    with budget.stage("pass1"):
+        for ...:
+            budget.check()
+    budget.close()
+
+  * used > LOW_MEMORY_FRAC * BUDGET_MB → `low_memory` turns on once and the
+    registered `on_low_memory` callbacks run, so the job can switch to its
+    streaming strategy;
+  * used > BUDGET_MB → MemoryBudgetExceeded with the stage and numbers.
+
+RSS is process-wide, so jobs running side by side in one server process
+(the governor runs several) cannot be told apart.  While more than one
+budget is open they share a pool: growth since the earliest open job
+started, against the sum of their budgets.  A lone job gets exactly its
+own budget; with company, whichever job checks first when the pool runs
+out is the one that switches or fails, not necessarily the one that grew.
+A budget leaves the pool on `close()` (or when it is garbage-collected).
+
+`report()` is the "memory" section of the job report: per-stage start /
+end / peak RSS, the process RSS growth seen since job start (other jobs'
+included), the most jobs that were open at once, and the process peak RSS.
+"""
+
+import os
+import sys
+import threading
+import weakref
+from contextlib import contextmanager
+
+# ─── DEFAULT MEMORY KNOBS ────────────────────────────────────────────
+MEMORY_CFG = {
+    "BUDGET_MB":       None,   # RSS growth allowed per job; None = track only
+    "LOW_MEMORY_FRAC": 0.7,    # switch to low-memory strategy above this share
+    "CHECK_EVERY":     50,     # frames between checks inside frame loops
+}
+
+
+class MemoryBudgetExceeded(MemoryError):
+    """The job would need more memory than its budget."""
+
+
+# open budgets in this process; they share one pool (see module docstring)
+_open = weakref.WeakSet()
+_open_lock = threading.Lock()
+
+
+def rss_mb() -> float:
+    """Current resident set size of this process, in MB (peak RSS without /proc)."""
+    try:
+        with open("/proc/self/statm") as f:
+            pages = int(f.read().split()[1])
+        return pages * os.sysconf("SC_PAGE_SIZE") / (1024 * 1024)
+    except (OSError, ValueError, AttributeError):
+        return peak_rss_mb()
+
+
+def peak_rss_mb() -> float:
+    """Peak resident set size of this process so far, in MB."""
+    import resource
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # kilobytes on Linux, bytes on macOS
+    return peak / (1024 * 1024 if sys.platform == "darwin" else 1024)
+
+
+class MemoryBudget:
+    """Track and enforce one job's memory; see module docstring."""
+
+    def __init__(self, cfg: dict = None):
+        self.c = c = {**MEMORY_CFG, **(cfg or {})}
+        self.budget_mb = c["BUDGET_MB"]
+        self.check_every = max(1, int(c["CHECK_EVERY"]))
+        self.baseline_mb = rss_mb()
+        self.peak_mb = self.baseline_mb
+        self.low_memory = False
+        self.low_memory_reason = None
+        self.stages = {}
+        self._stage = None
+        self._callbacks = []
+        self.max_jobs = 1
+        with _open_lock:
+            _open.add(self)
+
+    def close(self):
+        """Leave the shared pool; call when the job's work is done."""
+        with _open_lock:
+            _open.discard(self)
+
+    def on_low_memory(self, fn):
+        """Register fn() to run when the job switches to low-memory mode."""
+        self._callbacks.append(fn)
+        if self.low_memory:
+            fn()
+
+    def switch_low_memory(self, reason: str):
+        if self.low_memory:
+            return
+        self.low_memory = True
+        self.low_memory_reason = reason
+        print(f"[memory] Switching to low-memory mode: {reason}")
+        for fn in self._callbacks:
+            fn()
+
+    def preflight(self, stream_mb: float, full_mb: float):
+        """
+        Decide before the work starts: fail if even the streaming strategy
+        (stream_mb) cannot fit, start in low-memory mode if the default one
+        (full_mb) would not fit under LOW_MEMORY_FRAC of the budget.
+        """
+        if self.budget_mb is None:
+            return
+        if stream_mb > self.budget_mb:
+            raise MemoryBudgetExceeded(
+                f"job needs at least {stream_mb:.0f} MB even in low-memory mode, "
+                f"budget is {self.budget_mb} MB")
+        if full_mb > self.c["LOW_MEMORY_FRAC"] * self.budget_mb:
+            self.switch_low_memory(f"estimated {full_mb:.0f} MB of a {self.budget_mb} MB budget")
+
+    @contextmanager
+    def stage(self, name: str):
+        start = rss_mb()
+        self._stage = name
+        self.stages[name] = {"start_mb": round(start, 1), "peak_mb": round(start, 1)}
+        try:
+            yield self
+        finally:
+            end = self.check()
+            self.stages[name]["end_mb"] = round(end, 1)
+            self._stage = None
+
+    def check(self) -> float:
+        """Sample RSS, update peaks, enforce the budget; returns RSS in MB."""
+        rss = rss_mb()
+        self.peak_mb = max(self.peak_mb, rss)
+        if self._stage is not None:
+            st = self.stages[self._stage]
+            st["peak_mb"] = round(max(st["peak_mb"], rss), 1)
+        with _open_lock:
+            pool = set(_open) | {self}
+        self.max_jobs = max(self.max_jobs, len(pool))
+        if self.budget_mb is not None:
+            used  = rss - min(b.baseline_mb for b in pool)
+            limit = sum(b.budget_mb for b in pool if b.budget_mb is not None)
+            stage = self._stage or "job"
+            if len(pool) > 1:
+                who = f"{len(pool)} jobs used {used:.0f} MB of their shared {limit} MB budget"
+            else:
+                who = f"job used {used:.0f} MB of its {limit} MB budget"
+            if used > limit:
+                raise MemoryBudgetExceeded(f"{who} during '{stage}' (process RSS {rss:.0f} MB)")
+            if used > self.c["LOW_MEMORY_FRAC"] * limit:
+                self.switch_low_memory(f"{who} during '{stage}'")
+        return rss
+
+    def report(self) -> dict:
+        return {
+            "budget_mb":         self.budget_mb,
+            "baseline_rss_mb":   round(self.baseline_mb, 1),
+            "peak_rss_mb":       round(self.peak_mb, 1),
+            "peak_growth_mb":    round(self.peak_mb - self.baseline_mb, 1),
+            "max_open_jobs":     self.max_jobs,
+            "process_peak_rss_mb": round(peak_rss_mb(), 1),
+            "low_memory":        self.low_memory,
+            "low_memory_reason": self.low_memory_reason,
+            "stages":            self.stages,
+        }
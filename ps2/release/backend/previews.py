@@ -0,0 +1,123 @@
+"""
+Scrub previews built from frames the renderer already has in memory.
+
+`PreviewBuilder` is fed (frame_id, annotated frame) in decode order and
+writes, next to the other outputs:
+
+    <basename>_thumbnail.jpg        first frame, full size
+    <basename>_sprite_<k>.jpg       sheets of downscaled tiles, one tile
+                                    every INTERVAL frames, row-major
+    <basename>_event_<frame>.jpg    one thumbnail per DROP/MERGE frame
+    <basename>_previews.json        index: frame -> sheet / tile position
+
+Frame f maps to tile t = min(f // interval, tiles - 1), on sheet
+t // (cols * rows) at column t % cols, row (t // cols) % rows.
+"""
+
+import json
+import os
+
+import cv2
+import numpy as np
+
+# ─── DEFAULT PREVIEW KNOBS ───────────────────────────────────────────
+PREVIEW_CFG = {
+    "INTERVAL_FRAMES":  None,  # one sprite tile every N frames (None → ~1 s)
+    "TILE_W":           160,   # sprite tile width, height keeps aspect
+    "COLS":             10,    # tiles per sheet row
+    "ROWS":             10,    # tile rows per sheet
+    "EVENT_W":          320,   # event thumbnail width
+    "MAX_EVENT_THUMBS": 500,   # cap on DROP/MERGE thumbnails
+    "JPEG_QUALITY":     80,
+}
+
+
+class PreviewBuilder:
+    """Collect sprite tiles and event thumbnails during a decode pass."""
+
+    def __init__(self, output_dir: str, basename: str, fps: float, frame_w: int, frame_h: int,
+                 events: dict, cfg: dict = None):
+        self.c = c = {**PREVIEW_CFG, **(cfg or {})}
+        self.output_dir = output_dir
+        self.basename = basename
+        self.interval = int(c["INTERVAL_FRAMES"] or max(1, round(fps or 30.0)))
+        self.tile_w = int(c["TILE_W"])
+        self.tile_h = max(1, round(self.tile_w * frame_h / max(1, frame_w)))
+        self.event_size = (int(c["EVENT_W"]), max(1, round(c["EVENT_W"] * frame_h / max(1, frame_w))))
+        self.cols, self.rows = int(c["COLS"]), int(c["ROWS"])
+        self.params = [cv2.IMWRITE_JPEG_QUALITY, int(c["JPEG_QUALITY"])]
+
+        # events: frame -> label; keep the first MAX_EVENT_THUMBS in frame order
+        ordered = sorted(events.items())
+        self.events = dict(ordered[:c["MAX_EVENT_THUMBS"]])
+        self.events_total = len(ordered)
+
+        self.sheet = None
+        self.sheets = []
+        self.tiles = 0
+        self.event_files = {}
+        self.thumbnail = None
+
+    def wants(self, fid: int) -> bool:
+        return fid == 0 or fid % self.interval == 0 or fid in self.events
+
+    def _name(self, suffix: str) -> str:
+        return f"{self.basename}_{suffix}.jpg"
+
+    def _write(self, name: str, img):
+        cv2.imwrite(os.path.join(self.output_dir, name), img, self.params)
+
+    def _flush_sheet(self):
+        if self.sheet is None:
+            return
+        name = self._name(f"sprite_{len(self.sheets)}")
+        used = self.tiles - len(self.sheets) * self.cols * self.rows
+        rows_used = (used + self.cols - 1) // self.cols
+        self._write(name, self.sheet[:rows_used * self.tile_h])
+        self.sheets.append(name)
+        self.sheet = None
+
+    def add(self, fid: int, frame):
+        if fid == 0:
+            self.thumbnail = self._name("thumbnail")
+            cv2.imwrite(os.path.join(self.output_dir, self.thumbnail), frame)
+
+        if fid % self.interval == 0 and fid // self.interval == self.tiles:
+            per_sheet = self.cols * self.rows
+            if self.sheet is None:
+                self.sheet = np.zeros((self.rows * self.tile_h, self.cols * self.tile_w, 3), np.uint8)
+            pos = self.tiles % per_sheet
+            y, x = (pos // self.cols) * self.tile_h, (pos % self.cols) * self.tile_w
+            self.sheet[y:y + self.tile_h, x:x + self.tile_w] = cv2.resize(
+                frame, (self.tile_w, self.tile_h), interpolation=cv2.INTER_AREA)
+            self.tiles += 1
+            if self.tiles % per_sheet == 0:
+                self._flush_sheet()
+
+        label = self.events.get(fid)
+        if label is not None:
+            name = self._name(f"event_{fid:05d}")
+            self._write(name, cv2.resize(frame, self.event_size, interpolation=cv2.INTER_AREA))
+            self.event_files[fid] = {"label": label, "file": name}
+
+    def finish(self) -> str:
+        """Write the last sheet and the index; return the index filename."""
+        self._flush_sheet()
+        index = {
+            "interval":  self.interval,
+            "tile_w":    self.tile_w,
+            "tile_h":    self.tile_h,
+            "cols":      self.cols,
+            "rows":      self.rows,
+            "tiles":     self.tiles,
+            "sheets":    self.sheets,
+            "thumbnail": self.thumbnail,
+            "events":    {str(f): v for f, v in sorted(self.event_files.items())},
+            "events_total": self.events_total,
+        }
+        name = f"{self.basename}_previews.json"
+        with open(os.path.join(self.output_dir, name), "w") as f:
+            json.dump(index, f, separators=(",", ":"))
+        print(f"[previews] {self.tiles} tiles on {len(self.sheets)} sheet(s), "
+              f"{len(self.event_files)} event thumbnails")
+        return name
@@ -0,0 +1,233 @@
+"""
+On-demand sampling profiler for jobs and scripts.
+
+A background thread snapshots the Python stack of every thread in the
+process every INTERVAL seconds (`sys._current_frames`), so work handed to
+pools — StageGraph stages, the detector's writer and encoder threads —
+is seen too.  Each stack is rooted at its thread's name, so the flame
+graph splits by thread; threads parked in a wait show up as such.
+Nothing is installed in the profiled code, so the cost is one stack walk
+per thread per sample and exactly zero when profiling is off.  Pass
+`thread_id` to follow a single thread.  `save()` writes, next to the
+job's other outputs:
+
+    <name>_profile.svg      flame graph (root at the bottom, hover for counts)
+    <name>_profile.txt      top-N functions by self and total time
+    <name>_profile.folded   collapsed stacks, for flamegraph.pl / speedscope
+
+From code:
+
+    result, files = profile_call(process_video, "outputs", "final_upload", path)
+
+Around any script or module:
+
+    python profiler.py --out outputs ps2/scripts/run_pipeline.py video.mp4
+    python profiler.py --out outputs -m ps2.evaluation.sweep --help
+"""
+
+import html
+import os
+import sys
+import threading
+import time
+import zlib
+from collections import Counter
+
+# ─── DEFAULT PROFILER KNOBS ──────────────────────────────────────────
+PROFILE_CFG = {
+    "INTERVAL": 0.005,   # seconds between samples
+    "TOP_N":    30,      # rows in the hot-function table
+    "WIDTH":    1200,    # flame graph width in px
+}
+
+_ROW_H = 16
+
+
+def _label(code) -> str:
+    path = code.co_filename
+    short = os.path.join(os.path.basename(os.path.dirname(path)), os.path.basename(path))
+    return f"{code.co_name} ({short}:{code.co_firstlineno})"
+
+
+class SamplingProfiler:
+    """Sample one thread's stack at a fixed interval; see module docstring."""
+
+    def __init__(self, cfg: dict = None, thread_id: int = None):
+        self.c = {**PROFILE_CFG, **(cfg or {})}
+        self.thread_id = thread_id
+        self.stacks = Counter()      # root-first tuple of labels -> samples
+        self.ticks = 0               # sampling rounds (one sample per thread each)
+        self.elapsed = 0.0
+        self._labels = {}            # code object -> label
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        self._t0 = time.perf_counter()
+        self._thread = threading.Thread(target=self._sample, name="profiler", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+        self.elapsed = time.perf_counter() - self._t0
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+        return False
+
+    def _sample(self):
+        labels = self._labels
+        own = threading.get_ident()
+        while not self._stop.wait(self.c["INTERVAL"]):
+            frames = sys._current_frames()
+            names = {t.ident: t.name for t in threading.enumerate()}
+            self.ticks += 1
+            for ident, frame in frames.items():
+                if ident == own or (self.thread_id is not None and ident != self.thread_id):
+                    continue
+                stack = []
+                while frame is not None:
+                    code = frame.f_code
+                    label = labels.get(code)
+                    if label is None:
+                        label = labels[code] = _label(code)
+                    stack.append(label)
+                    frame = frame.f_back
+                if stack:
+                    stack.append(f"[thread {names.get(ident, ident)}]")
+                    self.stacks[tuple(reversed(stack))] += 1
+
+    # ── outputs ──────────────────────────────────────────────────────
+    @property
+    def samples(self) -> int:
+        return sum(self.stacks.values())
+
+    def top(self, n: int = None):
+        """[(label, self samples, total samples)] sorted by self, then total."""
+        own, total = Counter(), Counter()
+        for stack, k in self.stacks.items():
+            own[stack[-1]] += k
+            for label in set(stack[1:]):     # [0] is the thread root
+                total[label] += k
+        rows = sorted(total, key=lambda f: (-own[f], -total[f]))
+        return [(f, own[f], total[f]) for f in rows[:n or self.c["TOP_N"]]]
+
+    def _table(self) -> str:
+        # percentages are of wall time per thread, so threads can add up past 100
+        n = max(1, self.ticks)
+        per = self.elapsed / n
+        scope = "all threads" if self.thread_id is None else "one thread"
+        lines = [f"{self.samples} samples in {self.ticks} rounds over {self.elapsed:.2f}s "
+                 f"(every {self.c['INTERVAL'] * 1000:.1f} ms, {scope})", "",
+                 f"{'self%':>7} {'total%':>7} {'self_s':>8} {'total_s':>8}  function"]
+        for label, own, total in self.top():
+            lines.append(f"{100 * own / n:7.1f} {100 * total / n:7.1f} "
+                         f"{own * per:8.2f} {total * per:8.2f}  {label}")
+        return "\n".join(lines) + "\n"
+
+    def _svg(self) -> str:
+        width = self.c["WIDTH"]
+        n = max(1, self.samples)
+        # merge stacks into a tree: node = [samples, {label: child}]
+        root = [0, {}]
+        for stack, k in self.stacks.items():
+            node = root
+            node[0] += k
+            for label in stack:
+                node = node[1].setdefault(label, [0, {}])
+                node[0] += k
+
+        rects = []
+        depth_max = 0
+
+        def walk(children, x, depth):
+            nonlocal depth_max
+            depth_max = max(depth_max, depth)
+            for label, (k, sub) in sorted(children.items()):
+                w = width * k / n
+                if w >= 0.5:
+                    rects.append((x, depth, w, label, k))
+                    walk(sub, x, depth + 1)
+                x += w
+
+        walk(root[1], 0.0, 0)
+        height = (depth_max + 1) * _ROW_H + 24
+        out = [f'<svg xmlns="http://www.w3.org/2000/svg" width="{width}" height="{height}" '
+               f'font-family="monospace" font-size="11">',
+               f'<text x="4" y="14">{self.samples} samples, {self.elapsed:.2f}s</text>']
+        for x, depth, w, label, k in rects:
+            y = height - (depth + 1) * _ROW_H
+            hue = zlib.crc32(label.encode()) % 50
+            text = html.escape(label)
+            chars = int((w - 4) / 7)
+            shown = text if len(label) <= chars else html.escape(label[:max(0, chars - 2)] + "..")
+            out.append(
+                f'<g><title>{text} — {k} samples ({100 * k / n:.1f}%)</title>'
+                f'<rect x="{x:.1f}" y="{y}" width="{w:.1f}" height="{_ROW_H - 1}" '
+                f'fill="hsl({hue},80%,60%)"/>'
+                + (f'<text x="{x + 2:.1f}" y="{y + 11}">{shown}</text>' if chars >= 3 else "")
+                + "</g>")
+        out.append("</svg>")
+        return "\n".join(out)
+
+    def save(self, output_dir: str, name: str) -> dict:
+        """Write flame graph, top-N table and folded stacks; return filenames."""
+        os.makedirs(output_dir, exist_ok=True)
+        files = {
+            "flamegraph": f"{name}_profile.svg",
+            "top":        f"{name}_profile.txt",
+            "folded":     f"{name}_profile.folded",
+        }
+        with open(os.path.join(output_dir, files["flamegraph"]), "w") as f:
+            f.write(self._svg())
+        with open(os.path.join(output_dir, files["top"]), "w") as f:
+            f.write(self._table())
+        with open(os.path.join(output_dir, files["folded"]), "w") as f:
+            for stack, k in self.stacks.most_common():
+                f.write(f"{';'.join(stack)} {k}\n")
+        print(f"[profiler] {self.samples} samples in {self.elapsed:.2f}s → "
+              f"{os.path.join(output_dir, files['flamegraph'])}")
+        return files
+
+
+def profile_call(fn, output_dir: str, name: str, *args, profile_cfg: dict = None, **kwargs):
+    """Run fn(*args, **kwargs) under the profiler; return (result, files)."""
+    prof = SamplingProfiler(profile_cfg)
+    with prof:
+        result = fn(*args, **kwargs)
+    return result, prof.save(output_dir, name)
+
+
+if __name__ == "__main__":
+    import argparse
+    import runpy
+
+    p = argparse.ArgumentParser(description="Profile a script or module with the sampling profiler")
+    p.add_argument("--out", default="outputs", help="directory for the profile files")
+    p.add_argument("--name", default=None, help="file prefix (default: script / module name)")
+    p.add_argument("--interval", type=float, default=PROFILE_CFG["INTERVAL"], help="seconds between samples")
+    p.add_argument("--top", type=int, default=PROFILE_CFG["TOP_N"], help="rows in the hot-function table")
+    p.add_argument("-m", dest="module", action="store_true", help="target is a module name, as in python -m")
+    p.add_argument("target", help="script path or module name")
+    p.add_argument("args", nargs=argparse.REMAINDER, help="arguments for the target")
+    a = p.parse_args()
+
+    name = a.name or (a.target.rsplit(".", 1)[-1] if a.module
+                      else os.path.splitext(os.path.basename(a.target))[0])
+    sys.argv = [a.target, *a.args]
+    prof = SamplingProfiler({"INTERVAL": a.interval, "TOP_N": a.top})
+    try:
+        with prof:
+            if a.module:
+                sys.path.insert(0, os.getcwd())
+                runpy.run_module(a.target, run_name="__main__", alter_sys=True)
+            else:
+                sys.path.insert(0, os.path.dirname(os.path.abspath(a.target)))
+                runpy.run_path(a.target, run_name="__main__")
+    finally:
+        prof.save(a.out, name)
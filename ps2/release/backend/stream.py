@@ -0,0 +1,303 @@
+"""
+Live detection mode — bounded-latency DROP / MERGE events.
+
+Consumes frames as they arrive (growing file, named pipe, udp:// or
+rtsp:// URL, camera index) and yields events as soon as they are known:
+
+    {"frame": 123, "label": "DROP", "reasons": ["NO_DET"],
+     "center": [x, y], "latency_ms": 12.4}
+
+Built on `detector.BallTracker` (same Kalman / ROI / gate logic as
+`process_video`) plus the frame-level optical-flow signal from `ps2/core`
+scored with a trailing rolling z-score.  DROP evidence is emitted on the
+frame itself, MERGE one tracked frame later (it needs the next ROI).
+
+When processing falls behind the source clock the detector degrades in
+steps instead of queueing up latency:
+
+    level 0 — annotated output + flow at FLOW_SCALE
+    level 1 — no annotation, flow at FLOW_SCALE_COARSE
+    level 2 — no annotation, no flow (ball tracking only)
+
+and climbs back up once it has headroom again.
+"""
+
+import cv2
+import os
+import sys
+import time
+from collections import deque
+
+from detector import (DEFAULT_CFG, BallTracker, _get_model, _is_merge,
+                      _resolve_model_path)
+
+# ps2/core lives at the project root: backend → release → ps2 → root
+_PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "..", ".."))
+if _PROJECT_ROOT not in sys.path:
+    sys.path.insert(0, _PROJECT_ROOT)
+
+from ps2.core.flow import optical_flow_magnitude
+from ps2.core.rolling import RollingZScore
+
+# ─── STREAM TUNING KNOBS (on top of detector.DEFAULT_CFG) ─────────────
+STREAM_CFG = {
+    "LATENCY_BUDGET_MS":  200,
+    "FLOW_SCALE":         0.5,
+    "FLOW_SCALE_COARSE":  0.25,
+    "FLOW_WINDOW":        50,
+    "FLOW_Z_DROP":        3.0,
+    "HISTORY_LEN":        64,
+    "FOLLOW_POLL_S":      0.2,
+    "FOLLOW_IDLE_S":      10.0,
+}
+
+MAX_LEVEL = 2
+
+
+def _open_source(source):
+    """Camera index, URL, pipe or file — whatever cv2 can open."""
+    if isinstance(source, str) and source.isdigit():
+        source = int(source)
+    cap = cv2.VideoCapture(source)
+    if not cap.isOpened():
+        raise ValueError(f"Cannot open source: {source}")
+    return cap
+
+
+class StreamDetector:
+    """
+    Real-time counterpart of `process_video`.
+
+    Parameters
+    ----------
+    model_path : str   – path to YOLO .pt weights
+    cfg        : dict  – override any key from DEFAULT_CFG / STREAM_CFG
+    annotate_path : str – optional annotated output (dropped when degraded)
+    """
+
+    def __init__(self, model_path: str = "best.pt", cfg: dict = None, annotate_path: str = None):
+        self.c = {**DEFAULT_CFG, **STREAM_CFG, **(cfg or {})}
+        self.model = _get_model(_resolve_model_path(model_path))
+        self.annotate_path = annotate_path
+
+        self.level = 0
+        self.stats = {
+            "frames":          0,
+            "events":          0,
+            "max_latency_ms":  0.0,
+            "behind_frames":   0,
+            "max_lag_ms":      0.0,
+            "level_changes":   [],
+        }
+
+    # ── degradation ───────────────────────────────────────────────────
+    def _set_level(self, level, frame_id, reason):
+        level = max(0, min(MAX_LEVEL, level))
+        if level != self.level:
+            print(f"[stream] frame {frame_id}: level {self.level} → {level} ({reason})")
+            self.stats["level_changes"].append(
+                {"frame": frame_id, "from": self.level, "to": level, "reason": reason})
+            self.level = level
+
+    def _flow_scale(self):
+        if self.level == 0:
+            return self.c["FLOW_SCALE"]
+        if self.level == 1:
+            return self.c["FLOW_SCALE_COARSE"]
+        return None
+
+    # ── main loop ─────────────────────────────────────────────────────
+    def run(self, source, follow: bool = False, realtime: bool = False):
+        """
+        Generator of events for `source`.
+
+        follow   – keep polling a growing file until FOLLOW_IDLE_S passes
+                   without new frames
+        realtime – pace reads to the source fps (replaying a file as if
+                   it were live); live sources are paced by the producer
+        """
+        c = self.c
+        cap = _open_source(source)
+
+        fps     = cap.get(cv2.CAP_PROP_FPS) or 25.0
+        frame_w = int(cap.get(cv2.CAP_PROP_FRAME_WIDTH))
+        frame_h = int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
+        interval = 1.0 / fps
+        budget   = c["LATENCY_BUDGET_MS"] / 1000.0
+
+        print(f"[stream] {source}  |  {fps:.1f} FPS  |  {frame_w}x{frame_h}  |  budget {c['LATENCY_BUDGET_MS']} ms")
+
+        tracker = BallTracker(self.model, c, frame_w, frame_h,
+                              history=deque(maxlen=c["HISTORY_LEN"]))
+        flow_z  = RollingZScore(window=c["FLOW_WINDOW"], centered=False)
+        prev_small = None
+        prev_scale = None
+
+        writer = None
+        if self.annotate_path:
+            writer = cv2.VideoWriter(self.annotate_path, cv2.VideoWriter_fourcc(*"mp4v"),
+                                     fps, (frame_w, frame_h))
+
+        frame_id = 0
+        t_start  = None
+        idle_since = None
+        proc_ema = 0.0
+
+        try:
+            while True:
+                ret, frame = cap.read()
+                if not ret:
+                    if not follow:
+                        break
+                    # growing file: wait for more data, reopen past what we have
+                    now = time.perf_counter()
+                    idle_since = idle_since or now
+                    if now - idle_since > c["FOLLOW_IDLE_S"]:
+                        break
+                    time.sleep(c["FOLLOW_POLL_S"])
+                    cap.release()
+                    cap = _open_source(source)
+                    cap.set(cv2.CAP_PROP_POS_FRAMES, frame_id)
+                    continue
+                idle_since = None
+
+                arrived = time.perf_counter()
+                if t_start is None:
+                    t_start = arrived
+                if realtime:
+                    due = t_start + frame_id * interval
+                    if arrived < due:
+                        time.sleep(due - arrived)
+                        arrived = due
+
+                # how far behind the source clock we are
+                lag = arrived - (t_start + frame_id * interval)
+                self.stats["max_lag_ms"] = max(self.stats["max_lag_ms"], lag * 1000.0)
+
+                events = []
+
+                # ── ball tracking (same logic as process_video pass 1) ──
+                entry = tracker.update(frame_id, frame)
+                history = tracker.ball_history
+                if entry is not None and len(history) >= 2:
+                    prev_frame = history[-2]["frame"]
+                    gap = entry["frame"] - prev_frame
+                    if gap >= c["DROP_GAP_MIN"]:
+                        missing = range(prev_frame + 1, entry["frame"])
+                        tracker.mark_drop(missing, f"GAP({gap}f)")
+                        for f in missing:
+                            events.append(self._event(f, "DROP", tracker.drop_evidence[f], None, arrived))
+                    if len(history) >= 3 and _is_merge(history[-3], history[-2], history[-1], c):
+                        m = history[-2]
+                        events.append(self._event(m["frame"], "MERGE", [], m["center"], arrived))
+
+                reasons = list(tracker.drop_evidence.pop(frame_id, []))
+                tracker.drop_frames.discard(frame_id)
+
+                # ── global motion signal from ps2/core ──
+                scale = self._flow_scale()
+                if scale is None:
+                    prev_small = None
+                else:
+                    gray  = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+                    small = cv2.resize(gray, None, fx=scale, fy=scale,
+                                       interpolation=cv2.INTER_AREA)
+                    if prev_small is not None and prev_scale == scale:
+                        mag = optical_flow_magnitude(prev_small, small) / scale
+                        for _, z, _, _ in flow_z.push(mag):
+                            if z > c["FLOW_Z_DROP"]:
+                                reasons.append(f"FLOW(z={z:.1f})")
+                    prev_small, prev_scale = small, scale
+
+                if reasons:
+                    center = entry["center"] if entry is not None else None
+                    events.append(self._event(frame_id, "DROP", reasons, center, arrived))
+
+                # ── optional annotated output (first thing to go) ──
+                if writer is not None and self.level == 0:
+                    self._annotate(frame, entry, events)
+                    writer.write(frame)
+
+                # GAP evidence was kept only until emitted
+                for ev in events:
+                    tracker.drop_evidence.pop(ev["frame"], None)
+                    tracker.drop_frames.discard(ev["frame"])
+
+                yield from events
+
+                # ── keep up with real time ──
+                done = time.perf_counter()
+                proc = done - arrived
+                proc_ema = proc if frame_id == 0 else 0.9 * proc_ema + 0.1 * proc
+                behind = (done - (t_start + frame_id * interval)) > budget
+                if behind:
+                    self.stats["behind_frames"] += 1
+                if behind or proc_ema > 0.9 * interval:
+                    self._set_level(self.level + 1, frame_id,
+                                    f"behind by {lag * 1000:.0f} ms, {proc_ema * 1000:.1f} ms/frame")
+                elif proc_ema < 0.5 * interval and lag < interval:
+                    self._set_level(self.level - 1, frame_id, "headroom")
+
+                frame_id += 1
+                self.stats["frames"] = frame_id
+                if frame_id % 200 == 0:
+                    print(f"[stream] {frame_id} frames  |  level {self.level}  |  "
+                          f"{proc_ema * 1000:.1f} ms/frame  |  lag {lag * 1000:.0f} ms")
+        finally:
+            cap.release()
+            if writer is not None:
+                writer.release()
+
+        print(f"[stream] Done — {self.stats['frames']} frames, {self.stats['events']} events, "
+              f"max latency {self.stats['max_latency_ms']:.1f} ms, "
+              f"{self.stats['behind_frames']} frames behind budget")
+
+    def _event(self, frame_id, label, reasons, center, arrived):
+        latency_ms = (time.perf_counter() - arrived) * 1000.0
+        self.stats["events"] += 1
+        self.stats["max_latency_ms"] = max(self.stats["max_latency_ms"], latency_ms)
+        return {
+            "frame":      frame_id,
+            "label":      label,
+            "reasons":    list(reasons),
+            "center":     list(center) if center is not None else None,
+            "latency_ms": round(latency_ms, 1),
+        }
+
+    @staticmethod
+    def _annotate(frame, entry, events):
+        if entry is not None:
+            bx1, by1, bx2, by2 = entry["bbox"]
+            color = (0, 165, 255) if entry["predicted"] else (0, 255, 0)
+            cv2.rectangle(frame, (bx1, by1), (bx2, by2), color, 2)
+        for ev in events:
+            color = (0, 0, 255) if ev["label"] == "DROP" else (255, 191, 0)
+            cv2.putText(frame, f"{ev['label']} @ {ev['frame']}", (10, 30),
+                        cv2.FONT_HERSHEY_SIMPLEX, 0.7, color, 2)
+
+
+def stream_video(source, model_path: str = "best.pt", cfg: dict = None,
+                 annotate_path: str = None, follow: bool = False, realtime: bool = False):
+    """Convenience wrapper: yield events from a fresh StreamDetector."""
+    yield from StreamDetector(model_path, cfg, annotate_path).run(
+        source, follow=follow, realtime=realtime)
+
+
+if __name__ == "__main__":
+    import argparse
+    import json
+
+    p = argparse.ArgumentParser(description="Live DROP/MERGE detection")
+    p.add_argument("source", help="file, named pipe, udp://..., rtsp://... or camera index")
+    p.add_argument("--model", default="best.pt", help="path to YOLO weights")
+    p.add_argument("--budget-ms", type=int, default=STREAM_CFG["LATENCY_BUDGET_MS"],
+                   help="latency budget per event")
+    p.add_argument("--annotate", default=None, help="optional annotated output .mp4")
+    p.add_argument("--follow", action="store_true", help="keep reading a growing file")
+    p.add_argument("--realtime", action="store_true", help="pace a file at its native fps")
+    args = p.parse_args()
+
+    for event in stream_video(args.source, args.model, {"LATENCY_BUDGET_MS": args.budget_ms},
+                              annotate_path=args.annotate, follow=args.follow,
+                              realtime=args.realtime):
+        print(json.dumps(event), flush=True)
@@ -27,10 +27,12 @@ function App() {
       setStatusMsg("Done!");
 
       navigate(
-        `/results?video=${encodeURIComponent(result.annotated_video)}` +
+        `/results?source=${encodeURIComponent(result.source_video)}` +
+          `&overlay=${encodeURIComponent(result.overlay_file)}` +
           `&report=${encodeURIComponent(result.report_file)}` +
           `&csv=${encodeURIComponent(result.csv_file)}` +
-          `&thumbnail=${encodeURIComponent(result.thumbnail)}`,
+          `&thumbnail=${encodeURIComponent(result.thumbnail)}` +
+          `&previews=${encodeURIComponent(result.previews_file)}`,
       );
     } catch {
       alert("Backend error. Make sure server is running.");
@@ -1,4 +1,4 @@
-import { useEffect, useState } from "react";
+import { useEffect, useRef, useState } from "react";
 import { useNavigate, useSearchParams } from "react-router-dom";
 import {
   PieChart,
@@ -645,6 +645,231 @@ const renderCustomLabel = ({
   );
 };
 
+/* ── Overlay player: draws the overlay track over the source video ──── */
+// Same marks the backend burns in on export (colours are its BGR, as RGB).
+function drawOverlay(ctx, ov, fid) {
+  const { track, markers } = ov;
+  ctx.clearRect(0, 0, ctx.canvas.width, ctx.canvas.height);
+
+  // rows are sorted by frame: binary search the last row at or before fid
+  let lo = 0;
+  let hi = track.length;
+  while (lo < hi) {
+    const mid = (lo + hi) >> 1;
+    if (track[mid][0] <= fid) lo = mid + 1;
+    else hi = mid;
+  }
+
+  ctx.lineWidth = 2;
+  ctx.strokeStyle = "#00ff00";
+  ctx.beginPath();
+  for (let j = 0; j < lo; j++) {
+    const [, , , , , cx, cy] = track[j];
+    if (j === 0) ctx.moveTo(cx, cy);
+    else ctx.lineTo(cx, cy);
+  }
+  ctx.stroke();
+
+  ctx.font = "bold 16px sans-serif";
+  for (const [frame, cx, cy, label, color] of markers) {
+    if (frame > fid) break;
+    ctx.fillStyle = color;
+    ctx.beginPath();
+    ctx.arc(cx, cy, 7, 0, 2 * Math.PI);
+    ctx.fill();
+    ctx.fillText(label, cx - (label === "DROP" ? 22 : 28), cy - 18);
+  }
+
+  const row = lo > 0 && track[lo - 1][0] === fid ? track[lo - 1] : null;
+  if (row) {
+    const [, x1, y1, x2, y2, , , conf, predicted, label] = row;
+    const color =
+      label === "DROP" ? "#ff0000" : predicted ? "#ffa500" : "#00ff00";
+    ctx.strokeStyle = color;
+    ctx.strokeRect(x1, y1, x2 - x1, y2 - y1);
+    ctx.fillStyle = color;
+    ctx.font = "12px sans-serif";
+    ctx.fillText(predicted ? "PRED" : conf.toFixed(2), x1, y1 - 6);
+  }
+
+  ctx.font = "bold 18px sans-serif";
+  ctx.fillStyle = "#ffffff";
+  ctx.fillText(`Frame ${fid}/${ov.total_frames}`, 10, 30);
+  ctx.fillStyle = "#ff5000";
+  ctx.fillText(
+    `Drops: ${ov.drops.length}  Merges: ${ov.merges.length}`,
+    10,
+    60,
+  );
+}
+
+function OverlayPlayer({ src, overlayFile }) {
+  const videoRef = useRef(null);
+  const canvasRef = useRef(null);
+  const [ov, setOv] = useState(null);
+
+  useEffect(() => {
+    fetch(`/report/${overlayFile}`)
+      .then((r) => (r.ok ? r.json() : null))
+      .then((d) => {
+        if (!d) return;
+        const drops = new Set(d.drops);
+        const merges = new Set(d.merges);
+        const markers = [];
+        for (const r of d.track) {
+          if (drops.has(r[0])) markers.push([r[0], r[5], r[6], "DROP", "#ff0000"]);
+          if (merges.has(r[0])) markers.push([r[0], r[5], r[6], "MERGE", "#00bfff"]);
+        }
+        markers.sort((a, b) => a[0] - b[0]);
+        setOv({ ...d, markers });
+      })
+      .catch(() => setOv(null));
+  }, [overlayFile]);
+
+  useEffect(() => {
+    const video = videoRef.current;
+    const canvas = canvasRef.current;
+    if (!ov || !video || !canvas) return;
+    const ctx = canvas.getContext("2d");
+    let handle = null;
+    const paint = () => {
+      const fid = Math.floor(video.currentTime * ov.fps + 1e-3);
+      drawOverlay(ctx, ov, fid);
+    };
+    // redraw on every presented frame where supported, else per animation frame
+    const loop = () => {
+      paint();
+      handle = video.requestVideoFrameCallback
+        ? video.requestVideoFrameCallback(loop)
+        : requestAnimationFrame(loop);
+    };
+    loop();
+    video.addEventListener("seeked", paint);
+    return () => {
+      video.removeEventListener("seeked", paint);
+      if (video.cancelVideoFrameCallback) video.cancelVideoFrameCallback(handle);
+      else cancelAnimationFrame(handle);
+    };
+  }, [ov]);
+
+  return (
+    <div
+      className="relative mx-auto"
+      style={{
+        aspectRatio: ov ? `${ov.width} / ${ov.height}` : "16 / 9",
+        maxHeight: "420px",
+      }}
+    >
+      <video
+        ref={videoRef}
+        src={src}
+        controls
+        muted
+        className="absolute inset-0 w-full h-full rounded-xl"
+      />
+      <canvas
+        ref={canvasRef}
+        width={ov?.width || 0}
+        height={ov?.height || 0}
+        className="absolute inset-0 w-full h-full pointer-events-none"
+      />
+    </div>
+  );
+}
+
+/* ── Scrub preview: sprite-sheet hover + event thumbnails, no seeking ── */
+function spriteTile(ix, frame) {
+  const t = Math.min(Math.floor(frame / ix.interval), ix.tiles - 1);
+  const perSheet = ix.cols * ix.rows;
+  const pos = t % perSheet;
+  return {
+    sheet: ix.sheets[Math.floor(t / perSheet)],
+    x: (pos % ix.cols) * ix.tile_w,
+    y: Math.floor(pos / ix.cols) * ix.tile_h,
+  };
+}
+
+function ScrubPreview({ previewsFile, totalFrames, fps }) {
+  const [ix, setIx] = useState(null);
+  const [hover, setHover] = useState(null);
+
+  useEffect(() => {
+    fetch(`/report/${previewsFile}`)
+      .then((r) => (r.ok ? r.json() : null))
+      .then(setIx)
+      .catch(() => setIx(null));
+  }, [previewsFile]);
+
+  if (!ix || ix.tiles === 0) return null;
+
+  const onMove = (e) => {
+    const rect = e.currentTarget.getBoundingClientRect();
+    const frac = Math.min(1, Math.max(0, (e.clientX - rect.left) / rect.width));
+    setHover({ frac, frame: Math.floor(frac * Math.max(0, totalFrames - 1)) });
+  };
+  const tile = hover ? spriteTile(ix, hover.frame) : null;
+  const events = Object.entries(ix.events);
+
+  return (
+    <div className="mt-4 space-y-3">
+      <div
+        className="relative h-6 bg-slate-800 rounded-md cursor-crosshair"
+        onMouseMove={onMove}
+        onMouseLeave={() => setHover(null)}
+      >
+        {events.map(([f, ev]) => (
+          <span
+            key={f}
+            className={`absolute top-0 h-full w-px ${ev.label === "DROP" ? "bg-red-500" : "bg-amber-400"}`}
+            style={{ left: `${(Number(f) / Math.max(1, totalFrames)) * 100}%` }}
+          />
+        ))}
+        {tile && (
+          <div
+            className="absolute bottom-8 -translate-x-1/2 pointer-events-none z-10"
+            style={{ left: `${hover.frac * 100}%` }}
+          >
+            <div
+              className="rounded-md border border-slate-600 shadow-lg"
+              style={{
+                width: ix.tile_w,
+                height: ix.tile_h,
+                backgroundImage: `url(/download/${tile.sheet})`,
+                backgroundPosition: `-${tile.x}px -${tile.y}px`,
+              }}
+            />
+            <p className="text-center text-slate-300 text-xs mt-1">
+              {frameToTimestamp(hover.frame, fps)} · f{hover.frame}
+            </p>
+          </div>
+        )}
+      </div>
+      {events.length > 0 && (
+        <div className="flex gap-2 overflow-x-auto pb-1">
+          {events.map(([f, ev]) => (
+            <figure key={f} className="shrink-0 w-28">
+              <img
+                src={`/download/${ev.file}`}
+                alt={`${ev.label} frame ${f}`}
+                loading="lazy"
+                className={`w-full rounded border ${ev.label === "DROP" ? "border-red-500/60" : "border-amber-400/60"}`}
+              />
+              <figcaption className="text-[10px] text-slate-400 mt-0.5">
+                {ev.label} · f{f}
+              </figcaption>
+            </figure>
+          ))}
+          {ix.events_total > events.length && (
+            <span className="self-center text-slate-500 text-xs shrink-0">
+              +{ix.events_total - events.length} more
+            </span>
+          )}
+        </div>
+      )}
+    </div>
+  );
+}
+
 /* ── Stat card ─────────────────────────────────────────────────────── */
 function StatCard({ label, value, color = "text-white", sub }) {
   return (
@@ -664,10 +889,34 @@ export default function Results() {
   const [error, setError] = useState(false);
   const [pdfLoading, setPdfLoading] = useState(false);
 
-  const videoFile = searchParams.get("video");
+  const [videoFile, setVideoFile] = useState(searchParams.get("video"));
+  const [exporting, setExporting] = useState(false);
+  const sourceFile = searchParams.get("source");
+  const overlayFile = searchParams.get("overlay");
   const reportFile = searchParams.get("report");
   const csvFile = searchParams.get("csv");
   const thumbnail = searchParams.get("thumbnail");
+  const previewsFile = searchParams.get("previews");
+
+  // annotations are drawn client-side; burn them in only when downloading
+  const downloadVideo = async () => {
+    if (videoFile) {
+      window.open(`/download/${videoFile}`, "_blank");
+      return;
+    }
+    setExporting(true);
+    try {
+      const r = await fetch("/export", { method: "POST" });
+      if (!r.ok) throw new Error(r.status);
+      const { annotated_video } = await r.json();
+      setVideoFile(annotated_video);
+      window.open(`/download/${annotated_video}`, "_blank");
+    } catch {
+      alert("Export failed. Make sure server is running.");
+    } finally {
+      setExporting(false);
+    }
+  };
 
   useEffect(() => {
     if (!reportFile) {
@@ -796,10 +1045,11 @@ export default function Results() {
         </div>
         <div className="flex gap-2">
           <button
-            onClick={() => window.open(`/download/${videoFile}`, "_blank")}
-            className="px-3 py-1.5 bg-slate-800 hover:bg-slate-700 border border-slate-700 text-slate-300 hover:text-white rounded-lg text-xs font-medium transition-all"
+            disabled={exporting}
+            onClick={downloadVideo}
+            className="px-3 py-1.5 bg-slate-800 hover:bg-slate-700 disabled:opacity-50 disabled:cursor-wait border border-slate-700 text-slate-300 hover:text-white rounded-lg text-xs font-medium transition-all"
           >
-            ↓ Video
+            {exporting ? "Exporting…" : "↓ Video"}
           </button>
           <button
             onClick={() => window.open(`/download/${csvFile}`, "_blank")}
@@ -878,13 +1128,27 @@ export default function Results() {
               Video Preview
             </h2>
             <div className="relative bg-black rounded-xl overflow-hidden">
-              <img
-                src={`/download/${thumbnail}`}
-                alt="First frame"
-                className="w-full rounded-xl"
-                style={{ maxHeight: "420px", objectFit: "contain" }}
-              />
+              {sourceFile && overlayFile ? (
+                <OverlayPlayer
+                  src={`/source/${sourceFile}`}
+                  overlayFile={overlayFile}
+                />
+              ) : (
+                <img
+                  src={`/download/${thumbnail}`}
+                  alt="First frame"
+                  className="w-full rounded-xl"
+                  style={{ maxHeight: "420px", objectFit: "contain" }}
+                />
+              )}
             </div>
+            {previewsFile && (
+              <ScrubPreview
+                previewsFile={previewsFile}
+                totalFrames={summary.total_frames}
+                fps={data.fps}
+              />
+            )}
           </div>
 
           {/* Pie chart */}
@@ -12,6 +12,9 @@ export default defineConfig({
       "/download": { target: "http://localhost:8000", changeOrigin: true },
       "/report": { target: "http://localhost:8000", changeOrigin: true },
       "/health": { target: "http://localhost:8000", changeOrigin: true },
+      "/reanalyze": { target: "http://localhost:8000", changeOrigin: true },
+      "/source": { target: "http://localhost:8000", changeOrigin: true },
+      "/export": { target: "http://localhost:8000", changeOrigin: true },
     },
   },
 });
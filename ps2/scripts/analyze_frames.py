@@ -1,84 +1,69 @@
-import cv2
-import numpy as np
-from skimage.metrics import structural_similarity as ssim
+from ps2.core.features import (SIGNALS, FeatureStore, iter_signals,
+                               video_hash, video_meta)
+from ps2.core.rolling import RollingZScore
+
+def _label(z_score, flow, similarity):
+    # Drop detection
+    if z_score > 3:
+        return "DROP", min(1.0, z_score / 5)
+
+    # Merge detection
+    if flow < 0.1 and similarity > 0.98:
+        return "MERGE", 0.9
+
+    return "NORMAL", 0.0
+
+def analyze_video(video_path, window=40, robust=False, store=None):
+    """Print each frame's label as soon as its rolling window is complete,
+    instead of waiting for the global stats. Signals are read from the
+    feature store when cached, otherwise computed while streaming the
+    decode and stored for next time."""
+    store = store or FeatureStore()
+    key = video_hash(video_path)
+    cached = store.load(video_path, key=key)
+
+    if cached is not None:
+        signals, meta = cached
+        print(f"Detected FPS: {meta['fps']}  (cached signals)")
+        rows = zip(signals["flow"], signals["ssim"], signals["blur"])
+    else:
+        meta = video_meta(video_path)
+        print(f"Detected FPS: {meta['fps']}")
+        rows = iter_signals(video_path)
+
+    zscores = RollingZScore(window=window, centered=True, robust=robust)
+    pending = {}  # frame index -> (flow, ssim) until its label is emitted
+    computed = {name: [] for name in SIGNALS}
+
+    def report(ready):
+        for i, z_score, _, _ in ready:
+            flow, similarity = pending.pop(i)
+            label, confidence = _label(z_score, flow, similarity)
+            print(f"Frame {i}: {label} (Conf={confidence:.2f})")
 
-def laplacian_variance(frame):
-    gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
-    return cv2.Laplacian(gray, cv2.CV_64F).var()
-
-def compute_ssim(f1, f2):
-    g1 = cv2.cvtColor(f1, cv2.COLOR_BGR2GRAY)
-    g2 = cv2.cvtColor(f2, cv2.COLOR_BGR2GRAY)
-    return ssim(g1, g2)
+    print("\n--- Classification ---")
 
-def analyze_video(video_path):
-    cap = cv2.VideoCapture(video_path)
-    fps = cap.get(cv2.CAP_PROP_FPS)
-    print(f"Detected FPS: {fps}")
+    for j, (flow, similarity, blur) in enumerate(rows):
+        if cached is None:
+            computed["flow"].append(flow)
+            computed["ssim"].append(similarity)
+            computed["blur"].append(blur)
+        if j == 0:
+            continue  # frame 0 has no predecessor
 
-    frames = []
-    flows = []
-    blurs = []
-    ssims = []
+        # index i scores the (i, i+1) frame pair
+        idx = j - 1
+        pending[idx] = (float(flow), float(similarity))
+        report(zscores.push(flow))
 
-    ret, prev_frame = cap.read()
-    if not ret:
+    if cached is None and not computed["flow"]:
         print("Error reading video")
         return
 
-    prev_gray = cv2.cvtColor(prev_frame, cv2.COLOR_BGR2GRAY)
-    frames.append(prev_frame)
-
-    while True:
-        ret, frame = cap.read()
-        if not ret:
-            break
-
-        gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
-
-        flow = cv2.calcOpticalFlowFarneback(
-            prev_gray, gray,
-            None, 0.5, 3, 15, 3, 5, 1.2, 0
-        )
-
-        mag = np.mean(np.sqrt(flow[..., 0]**2 + flow[..., 1]**2))
-        flows.append(mag)
-
-        blur_score = laplacian_variance(frame)
-        blurs.append(blur_score)
-
-        similarity = compute_ssim(prev_frame, frame)
-        ssims.append(similarity)
-
-        frames.append(frame)
-        prev_gray = gray
-        prev_frame = frame
-
-    cap.release()
-
-    flow_arr = np.array(flows)
-    mean_flow = np.mean(flow_arr)
-    std_flow = np.std(flow_arr)
-
-    print("\n--- Classification ---")
-
-    for i in range(len(flows)):
-        z_score = (flows[i] - mean_flow) / (std_flow + 1e-6)
-
-        label = "NORMAL"
-        confidence = 0.0
-
-        # Drop detection
-        if z_score > 3:
-            label = "DROP"
-            confidence = min(1.0, z_score / 5)
-
-        # Merge detection
-        elif flows[i] < 0.1 and ssims[i] > 0.98:
-            label = "MERGE"
-            confidence = 0.9
+    report(zscores.flush())
 
-        print(f"Frame {i}: {label} (Conf={confidence:.2f})")
+    if cached is None:
+        store.save(video_path, computed, meta=meta, key=key)
 
 if __name__ == "__main__":
     video_path = input("Enter video path: ")
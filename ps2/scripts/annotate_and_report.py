@@ -1,69 +1,38 @@
 # ps2/scripts/annotate_and_report.py
 import cv2
-import numpy as np
 import csv
 import os
-from skimage.metrics import structural_similarity as ssim
-
-# ---------- utilities ----------
-def laplacian_variance(frame):
-    gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
-    return cv2.Laplacian(gray, cv2.CV_64F).var()
-
-def compute_ssim(f1, f2):
-    g1 = cv2.cvtColor(f1, cv2.COLOR_BGR2GRAY)
-    g2 = cv2.cvtColor(f2, cv2.COLOR_BGR2GRAY)
-    return ssim(g1, g2)
-
-def sliding_stats(arr, idx, window=20):
-    start = max(0, idx - window//2)
-    end = min(len(arr), idx + window//2)
-    w = np.array(arr[start:end]) if end>start else np.array(arr)
-    if len(w)==0:
-        return float(np.mean(arr)), float(np.std(arr))+1e-6
-    return float(np.mean(w)), float(np.std(w))+1e-6
+
+from ps2.core.features import FeatureStore
+from ps2.core.rolling import rolling_mean_std
 
 # ---------- core analysis ----------
-def analyze_and_annotate(video_path, out_dir="..\\results", window=40):
+def analyze_and_annotate(video_path, out_dir="..\\results", window=40, store=None):
     os.makedirs(out_dir, exist_ok=True)
-    cap = cv2.VideoCapture(video_path)
-    fps = cap.get(cv2.CAP_PROP_FPS) or 30.0
-    w = int(cap.get(cv2.CAP_PROP_FRAME_WIDTH))
-    h = int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
-
-    # read all frames first (memory OK for short clips); otherwise stream with buffers
-    frames = []
-    ret = True
-    while True:
-        ret, frame = cap.read()
-        if not ret: break
-        frames.append(frame)
-    cap.release()
-    n = len(frames)
+
+    # signals from the feature store (decoded and computed only on a miss)
+    store = store or FeatureStore()
+    signals, meta = store.get_or_compute(video_path)
+    fps = meta["fps"]
+    w = meta["width"]
+    h = meta["height"]
+    n = meta["frames"]
     if n < 3:
         raise RuntimeError("Too few frames")
 
-    # compute signals
-    flows = [0.0] * n
-    blurs = [0.0] * n
-    ssims = [1.0] * n
-
-    prev_gray = cv2.cvtColor(frames[0], cv2.COLOR_BGR2GRAY)
-    for i in range(1, n):
-        gray = cv2.cvtColor(frames[i], cv2.COLOR_BGR2GRAY)
-        flow = cv2.calcOpticalFlowFarneback(prev_gray, gray, None, 0.5,3,15,3,5,1.2,0)
-        mag = float(np.mean(np.sqrt(flow[...,0]**2 + flow[...,1]**2)))
-        flows[i] = mag
-        blurs[i] = float(laplacian_variance(frames[i]))
-        ssims[i] = float(compute_ssim(frames[i-1], frames[i]))
-        prev_gray = gray
+    flows = signals["flow"].tolist()
+    blurs = signals["blur"].tolist()
+    ssims = signals["ssim"].tolist()
 
     # classification using sliding window stats + heuristics
     labels = ["NORMAL"] * n
     confidences = [0.0] * n
 
+    # centered window stats for every frame in one O(n) pass
+    mean_flows, std_flows = rolling_mean_std(flows, window=window, centered=True)
+
     for i in range(1, n-1):
-        mean_flow, std_flow = sliding_stats(flows, i, window=window)
+        mean_flow, std_flow = float(mean_flows[i]), float(std_flows[i])
         z = (flows[i] - mean_flow) / (std_flow if std_flow>1e-6 else 1e-6)
 
         # scene cut detection (avoid false positives)
@@ -80,7 +49,7 @@ def analyze_and_annotate(video_path, out_dir="..\\results", window=40):
 
         # merge detection (low flow, very high similarity to both sides, and blur increase)
         s_prev = ssims[i]
-        s_next = compute_ssim(frames[i], frames[i+1]) if i+1<n else s_prev
+        s_next = ssims[i+1]  # ssim_prev of the next frame is ssim(i, i+1)
         blur_ratio = blurs[i] / max(blurs[i-1], blurs[i+1], 1e-6)
         if flows[i] < max(0.08, mean_flow*0.3) and s_prev > 0.98 and s_next > 0.98 and blur_ratio > 1.1:
             labels[i] = "MERGE"
@@ -105,7 +74,11 @@ def analyze_and_annotate(video_path, out_dir="..\\results", window=40):
     fourcc = cv2.VideoWriter_fourcc(*"mp4v")
     writer = cv2.VideoWriter(out_video, fourcc, fps, (w, h))
 
-    for i, frame in enumerate(frames):
+    cap = cv2.VideoCapture(video_path)
+    for i in range(n):
+        ret, frame = cap.read()
+        if not ret:
+            break
         label = labels[i]
         conf = confidences[i]
         if label == "NORMAL":
@@ -122,6 +95,7 @@ def analyze_and_annotate(video_path, out_dir="..\\results", window=40):
         cv2.putText(frame, text, (30,60), cv2.FONT_HERSHEY_SIMPLEX, 1.2, color, 3, cv2.LINE_AA)
         # optionally draw flow magnitude small plot or meter
         writer.write(frame)
+    cap.release()
     writer.release()
 
     print("Saved:", csv_path, out_video)
@@ -1,35 +1,212 @@
 # file: ps2/scripts/autocurate_from_dets.py
 import os
 import csv
+import json
+import re
 import shutil
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 import argparse
 
-def find_frame_file(frames_root: Path, video_base: str, frame_idx: int):
-    # common patterns: frame_00001.jpg, frame-00001.jpg, img_00001.jpg, or contain 00001
-    candidates = []
-    fmt = f"{frame_idx:05d}"
-    patterns = [
-        f"**/frame_{fmt}.*",
-        f"**/frame-{fmt}.*",
-        f"**/img_{fmt}.*",
-        f"**/*{fmt}.*",
-        f"**/{video_base}_frame_{fmt}.*",
-        f"**/{video_base}*{fmt}.*",
-    ]
-    for p in patterns:
-        candidates.extend(list(frames_root.glob(p)))
-    # prefer jpg/png
-    for c in candidates:
-        if c.suffix.lower() in [".jpg", ".jpeg", ".png"]:
-            return c
-    return candidates[0] if candidates else None
-
-def curate(dets_csv, frames_root, out_dir="ps2/dataset/curated", conf_thr=0.2):
+import cv2
+
+IMAGE_EXTS = {".jpg", ".jpeg", ".png"}
+MAX_PENDING_WRITES = 64
+
+# <video>_frame_00001, frame_00001, frame-00001, img_00001, or anything ending in digits
+_NAME_RE = re.compile(r"^(?:(?P<base>.+?)_frame_|frame[_-]|img_)?(?P<idx>\d+)$")
+_TRAILING_DIGITS_RE = re.compile(r"(?P<idx>\d+)$")
+
+
+class FrameIndex:
+    """
+    One-walk index of an extracted-frames tree: (video base, frame index) -> path.
+
+    Frames named after their video (<video>_frame_00001.jpg) or stored in a
+    per-video folder are indexed under that video; bare names
+    (frame_00001.jpg, img_00001.jpg) are also indexed video-agnostically.
+    """
+
+    def __init__(self, entries=None, dir_stamps=None):
+        self._by_video = {}
+        self._any = {}
+        # relative dir -> mtime_ns at build time; adding or removing a frame
+        # (or a folder) changes its parent directory's mtime
+        self.dir_stamps = dir_stamps or {}
+        for base, idx, path in entries or ():
+            self.add(base, idx, path)
+
+    def __len__(self):
+        return len(self._any)
+
+    def add(self, base, idx, path):
+        if base:
+            self._by_video.setdefault((base, idx), path)
+        self._any.setdefault(idx, path)
+
+    @classmethod
+    def build(cls, frames_root):
+        frames_root = Path(frames_root)
+        index = cls()
+        for dirpath, _, files in os.walk(frames_root):
+            index.dir_stamps[os.path.relpath(dirpath, frames_root)] = os.stat(dirpath).st_mtime_ns
+            folder = os.path.basename(dirpath)
+            for name in files:
+                stem, ext = os.path.splitext(name)
+                if ext.lower() not in IMAGE_EXTS:
+                    continue
+                m = _NAME_RE.match(stem) or _TRAILING_DIGITS_RE.search(stem)
+                if m is None:
+                    continue
+                base = m.groupdict().get("base") or folder
+                index.add(base, int(m.group("idx")), Path(dirpath) / name)
+        return index
+
+    @staticmethod
+    def _unchanged(frames_root, dir_stamps):
+        """True if every indexed directory still has its recorded mtime."""
+        if not dir_stamps:
+            return False
+        for rel, mtime in dir_stamps.items():
+            try:
+                if os.stat(frames_root / rel).st_mtime_ns != mtime:
+                    return False
+            except OSError:
+                return False
+        return True
+
+    @classmethod
+    def load_or_build(cls, frames_root, cache_path=None, rebuild=False):
+        """Reuse a persisted index (json) unless asked to rebuild or the tree changed."""
+        frames_root = Path(frames_root)
+        if cache_path and not rebuild and os.path.exists(cache_path):
+            with open(cache_path) as f:
+                data = json.load(f)
+            if (data.get("root") == str(frames_root.resolve())
+                    and cls._unchanged(frames_root, data.get("dirs"))):
+                return cls(((b, i, frames_root / p) for b, i, p in data["entries"]),
+                           dir_stamps=data["dirs"])
+            print(f"Frame index {cache_path} is stale, rebuilding")
+        index = cls.build(frames_root)
+        if cache_path:
+            index.save(cache_path, frames_root)
+        return index
+
+    def save(self, cache_path, frames_root):
+        frames_root = Path(frames_root)
+        # video-agnostic entries first so reloading keeps the same fallbacks
+        entries = [[None, i, os.path.relpath(p, frames_root)] for i, p in self._any.items()]
+        entries += [[b, i, os.path.relpath(p, frames_root)] for (b, i), p in self._by_video.items()]
+        with open(cache_path, "w") as f:
+            json.dump({"root": str(frames_root.resolve()), "dirs": self.dir_stamps,
+                       "entries": entries}, f)
+
+    def lookup(self, video_base, frame_idx):
+        """O(1): prefer the frame of this video, else any frame with that index."""
+        return self._by_video.get((video_base, frame_idx)) or self._any.get(frame_idx)
+
+
+def find_frame_file(frames_root: Path, video_base: str, frame_idx: int, index: FrameIndex = None):
+    index = index or FrameIndex.build(frames_root)
+    return index.lookup(video_base, frame_idx)
+
+
+def _place(src, dst, link):
+    if link:
+        try:
+            os.link(src, dst)
+            return
+        except OSError:
+            pass  # cross-device or unsupported: fall back to a copy
+    shutil.copy(src, dst)
+
+
+def copy_frames(pairs, link=False, workers=8):
+    """Copy (or hardlink) (src, dst) pairs in parallel, skipping existing dsts and missing srcs."""
+    todo = []
+    missing = 0
+    for s, d in pairs:
+        if d.exists():
+            continue
+        if not os.path.exists(s):
+            missing += 1
+            continue
+        todo.append((s, d))
+    if missing:
+        print(f"Skipped {missing} frames missing from disk")
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        list(pool.map(lambda sd: _place(sd[0], sd[1], link), todo))
+    return len(todo)
+
+def wanted_frames(dets_csv, conf_thr=0.2):
+    """Sorted frame indices whose detection confidence reaches conf_thr."""
+    frames = set()
+    with open(dets_csv, "r") as f:
+        for row in csv.DictReader(f):
+            try:
+                conf = float(row.get("conf") or 0.0)
+            except ValueError:
+                conf = 0.0
+            if conf >= conf_thr:
+                frames.add(int(row["frame"]))
+    return sorted(frames)
+
+
+def curate_from_video(dets_csv, video_path, out_dir="ps2/dataset/curated", conf_thr=0.2,
+                      encode_threads=4, jpeg_quality=95):
+    """
+    Curate straight from the source video, without extracting every frame first.
+
+    The video is decoded once: unwanted frames are only grab()bed, wanted
+    ones are retrieve()d and written to out_dir on an encode thread pool.
+    """
+    out_dir = Path(out_dir)
+    out_dir.mkdir(parents=True, exist_ok=True)
+    video_base = Path(dets_csv).stem.replace("_detections", "")
+    wanted = wanted_frames(dets_csv, conf_thr)
+
+    cap = cv2.VideoCapture(str(video_path))
+    if not cap.isOpened():
+        raise RuntimeError(f"Cannot open video: {video_path}")
+
+    params = [cv2.IMWRITE_JPEG_QUALITY, jpeg_quality]
+    written = 0
+    with ThreadPoolExecutor(max_workers=encode_threads) as pool:
+        pending = deque()
+        frame_idx = 0
+        for target in wanted:
+            dst = out_dir / f"{video_base}_f{target:05d}.jpg"
+            if dst.exists():
+                continue
+            while frame_idx < target:
+                if not cap.grab():
+                    break
+                frame_idx += 1
+            if frame_idx < target or not cap.grab():
+                break  # video shorter than the CSV
+            frame_idx += 1
+            ok, frame = cap.retrieve()
+            if not ok:
+                continue
+            pending.append(pool.submit(cv2.imwrite, str(dst), frame, params))
+            while len(pending) > MAX_PENDING_WRITES:
+                pending.popleft().result()
+            written += 1
+        for fut in pending:
+            fut.result()
+    cap.release()
+    print(f"Wrote {written} of {len(wanted)} wanted frames from {video_path} to {out_dir}")
+    return written
+
+def curate(dets_csv, frames_root, out_dir="ps2/dataset/curated", conf_thr=0.2,
+           index=None, link=False, workers=8):
     frames_root = Path(frames_root)
     out_dir = Path(out_dir)
     out_dir.mkdir(parents=True, exist_ok=True)
-    copied = 0
+    index = index or FrameIndex.build(frames_root)
+
+    pairs = {}
     with open(dets_csv, "r") as f:
         r = csv.DictReader(f)
         video_base = Path(dets_csv).stem.replace("_detections", "")
@@ -41,20 +218,31 @@ def curate(dets_csv, frames_root, out_dir="ps2/dataset/curated", conf_thr=0.2):
             if conf < conf_thr:
                 continue
             frame_idx = int(row["frame"])
-            src = find_frame_file(frames_root, video_base, frame_idx)
-            if src and src.exists():
+            src = index.lookup(video_base, frame_idx)
+            if src is not None:
                 dst = out_dir / f"{video_base}_f{frame_idx:05d}{src.suffix}"
                 # avoid overwriting same file
-                if not dst.exists():
-                    shutil.copy(src, dst)
-                    copied += 1
+                pairs.setdefault(dst, src)
+    copied = copy_frames(((s, d) for d, s in pairs.items()), link=link, workers=workers)
     print(f"Copied {copied} images to {out_dir}")
 
 if __name__ == "__main__":
     p = argparse.ArgumentParser()
     p.add_argument("--dets", required=True, help="detections csv")
-    p.add_argument("--frames", required=True, help="root folder where extracted frames are (searches recursively)")
+    src = p.add_mutually_exclusive_group(required=True)
+    src.add_argument("--frames", help="root folder where extracted frames are (indexed recursively, once)")
+    src.add_argument("--video", help="source video: decode once and write only the wanted frames")
     p.add_argument("--out", default="ps2/dataset/curated", help="destination for curated images")
     p.add_argument("--conf", type=float, default=0.2, help="min confidence to copy frame")
+    p.add_argument("--index", default=None, help="optional json file to persist/reuse the frame index")
+    p.add_argument("--rebuild-index", action="store_true", help="ignore a persisted index")
+    p.add_argument("--link", action="store_true", help="hardlink instead of copying when possible")
+    p.add_argument("--workers", type=int, default=8, help="parallel copy threads")
     args = p.parse_args()
-    curate(args.dets, args.frames, out_dir=args.out, conf_thr=args.conf)
\ No newline at end of file
+    if args.video:
+        curate_from_video(args.dets, args.video, out_dir=args.out, conf_thr=args.conf)
+        raise SystemExit(0)
+    index = FrameIndex.load_or_build(args.frames, args.index, rebuild=args.rebuild_index)
+    print(f"Indexed {len(index)} frame numbers under {args.frames}")
+    curate(args.dets, args.frames, out_dir=args.out, conf_thr=args.conf,
+           index=index, link=args.link, workers=args.workers)
@@ -1,45 +1,164 @@
-import cv2
+# ps2/scripts/extract_all_frames.py
+import argparse
+import csv
 import os
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
 from pathlib import Path
 
-video_folder = "ps2/sample_videos"
-output_root = "ps2/dataset/raw_frames"
+import cv2
+import numpy as np
 
-os.makedirs(output_root, exist_ok=True)
+MAX_PENDING_WRITES = 64
+MANIFEST_FIELDS = ["video", "frame", "time_s", "path", "hash"]
 
-video_paths = list(Path(video_folder).glob("*.mp4"))
 
-total_saved = 0
+def dhash(frame, size=8):
+    """64-bit difference hash — cheap near-duplicate fingerprint."""
+    gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY) if frame.ndim == 3 else frame
+    small = cv2.resize(gray, (size + 1, size), interpolation=cv2.INTER_AREA)
+    bits = (small[:, 1:] > small[:, :-1]).ravel()
+    return int.from_bytes(np.packbits(bits).tobytes(), "big")
 
-for video_path in video_paths:
-    cap = cv2.VideoCapture(str(video_path))
+
+def hamming(a, b):
+    return bin(a ^ b).count("1")
+
+
+def extract_video(video_path, output_dir, stride=1, every_sec=None, dedup_dist=4,
+                  encode_threads=4, jpeg_quality=95):
+    """
+    Extract frames of one video into output_dir.
+
+    stride     – keep every n-th frame (skipped frames are grab()bed, not decoded)
+    every_sec  – keep one frame per interval instead of a fixed stride
+    dedup_dist – skip a frame whose dHash is within this Hamming distance
+                 of the last kept frame (-1 disables)
+
+    JPEG encoding runs on a thread pool off the decode loop. Returns the
+    manifest rows (video, frame, time_s, path, hash).
+    """
+    if stride < 1:
+        raise ValueError(f"stride must be >= 1, got {stride}")
+    if every_sec is not None and every_sec <= 0:
+        raise ValueError(f"every_sec must be > 0, got {every_sec}")
+    video_path = Path(video_path)
     video_name = video_path.stem
+    os.makedirs(output_dir, exist_ok=True)
+
+    cap = cv2.VideoCapture(str(video_path))
+    if not cap.isOpened():
+        raise RuntimeError(f"Cannot open video: {video_path}")
+    fps = cap.get(cv2.CAP_PROP_FPS) or 30.0
+
+    params = [cv2.IMWRITE_JPEG_QUALITY, jpeg_quality]
+    rows = []
+    pending = deque()
+    last_hash = None
+    next_t = 0.0
+    skipped_dups = 0
+
+    with ThreadPoolExecutor(max_workers=encode_threads) as pool:
+        frame_idx = 0
+        while True:
+            t = frame_idx / fps
+            if every_sec is not None:
+                want = t + 1e-9 >= next_t
+            else:
+                want = frame_idx % stride == 0
 
-    frame_count = 0
-    saved_count = 0
+            if not want:
+                if not cap.grab():
+                    break
+                frame_idx += 1
+                continue
 
-    # Create subfolder per video
-    video_output_dir = os.path.join(output_root, video_name)
-    os.makedirs(video_output_dir, exist_ok=True)
+            ret, frame = cap.read()
+            if not ret:
+                break
 
-    while True:
-        ret, frame = cap.read()
-        if not ret:
-            break
+            # a duplicate still uses up its interval: the next candidate is
+            # the next interval's first frame, not the frame after this one
+            if every_sec is not None:
+                next_t = (int(t // every_sec) + 1) * every_sec
 
-        # Save every frame (we filter later)
-        filename = os.path.join(
-            video_output_dir,
-            f"{video_name}_frame_{frame_count:05d}.jpg"
-        )
-        cv2.imwrite(filename, frame)
+            h = dhash(frame)
+            if dedup_dist >= 0 and last_hash is not None and hamming(h, last_hash) <= dedup_dist:
+                skipped_dups += 1
+                frame_idx += 1
+                continue
+            last_hash = h
 
-        frame_count += 1
-        saved_count += 1
+            filename = os.path.join(output_dir, f"{video_name}_frame_{frame_idx:05d}.jpg")
+            pending.append(pool.submit(cv2.imwrite, filename, frame, params))
+            # bound memory: wait for the oldest writes before queueing more
+            while len(pending) > MAX_PENDING_WRITES:
+                pending.popleft().result()
+
+            rows.append({
+                "video": video_path.name,
+                "frame": frame_idx,
+                "time_s": round(t, 3),
+                "path": filename,
+                "hash": f"{h:016x}",
+            })
+            frame_idx += 1
+
+        for fut in pending:
+            fut.result()
 
     cap.release()
+    print(f"{video_name} → {len(rows)} frames saved ({skipped_dups} near-duplicates skipped)")
+    return rows
+
+
+def write_manifest(output_root, results):
+    """Write manifest.csv for lists of extract_video rows; return (path, rows written)."""
+    manifest = os.path.join(output_root, "manifest.csv")
+    total = 0
+    with open(manifest, "w", newline="") as f:
+        w = csv.DictWriter(f, fieldnames=MANIFEST_FIELDS)
+        w.writeheader()
+        for rows in results:
+            w.writerows(rows)
+            total += len(rows)
+    return manifest, total
+
+
+def _extract_one(args):
+    video_path, output_root, kw = args
+    return extract_video(video_path, os.path.join(output_root, Path(video_path).stem), **kw)
+
+
+def extract_all(video_folder="ps2/sample_videos", output_root="ps2/dataset/raw_frames",
+                pattern="*.mp4", workers=None, **kw):
+    """Extract every video in video_folder in parallel and write manifest.csv."""
+    os.makedirs(output_root, exist_ok=True)
+    video_paths = sorted(Path(video_folder).glob(pattern))
+
+    jobs = [(str(p), output_root, kw) for p in video_paths]
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        results = list(pool.map(_extract_one, jobs))
+
+    manifest, total_saved = write_manifest(output_root, results)
+
+    print("TOTAL FRAMES SAVED:", total_saved)
+    print("Manifest:", manifest)
+    return manifest
 
-    print(f"{video_name} → {saved_count} frames saved")
-    total_saved += saved_count
 
-print("TOTAL FRAMES SAVED:", total_saved)
\ No newline at end of file
+if __name__ == "__main__":
+    p = argparse.ArgumentParser(description="Parallel, deduplicating frame extraction")
+    p.add_argument("--videos", default="ps2/sample_videos", help="folder of input videos")
+    p.add_argument("--out", default="ps2/dataset/raw_frames", help="output root (one subfolder per video)")
+    p.add_argument("--pattern", default="*.mp4", help="glob for videos inside --videos")
+    p.add_argument("--stride", type=int, default=1, help="keep every n-th frame")
+    p.add_argument("--every-sec", type=float, default=None, help="keep one frame per interval (overrides --stride)")
+    p.add_argument("--dedup", type=int, default=4, help="max dHash distance treated as duplicate (-1 = off)")
+    p.add_argument("--workers", type=int, default=None, help="videos processed in parallel")
+    p.add_argument("--threads", type=int, default=4, help="JPEG encode threads per video")
+    p.add_argument("--quality", type=int, default=95, help="JPEG quality")
+    args = p.parse_args()
+    extract_all(args.videos, args.out, pattern=args.pattern, workers=args.workers,
+                stride=args.stride, every_sec=args.every_sec, dedup_dist=args.dedup,
+                encode_threads=args.threads, jpeg_quality=args.quality)
@@ -1,29 +1,23 @@
-import cv2
-import os
+# ps2/scripts/extract_frames.py
+import argparse
+
+from ps2.scripts.extract_all_frames import extract_video, write_manifest
 
 video_path = "ps2/sample_videos/test-18.mp4"
 output_dir = "ps2/dataset/raw_frames"
 
-os.makedirs(output_dir, exist_ok=True)
-
-cap = cv2.VideoCapture(video_path)
-
-frame_count = 0
-saved_count = 0
-
-while True:
-    ret, frame = cap.read()
-    if not ret:
-        break
-
+if __name__ == "__main__":
+    p = argparse.ArgumentParser(description="Extract frames from a single video")
+    p.add_argument("--video", default=video_path)
+    p.add_argument("--out", default=output_dir)
     # Save every 3rd frame to avoid duplicates
-    if frame_count % 1 == 0:
-        filename = os.path.join(output_dir, f"frame_{saved_count:05d}.jpg")
-        cv2.imwrite(filename, frame)
-        saved_count += 1
-
-    frame_count += 1
-
-cap.release()
-
-print("Total frames saved:", saved_count)
\ No newline at end of file
+    p.add_argument("--stride", type=int, default=3)
+    p.add_argument("--every-sec", type=float, default=None)
+    p.add_argument("--dedup", type=int, default=4, help="max dHash distance treated as duplicate (-1 = off)")
+    args = p.parse_args()
+
+    rows = extract_video(args.video, args.out, stride=args.stride,
+                         every_sec=args.every_sec, dedup_dist=args.dedup)
+    manifest, _ = write_manifest(args.out, [rows])
+    print("Total frames saved:", len(rows))
+    print("Manifest:", manifest)
@@ -2,6 +2,7 @@
 import os
 import argparse
 import csv
+import json
 import math
 from collections import deque
 import cv2
@@ -14,23 +15,8 @@ def load_dets(csv_path):
             rows.append(row)
     return rows
 
-def postprocess(video_path, det_csv, out_dir="ps2/results", drop_frames_threshold=6, merge_motion_thresh=2.5):
-    os.makedirs(out_dir, exist_ok=True)
-    dets = load_dets(det_csv)
-    cap = cv2.VideoCapture(video_path)
-    if not cap.isOpened():
-        raise RuntimeError(f"Cannot open video: {video_path}")
-    fps = cap.get(cv2.CAP_PROP_FPS) or 30.0
-    w = int(cap.get(cv2.CAP_PROP_FRAME_WIDTH))
-    h = int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
-
-    base = os.path.splitext(os.path.basename(video_path))[0]
-    out_video = os.path.join(out_dir, f"{base}_events.mp4")
-    out_csv = os.path.join(out_dir, f"{base}_events.csv")
-    fourcc = cv2.VideoWriter_fourcc(*"mp4v")
-    writer = cv2.VideoWriter(out_video, fourcc, fps, (w, h))
-
-    # parse detections into list structures
+def parse_dets(dets):
+    """Turn detection CSV rows into (detected, centers, confs) lists."""
     detected = []
     centers = []
     confs = []
@@ -49,7 +35,10 @@ def postprocess(video_path, det_csv, out_dir="ps2/results", drop_frames_threshol
             confs.append(float(row.get("conf", 0.0)))
         except:
             confs.append(0.0)
+    return detected, centers, confs
 
+def label_events(detected, centers, drop_frames_threshold=6, merge_motion_thresh=2.5):
+    """Per-frame NORMAL/DROP/MERGE labels from parsed detections (no video I/O)."""
     n = max(len(detected), 0)
     labels = ["NORMAL"] * n
 
@@ -66,39 +55,160 @@ def postprocess(video_path, det_csv, out_dir="ps2/results", drop_frames_threshol
     for i in range(1, n):
         c0 = centers[i - 1]
         c1 = centers[i]
-        if c0 is not None and c1 is not None and detected[i]:
+        if c0[0] is not None and c1[0] is not None and detected[i]:
             dist = math.hypot(c1[0] - c0[0], c1[1] - c0[1])
             if dist < merge_motion_thresh:
                 labels[i] = "MERGE"
 
-    # write annotated video + events csv
-    with open(out_csv, "w", newline="") as f:
-        wcsv = csv.writer(f)
-        wcsv.writerow(["frame", "detected", "cx", "cy", "conf", "label"])
-        cap.set(cv2.CAP_PROP_POS_FRAMES, 0)
-        i = 0
-        while True:
+    return labels
+
+SEEK_GAP_FRAMES = 60  # closer than this, grab() forward instead of seeking
+
+def group_events(labels, pad_pre=15, pad_post=15):
+    """
+    Group non-NORMAL frames into events padded by pad_pre / pad_post frames.
+
+    Events whose padded ranges touch are merged. Returns a list of dicts
+    with the padded clip range (start, end, inclusive), the first/last
+    labelled frame and per-label counts.
+    """
+    n = len(labels)
+    events = []
+    for i, lab in enumerate(labels):
+        if lab == "NORMAL":
+            continue
+        start, end = max(0, i - pad_pre), min(n - 1, i + pad_post)
+        if events and start <= events[-1]["end"] + 1:
+            ev = events[-1]
+            ev["end"] = max(ev["end"], end)
+            ev["last"] = i
+        else:
+            ev = {"start": start, "end": end, "first": i, "last": i, "counts": {}}
+            events.append(ev)
+        ev["counts"][lab] = ev["counts"].get(lab, 0) + 1
+    return events
+
+def _draw(frame, label, conf, cx, cy):
+    if cx is not None and cy is not None:
+        cv2.circle(frame, (cx, cy), 4, (0, 0, 255), -1)
+    color = (0, 200, 0) if label == "NORMAL" else ((0, 0, 255) if label == "DROP" else (0, 200, 200))
+    cv2.putText(frame, f"{label} ({conf:.2f})", (20, 60), cv2.FONT_HERSHEY_SIMPLEX, 1.0, color, 3)
+
+def _frame_info(i, labels, centers, confs):
+    label = labels[i] if i < len(labels) else "NORMAL"
+    cx, cy = centers[i] if i < len(centers) else (None, None)
+    conf = confs[i] if i < len(confs) else 0.0
+    return label, conf, cx, cy
+
+def _frame_count(video_path):
+    """Frame count from the container header (no decoding); None if unknown."""
+    cap = cv2.VideoCapture(video_path)
+    if not cap.isOpened():
+        raise RuntimeError(f"Cannot open video: {video_path}")
+    n = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+    cap.release()
+    return n if n > 0 else None
+
+def render_event_clips(video_path, events, labels, centers, confs, clip_dir):
+    """Seek to each event and encode only its padded range as a short clip."""
+    os.makedirs(clip_dir, exist_ok=True)
+    cap = cv2.VideoCapture(video_path)
+    if not cap.isOpened():
+        raise RuntimeError(f"Cannot open video: {video_path}")
+    fps = cap.get(cv2.CAP_PROP_FPS) or 30.0
+    w = int(cap.get(cv2.CAP_PROP_FRAME_WIDTH))
+    h = int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
+    fourcc = cv2.VideoWriter_fourcc(*"mp4v")
+
+    pos = 0
+    for k, ev in enumerate(events):
+        if pos <= ev["start"] <= pos + SEEK_GAP_FRAMES:
+            while pos < ev["start"] and cap.grab():
+                pos += 1
+        else:
+            cap.set(cv2.CAP_PROP_POS_FRAMES, ev["start"])
+            pos = ev["start"]
+
+        name = f"event_{k:03d}_{ev['start']:05d}-{ev['end']:05d}.mp4"
+        writer = cv2.VideoWriter(os.path.join(clip_dir, name), fourcc, fps, (w, h))
+        while pos <= ev["end"]:
             ret, frame = cap.read()
             if not ret:
                 break
-            det = detected[i] if i < len(detected) else False
-            cx, cy = centers[i] if i < len(centers) else (None, None)
-            conf = confs[i] if i < len(confs) else 0.0
-            label = labels[i] if i < len(labels) else "NORMAL"
-
-            # draw center and label
-            if cx is not None and cy is not None:
-                cv2.circle(frame, (cx, cy), 4, (0, 0, 255), -1)
-            color = (0, 200, 0) if label == "NORMAL" else ((0, 0, 255) if label == "DROP" else (0, 200, 200))
-            cv2.putText(frame, f"{label} ({conf:.2f})", (20, 60), cv2.FONT_HERSHEY_SIMPLEX, 1.0, color, 3)
-
+            _draw(frame, *_frame_info(pos, labels, centers, confs))
             writer.write(frame)
-            wcsv.writerow([i, int(det), cx or -1, cy or -1, round(conf, 3), label])
-            i += 1
+            pos += 1
+        writer.release()
+        ev.update(clip=name, start_s=round(ev["start"] / fps, 3), end_s=round((ev["end"] + 1) / fps, 3))
 
     cap.release()
+    return events
+
+def render_full_video(video_path, out_video, labels, centers, confs):
+    cap = cv2.VideoCapture(video_path)
+    if not cap.isOpened():
+        raise RuntimeError(f"Cannot open video: {video_path}")
+    fps = cap.get(cv2.CAP_PROP_FPS) or 30.0
+    w = int(cap.get(cv2.CAP_PROP_FRAME_WIDTH))
+    h = int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
+    writer = cv2.VideoWriter(out_video, cv2.VideoWriter_fourcc(*"mp4v"), fps, (w, h))
+    i = 0
+    while True:
+        ret, frame = cap.read()
+        if not ret:
+            break
+        _draw(frame, *_frame_info(i, labels, centers, confs))
+        writer.write(frame)
+        i += 1
+    cap.release()
     writer.release()
-    print("Saved:", out_csv, out_video)
+
+def postprocess(video_path, det_csv, out_dir="ps2/results", drop_frames_threshold=6, merge_motion_thresh=2.5,
+                event_clips=True, full_video=False, pad_pre=15, pad_post=15):
+    """
+    Label DROP/MERGE events from a detections CSV.
+
+    Always writes <base>_events.csv. By default only the events are rendered:
+    one padded clip per event under <base>_events/ plus <base>_events_index.json.
+    The fully annotated <base>_events.mp4 is opt-in (full_video=True).
+    Returns (out_csv, index_path, out_video), None for outputs not produced.
+    """
+    os.makedirs(out_dir, exist_ok=True)
+    dets = load_dets(det_csv)
+    base = os.path.splitext(os.path.basename(video_path))[0]
+    out_csv = os.path.join(out_dir, f"{base}_events.csv")
+
+    detected, centers, confs = parse_dets(dets)
+    labels = label_events(detected, centers, drop_frames_threshold, merge_motion_thresh)
+
+    # one row per video frame, as when the CSV was written while decoding:
+    # frames past the detections are undetected / NORMAL, extra detection rows dropped
+    n_frames = _frame_count(video_path) or len(labels)
+    with open(out_csv, "w", newline="") as f:
+        wcsv = csv.writer(f)
+        wcsv.writerow(["frame", "detected", "cx", "cy", "conf", "label"])
+        for i in range(n_frames):
+            label, conf, cx, cy = _frame_info(i, labels, centers, confs)
+            det = detected[i] if i < len(detected) else False
+            wcsv.writerow([i, int(det), cx or -1, cy or -1, round(conf, 3), label])
+
+    index_path = None
+    if event_clips:
+        events = group_events(labels, pad_pre, pad_post)
+        clip_dir = os.path.join(out_dir, f"{base}_events")
+        render_event_clips(video_path, events, labels, centers, confs, clip_dir)
+        index_path = os.path.join(out_dir, f"{base}_events_index.json")
+        with open(index_path, "w") as f:
+            json.dump({"video": os.path.basename(video_path), "clip_dir": os.path.basename(clip_dir),
+                       "pad_pre": pad_pre, "pad_post": pad_post, "events": events}, f, indent=2)
+
+    out_video = None
+    if full_video:
+        out_video = os.path.join(out_dir, f"{base}_events.mp4")
+        render_full_video(video_path, out_video, labels, centers, confs)
+
+    print("Saved:", out_csv, index_path or "", out_video or "")
+    return out_csv, index_path, out_video
 
 if __name__ == "__main__":
     p = argparse.ArgumentParser()
@@ -107,6 +217,12 @@ if __name__ == "__main__":
     p.add_argument("--out", default="ps2/results", help="output directory")
     p.add_argument("--drop_window", type=int, default=6, help="consecutive miss window -> DROP")
     p.add_argument("--merge_thresh", type=float, default=2.5, help="px threshold for MERGE (small motion)")
+    p.add_argument("--pad_pre", type=int, default=15, help="frames of context before each event clip")
+    p.add_argument("--pad_post", type=int, default=15, help="frames of context after each event clip")
+    p.add_argument("--no_clips", action="store_true", help="skip per-event clips")
+    p.add_argument("--full_video", action="store_true", help="also render the whole annotated video")
     args = p.parse_args()
     postprocess(args.video, args.detections, out_dir=args.out,
-                drop_frames_threshold=args.drop_window, merge_motion_thresh=args.merge_thresh)
\ No newline at end of file
+                drop_frames_threshold=args.drop_window, merge_motion_thresh=args.merge_thresh,
+                event_clips=not args.no_clips, full_video=args.full_video,
+                pad_pre=args.pad_pre, pad_post=args.pad_post)
\ No newline at end of file
@@ -2,10 +2,98 @@
 import os
 import argparse
 import csv
+import queue
+import threading
 import cv2
+import numpy as np
 from ultralytics import YOLO
 
-def run(video_path, model_path, out_dir="ps2/results", conf_thresh=0.25, imgsz=960, target_class=None):
+COLUMNS = ["frame", "detected", "x1", "y1", "x2", "y2", "conf", "cx", "cy"]
+
+
+class DetectionWriter(threading.Thread):
+    """
+    Background writer for per-frame detection rows.
+
+    Rows are handed over in batches through a bounded queue so the
+    inference loop never waits on disk. The CSV is always written; with
+    columnar=True the same columns are also saved as one .npz at close().
+    """
+
+    def __init__(self, csv_path, columnar=False, max_batches=16):
+        super().__init__(daemon=True)
+        self.csv_path = csv_path
+        self.npz_path = os.path.splitext(csv_path)[0] + ".npz" if columnar else None
+        self._queue = queue.Queue(maxsize=max_batches)
+        self._columns = {c: [] for c in COLUMNS} if columnar else None
+        self._error = None
+        self.start()
+
+    def put(self, rows):
+        self._queue.put(rows)
+
+    def run(self):
+        done = False
+        try:
+            with open(self.csv_path, "w", newline="") as cf:
+                wcsv = csv.writer(cf)
+                wcsv.writerow(COLUMNS)
+                while True:
+                    rows = self._queue.get()
+                    if rows is None:
+                        done = True
+                        break
+                    wcsv.writerows(rows)
+                    if self._columns is not None:
+                        for row in rows:
+                            for c, v in zip(COLUMNS, row):
+                                self._columns[c].append(v)
+            if self._columns is not None:
+                np.savez(self.npz_path, **{c: np.asarray(v) for c, v in self._columns.items()})
+        except Exception as e:
+            self._error = e
+            # keep draining until close() so the producer never blocks on a full queue
+            while not done:
+                done = self._queue.get() is None
+
+    def close(self):
+        self._queue.put(None)
+        self.join()
+        if self._error is not None:
+            raise self._error
+
+
+def _best_box(res, cls_idx):
+    best_box = None
+    best_conf = 0.0
+    for box in res.boxes:
+        bconf = float(box.conf[0])
+        bcls = int(box.cls[0])
+        if cls_idx is not None and bcls != cls_idx:
+            continue
+        if bconf > best_conf:
+            best_conf = bconf
+            best_box = box
+    return best_box, best_conf
+
+
+def _annotate(frame, frame_idx, row, label):
+    if row[1]:
+        _, _, x1, y1, x2, y2, conf, cx, cy = row
+        cv2.rectangle(frame, (x1, y1), (x2, y2), (0,255,0), 2)
+        cv2.circle(frame, (cx, cy), 4, (0,0,255), -1)
+        cv2.putText(frame, f"{label} {conf:.2f}", (x1, max(10, y1-6)),
+                    cv2.FONT_HERSHEY_SIMPLEX, 0.6, (0,255,0), 2)
+    cv2.putText(frame, f"Frame: {frame_idx}", (20, 40), cv2.FONT_HERSHEY_SIMPLEX, 0.8, (255,255,255), 2)
+
+
+def run(video_path, model_path, out_dir="ps2/results", conf_thresh=0.25, imgsz=960, target_class=None,
+        batch_size=8, render=True, columnar=False):
+    """
+    Detect on every frame of video_path, batch_size frames per model call.
+
+    Returns (csv_path, out_video); out_video is None when render=False.
+    """
     os.makedirs(out_dir, exist_ok=True)
     model = YOLO(model_path)
 
@@ -18,9 +106,12 @@ def run(video_path, model_path, out_dir="ps2/results", conf_thresh=0.25, imgsz=9
 
     base = os.path.splitext(os.path.basename(video_path))[0]
     csv_path = os.path.join(out_dir, f"{base}_detections.csv")
-    out_video = os.path.join(out_dir, f"{base}_inference.mp4")
-    fourcc = cv2.VideoWriter_fourcc(*"mp4v")
-    writer = cv2.VideoWriter(out_video, fourcc, fps, (w, h))
+    out_video = None
+    writer = None
+    if render:
+        out_video = os.path.join(out_dir, f"{base}_inference.mp4")
+        fourcc = cv2.VideoWriter_fourcc(*"mp4v")
+        writer = cv2.VideoWriter(out_video, fourcc, fps, (w, h))
 
     # map class name -> index if requested
     cls_idx = None
@@ -31,50 +122,53 @@ def run(video_path, model_path, out_dir="ps2/results", conf_thresh=0.25, imgsz=9
                 break
         print("Filtering for class:", target_class, "->", cls_idx)
 
-    with open(csv_path, "w", newline="") as cf:
-        wcsv = csv.writer(cf)
-        wcsv.writerow(["frame", "detected", "x1", "y1", "x2", "y2", "conf", "cx", "cy"])
-
+    rows_out = DetectionWriter(csv_path, columnar=columnar)
+    try:
         frame_idx = 0
-        while True:
-            ret, frame = cap.read()
-            if not ret:
+        done = False
+        while not done:
+            batch = []
+            while len(batch) < batch_size:
+                ret, frame = cap.read()
+                if not ret:
+                    done = True
+                    break
+                batch.append(frame)
+            if not batch:
                 break
 
-            results = model(frame, conf=conf_thresh, imgsz=imgsz, verbose=False)
-            res = results[0]
-            best_box = None
-            best_conf = 0.0
-
-            for box in res.boxes:
-                bconf = float(box.conf[0])
-                bcls = int(box.cls[0])
-                if cls_idx is not None and bcls != cls_idx:
-                    continue
-                if bconf > best_conf:
-                    best_conf = bconf
-                    best_box = box
-
-            if best_box is None:
-                wcsv.writerow([frame_idx, 0, -1, -1, -1, -1, 0.0, -1, -1])
-            else:
-                x1, y1, x2, y2 = map(int, best_box.xyxy[0])
-                cx, cy = ((x1 + x2)//2, (y1 + y2)//2)
-                wcsv.writerow([frame_idx, 1, x1, y1, x2, y2, round(best_conf, 4), cx, cy])
-                # draw on frame
-                cv2.rectangle(frame, (x1, y1), (x2, y2), (0,255,0), 2)
-                cv2.circle(frame, (cx, cy), 4, (0,0,255), -1)
-                lab = model.names.get(int(best_box.cls[0]), "obj")
-                cv2.putText(frame, f"{lab} {best_conf:.2f}", (x1, max(10, y1-6)),
-                            cv2.FONT_HERSHEY_SIMPLEX, 0.6, (0,255,0), 2)
-
-            cv2.putText(frame, f"Frame: {frame_idx}", (20, 40), cv2.FONT_HERSHEY_SIMPLEX, 0.8, (255,255,255), 2)
-            writer.write(frame)
-            frame_idx += 1
-
-    cap.release()
-    writer.release()
-    print("Saved:", csv_path, out_video)
+            results = model(batch, conf=conf_thresh, imgsz=imgsz, verbose=False)
+            rows = []
+            for frame, res in zip(batch, results):
+                best_box, best_conf = _best_box(res, cls_idx)
+                if best_box is None:
+                    row = [frame_idx, 0, -1, -1, -1, -1, 0.0, -1, -1]
+                else:
+                    x1, y1, x2, y2 = map(int, best_box.xyxy[0])
+                    cx, cy = ((x1 + x2)//2, (y1 + y2)//2)
+                    row = [frame_idx, 1, x1, y1, x2, y2, round(best_conf, 4), cx, cy]
+                rows.append(row)
+                if writer is not None:
+                    label = model.names.get(int(best_box.cls[0]), "obj") if best_box is not None else None
+                    _annotate(frame, frame_idx, row, label)
+                    writer.write(frame)
+                frame_idx += 1
+            rows_out.put(rows)
+    except BaseException:
+        # report the inference error; a writer error on top of it is secondary
+        try:
+            rows_out.close()
+        except Exception:
+            pass
+        raise
+    else:
+        rows_out.close()
+    finally:
+        cap.release()
+        if writer is not None:
+            writer.release()
+
+    print("Saved:", csv_path, out_video or "(no video)")
     return csv_path, out_video
 
 if __name__ == "__main__":
@@ -85,5 +179,9 @@ if __name__ == "__main__":
     p.add_argument("--conf", type=float, default=0.25, help="confidence threshold")
     p.add_argument("--imgsz", type=int, default=960, help="inference image size")
     p.add_argument("--class-name", default=None, help="optional class name to restrict detections (e.g. cricket_ball)")
+    p.add_argument("--batch", type=int, default=8, help="frames per inference call")
+    p.add_argument("--no-video", action="store_true", help="skip the annotated video (detections only)")
+    p.add_argument("--npz", action="store_true", help="also write the detections as columnar .npz")
     args = p.parse_args()
-    run(args.video, args.model, out_dir=args.out, conf_thresh=args.conf, imgsz=args.imgsz, target_class=args.class_name)
\ No newline at end of file
+    run(args.video, args.model, out_dir=args.out, conf_thresh=args.conf, imgsz=args.imgsz, target_class=args.class_name,
+        batch_size=args.batch, render=not args.no_video, columnar=args.npz)
@@ -2,86 +2,51 @@
 import os
 import csv
 import cv2
-import numpy as np
 
-from ps2.core.blur import laplacian_variance
-from ps2.core.flow import optical_flow_magnitude
-from ps2.core.ssim import compute_ssim
-from ps2.core.fusion import classify_frame
+from ps2.core.features import FeatureStore
+from ps2.core.fusion import classify_all
+from ps2.core.graph import Stage, StageGraph
 
+# bump a stage's version when its code changes; only it and its
+# downstream stages are recomputed on the next run
+SIGNALS_VERSION = 1
+CLASSIFY_VERSION = 1
+REPORT_VERSION = 1
+RENDER_VERSION = 1
 
-def run_pipeline(video_path, out_dir="../results"):
 
-    os.makedirs(out_dir, exist_ok=True)
-
-    cap = cv2.VideoCapture(video_path)
-    if not cap.isOpened():
-        raise RuntimeError("Cannot open video")
-
-    fps = cap.get(cv2.CAP_PROP_FPS) or 30.0
-    width = int(cap.get(cv2.CAP_PROP_FRAME_WIDTH))
-    height = int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
-
-    frames = []
-
-    while True:
-        ret, frame = cap.read()
-        if not ret:
-            break
-        frames.append(frame)
-
-    cap.release()
-
-    n = len(frames)
-    if n < 3:
-        raise RuntimeError("Video too short")
-
-    flows = [0.0] * n
-    ssims = [1.0] * n
-    blurs = [0.0] * n
-
-    prev_gray = cv2.cvtColor(frames[0], cv2.COLOR_BGR2GRAY)
-
-    for i in range(1, n):
-        gray = cv2.cvtColor(frames[i], cv2.COLOR_BGR2GRAY)
+# -------- STAGES --------
 
-        flows[i] = optical_flow_magnitude(prev_gray, gray)
-        blurs[i] = laplacian_variance(frames[i])
-        ssims[i] = compute_ssim(frames[i - 1], frames[i])
+def _classify(flow, ssim, blur, fusion_cfg):
+    labels, confidences = classify_all(flow, ssim, blur, fusion_cfg)
+    return labels.tolist(), confidences.tolist()
 
-        prev_gray = gray
-
-    labels = []
-    confidences = []
-
-    for i in range(n):
-        label, conf = classify_frame(i, flows, ssims, blurs)
-        labels.append(label)
-        confidences.append(conf)
-
-    # -------- SAVE CSV REPORT --------
 
+def _write_report(flow, ssim, blur, labels, confidences, out_dir):
     csv_path = os.path.join(out_dir, "report.csv")
 
     with open(csv_path, "w", newline="") as f:
         writer = csv.writer(f)
         writer.writerow(["frame", "flow", "ssim_prev", "blur", "label", "confidence"])
 
-        for i in range(n):
+        for i in range(len(labels)):
             writer.writerow([
                 i,
-                flows[i],
-                ssims[i],
-                blurs[i],
+                flow[i],
+                ssim[i],
+                blur[i],
                 labels[i],
                 round(confidences[i], 3)
             ])
 
-    # -------- CREATE ANNOTATED VIDEO --------
+    print("Saved:", csv_path)
+    return csv_path
+
 
+def _render(video_path, meta, labels, confidences, out_dir):
     out_video = os.path.join(out_dir, "annotated.mp4")
     fourcc = cv2.VideoWriter_fourcc(*"mp4v")
-    writer = cv2.VideoWriter(out_video, fourcc, fps, (width, height))
+    writer = cv2.VideoWriter(out_video, fourcc, meta["fps"], (meta["width"], meta["height"]))
 
     color_map = {
         "NORMAL": (0, 255, 0),
@@ -89,7 +54,14 @@ def run_pipeline(video_path, out_dir="../results"):
         "MERGE": (0, 165, 255)
     }
 
-    for i, frame in enumerate(frames):
+    cap = cv2.VideoCapture(video_path)
+    i = 0
+    n = len(labels)
+
+    while i < n:
+        ret, frame = cap.read()
+        if not ret:
+            break
         label = labels[i]
         conf = confidences[i]
 
@@ -108,20 +80,65 @@ def run_pipeline(video_path, out_dir="../results"):
         )
 
         writer.write(frame)
+        i += 1
 
+    cap.release()
     writer.release()
 
-    print("Processing complete.")
-    print("Saved:", csv_path)
     print("Saved:", out_video)
+    return out_video
+
+
+def build_graph(store, workers=None, cache_root=None):
+    """decode → signals → classify → {report, render}; report and render run concurrently."""
+
+    def signals(video_path):
+        # per-frame signals come from the feature store; a cache hit skips decoding,
+        # a miss computes frame pairs on `workers` processes (None = every core)
+        sig, meta = store.get_or_compute(video_path, workers=workers)
+        if meta["frames"] < 3:
+            raise RuntimeError("Video too short")
+        return sig["flow"].tolist(), sig["ssim"].tolist(), sig["blur"].tolist(), meta
+
+    return StageGraph([
+        # the feature store is already the cache for signals
+        Stage("signals", signals, inputs=("video_path",),
+              outputs=("flow", "ssim", "blur", "meta"), version=SIGNALS_VERSION, memoize=False),
+        Stage("classify", _classify, inputs=("flow", "ssim", "blur", "fusion_cfg"),
+              outputs=("labels", "confidences"), version=CLASSIFY_VERSION),
+        Stage("report", _write_report,
+              inputs=("flow", "ssim", "blur", "labels", "confidences", "out_dir"),
+              outputs=("csv_path",), version=REPORT_VERSION),
+        Stage("render", _render, inputs=("video_path", "meta", "labels", "confidences", "out_dir"),
+              outputs=("out_video",), version=RENDER_VERSION),
+    ], root=cache_root)
+
+
+def run_pipeline(video_path, out_dir="../results", store=None, render=True, workers=None,
+                 fusion_cfg=None, cache_root=None):
+
+    os.makedirs(out_dir, exist_ok=True)
+
+    graph = build_graph(store or FeatureStore(), workers=workers, cache_root=cache_root)
+    targets = ["csv_path", "out_video"] if render else ["csv_path"]
+    out = graph.run({
+        "video_path": video_path,
+        "out_dir": os.path.abspath(out_dir),
+        "fusion_cfg": fusion_cfg or {},
+    }, targets=targets)
+
+    print("Processing complete.")
+    return out["csv_path"], out.get("out_video")
 
 
 if __name__ == "__main__":
     import sys
 
     if len(sys.argv) < 2:
-        print("Usage: python run_pipeline.py <video_path>")
+        print("Usage: python run_pipeline.py <video_path> [--no-video] [--workers N]")
         sys.exit(1)
 
     video = sys.argv[1]
-    run_pipeline(video)
\ No newline at end of file
+    opts = sys.argv[2:]
+    workers = int(opts[opts.index("--workers") + 1]) if "--workers" in opts else None
+    run_pipeline(video, render="--no-video" not in opts, workers=workers)
@@ -1,11 +1,19 @@
 # ps2/scripts/sample_detections.py (very small)
-import csv, random, shutil, os
-def sample(dets, frames_root, out="ps2/samples", k=20):
+import csv, random, os
+from pathlib import Path
+from ps2.scripts.autocurate_from_dets import FrameIndex, copy_frames
+
+def sample(dets, frames_root, out="ps2/samples", k=20, index=None, link=False):
     os.makedirs(out, exist_ok=True)
     rows = [r for r in csv.DictReader(open(dets))]
-    pos = [r for r in rows if float(r.get("conf",0))>0.2]
+    pos = [r for r in rows if float(r.get("conf") or 0)>0.2]
     sel = random.sample(pos, min(k, len(pos)))
+    index = index or FrameIndex.build(frames_root)
+    video_base = Path(dets).stem.replace("_detections", "")
+    pairs = []
     for r in sel:
         frame_idx = int(r["frame"])
-        # copy logic same as autocurate
-        # ...
\ No newline at end of file
+        src = index.lookup(video_base, frame_idx)
+        if src is not None:
+            pairs.append((src, Path(out) / f"{video_base}_f{frame_idx:05d}{src.suffix}"))
+    print(f"Sampled {copy_frames(pairs, link=link)} frames to {out}")